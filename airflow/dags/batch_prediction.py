@@ -29,11 +29,11 @@ with DAG(
         os.system(f"aws s3 sync s3://{bucket_name}/input_files /app/input_files")
 
     def batch_prediction(**kwargs):
-        from src.pipeline.batch_prediction_pipeline import start_batch_prediction
+        from src.pipeline.batch_prediction_pipeline import start_parallel_batch_prediction , DEFAULT_CHUNK_SIZE
         input_dir = "/app/input_files"
-        for file_name in os.listdir(input_dir):
-            #make prediction
-            start_batch_prediction(input_file_path=os.path.join(input_dir,file_name))
+        #model is loaded once and files are scored in parallel , streamed in chunks so large weekly drops fit in worker memory
+        manifest_file_path = start_parallel_batch_prediction(input_dir=input_dir , chunk_size=DEFAULT_CHUNK_SIZE)
+        print(f"Batch prediction manifest : {manifest_file_path}")
     
     def sync_prediction_dir_to_s3_bucket(**kwargs):
         bucket_name = os.getenv("BUCKET_NAME")
@@ -21,25 +21,49 @@ with DAG(
 ) as dag:
 
     
-    def training(**kwargs):
-        from src.pipeline.training_pipeline import initiate_training_pipeline
-        initiate_training_pipeline()
+    # every stage of src.pipeline.training_pipeline is its own task , artifacts travel through XCom
+    # (AIRFLOW__CORE__ENABLE_XCOM_PICKLING is set in the Dockerfile) so independent stages run concurrently
+    def pipeline_config(**kwargs):
+        from src.entity.config_entity import TrainingPipelineConfig
+        return TrainingPipelineConfig()
+
+    def training_stage(stage_name, deps, **kwargs):
+        from src.pipeline.training_pipeline import run_training_stage
+        ti = kwargs["ti"]
+        training_pipeline_config = ti.xcom_pull(task_ids="pipeline_config")
+        dependencies = {dep: ti.xcom_pull(task_ids=dep) for dep in deps}
+        return run_training_stage(stage_name, training_pipeline_config, **dependencies)
     
     def sync_artifact_to_s3_bucket(**kwargs):
         bucket_name = os.getenv("BUCKET_NAME")
         os.system(f"aws s3 sync /app/artifact s3://{bucket_name}/artifacts")
         os.system(f"aws s3 sync /app/saved_models s3://{bucket_name}/saved_models")
 
-    training_pipeline  = PythonOperator(
-            task_id="train_pipeline",
-            python_callable=training
+    from src.pipeline.training_stages import TRAINING_STAGE_DEPS
+
+    config_task = PythonOperator(
+            task_id="pipeline_config",
+            python_callable=pipeline_config
 
     )
 
+    stage_tasks = {}
+    for stage_name, deps in TRAINING_STAGE_DEPS.items():
+        stage_tasks[stage_name] = PythonOperator(
+            task_id=stage_name,
+            python_callable=training_stage,
+            op_kwargs={"stage_name": stage_name, "deps": deps}
+        )
+
     sync_data_to_s3 = PythonOperator(
             task_id="sync_data_to_s3",
             python_callable=sync_artifact_to_s3_bucket
 
     )
 
-    training_pipeline >> sync_data_to_s3
\ No newline at end of file
+    for stage_name, deps in TRAINING_STAGE_DEPS.items():
+        if len(deps) == 0:
+            config_task >> stage_tasks[stage_name]
+        for dep in deps:
+            stage_tasks[dep] >> stage_tasks[stage_name]
+    stage_tasks["model_pusher"] >> sync_data_to_s3
@@ -4,9 +4,8 @@ import warnings
 import subprocess  # Use subprocess for system calls
 import streamlit as st
 import pandas as pd
-from src.utils import load_object
-from src.config import ordinal_features
-from src.predictor import ModelResolver
+from src.predictor import ModelResolver, Predictor
+from src.batching import MicroBatcher
 from dotenv import load_dotenv  # make sure python-dotenv is installed
 
 warnings.filterwarnings("ignore")
@@ -68,18 +67,27 @@ def load_data():
 
 df = load_data()
 
-# Initialize ModelResolver using the local directory (adjust parameter name as needed)
-model_resolver = ModelResolver(model_registry="/app/saved_models")
-model_path = model_resolver.get_latest_model_path()
-transformer_path = model_resolver.get_latest_transformer_path()
-encoder_path = model_resolver.get_latest_encoder_path()
+# Cached model bundle shared across reruns and sessions, reloaded only when a new registry version appears
+@st.cache_resource
+def load_predictor():
+    return Predictor(model_resolver=ModelResolver(model_registry="/app/saved_models"))
+
+predictor = load_predictor()
+
+# Micro batcher shared by all sessions, concurrent predictions are coalesced into one model call
+@st.cache_resource
+def load_batcher():
+    return MicroBatcher(predict_fn=load_predictor().predict)
+
+batcher = load_batcher()
 
 try:
-    model = load_object(file_path=model_path)
-    transformer = load_object(file_path=transformer_path)
-    encoder = load_object(file_path=encoder_path)
+    bundle = predictor.get_bundle()
+    model = bundle.model
+    preprocessor = bundle.preprocessor
 except Exception as e:
-    st.error(f"Error loading model, transformer, or encoder: {e}")
+    st.error(f"Error loading model or preprocessor: {e}")
+    st.stop()
 
 # Select Action: Prediction
 action = st.sidebar.radio("Select Action", ("Predict Rate",), index=0)  # Default to 'Predict Rate'
@@ -95,42 +103,33 @@ if action == "Predict Rate":
         location = st.selectbox("Location", df["location"].unique(), key="location")
         rest_type = st.selectbox("Restaurant Type", df["rest_type"].unique(), key="rest_type")
     with col2:
-        cuisines = st.selectbox("Cuisines", df["cuisines"].unique(), key="cuisines")
+        # Cuisines are encoded token by token, so any combination of known cuisines can be selected
+        cuisine_options = preprocessor.tokenizer_.vocabulary_["cuisines"]
+        cuisines = st.multiselect("Cuisines", cuisine_options, default=cuisine_options[:1], key="cuisines")
         approx_cost = st.number_input("Approximate Cost", min_value=0.0, value=500.0, key="approx_cost")
         votes = st.slider("Number of Votes", min_value=1, max_value=1500, value=100, step=1, key="votes")
 
-    input_features = pd.DataFrame({
+    input_features = {
         "online_order": [online_order],
         "book_table": [book_table],
         "location": [location],
         "rest_type": [rest_type],
-        "cuisines": [cuisines],
+        "cuisines": [", ".join(cuisines)],
         "approx_cost": [approx_cost],
         "votes": [votes]
-    })
+    }
 
-    # Preprocessing and Encoding
-    input_feature_names = list(transformer.feature_names_in_)
-    try:
-        feature_encoded = transformer.transform(input_features[input_feature_names])
-        feature_encoded_df = pd.DataFrame(feature_encoded, columns=transformer.get_feature_names_out(input_feature_names))
-        encoded_input_features = pd.concat([
-            input_features.drop(columns=input_feature_names).reset_index(drop=True),
-            feature_encoded_df.reset_index(drop=True)
-        ], axis=1)
-        # Apply encoding for ordinal features
-        for col in ordinal_features:
-            encoded_input_features[col] = encoder.transform(encoded_input_features[col])
-    except Exception as e:
-        st.error(f"Preprocessing error: {e}")
-        encoded_input_features = None
+    # Check the input encodes with the fitted preprocessor , the batcher's predictor encodes it once when predicting
+    unseen_labels = preprocessor.unseen_labels(input_features)
+    if unseen_labels:
+        st.error(f"Preprocessing error: previously unseen labels {unseen_labels}")
 
     # Prediction Function
     def predict_rate(features):
-        return model.predict(features)
+        return [batcher.predict({column: values[0] for column, values in features.items()})]
 
     # Handle prediction if preprocessing was successful
-    if encoded_input_features is not None:
+    if not unseen_labels:
         if st.button("Start Prediction", key="start_prediction"):
             with st.spinner("Making prediction... Please wait."):
                 time.sleep(2)
@@ -140,7 +139,7 @@ if action == "Predict Rate":
                         f'<p style="color: red; font-size: 24px; font-weight: bold; text-align: center;">{prediction_text}</p>',
                         unsafe_allow_html=True,
                     )
-                    predicted_rate = predict_rate(encoded_input_features)
+                    predicted_rate = predict_rate(input_features)
                     rate = round(predicted_rate[0], 1)
 
                     # Animated Transition for Rate Value
@@ -0,0 +1,78 @@
+"""
+Cold start time and memory of the model registry, pickled model vs memory mapped forest
+
+    python benchmarks/bench_cold_start.py --registry saved_models --workers 4
+
+For every mode, --workers fresh python processes load the latest bundle through
+Predictor and score one row, then stay alive while their memory is read, so the
+proportional set size (Pss) shows how much of the model is shared between them.
+Linux only (/proc/self/status and /proc/self/smaps_rollup).
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+CHILD = """
+import json, sys, time
+start_time = time.perf_counter()
+from src.predictor import ModelResolver, Predictor
+import_secs = time.perf_counter() - start_time
+predictor = Predictor(ModelResolver(model_registry=sys.argv[1]), mapped_forest=sys.argv[2] == "mapped")
+bundle = predictor.get_bundle()
+load_secs = time.perf_counter() - start_time - import_secs
+predictor.predict({"online_order": ["Yes"], "book_table": ["No"], "location": ["BTM"], "rest_type": ["Quick Bites"],
+                   "cuisines": ["North Indian, Chinese"], "approx_cost": [400.0], "votes": [100.0]})
+first_prediction_secs = time.perf_counter() - start_time - import_secs - load_secs
+
+def read_kb(path, keys):
+    values = {}
+    with open(path) as file:
+        for line in file:
+            key, _, value = line.partition(":")
+            if key in keys:
+                values[key] = int(value.split()[0]) / 1024
+    return values
+
+memory = {**read_kb("/proc/self/status", {"VmRSS", "RssAnon", "RssFile"}), **read_kb("/proc/self/smaps_rollup", {"Pss"})}
+print(json.dumps({"model": type(bundle.model).__name__, "import_secs": import_secs, "load_secs": load_secs,
+                  "first_prediction_secs": first_prediction_secs, **memory}), flush=True)
+sys.stdin.readline()
+"""
+
+
+def read_report(process):
+    # src.config prints connection messages to stdout, the report is the json line
+    for line in process.stdout:
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"Worker exited with code {process.wait()} before reporting")
+
+
+def run_mode(registry, mode, workers):
+    processes = [subprocess.Popen([sys.executable, "-c", CHILD, registry, mode], stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE, text=True) for _ in range(workers)]
+    # every worker reports only once loaded, all of them are alive while memory is sampled
+    reports = [read_report(process) for process in processes]
+    for process in processes:
+        process.communicate("\n")
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--registry", default="saved_models")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'model':>22} {'import s':>8} {'load s':>8} {'1st pred s':>10} {'RSS MB':>8} {'anon MB':>8} {'file MB':>8} {'Pss MB':>8}")
+    for mode in ("pickle", "mapped"):
+        reports = run_mode(args.registry, mode, args.workers)
+        for report in reports:
+            print(f"{mode:>8} {report['model']:>22} {report['import_secs']:>8.3f} {report['load_secs']:>8.3f} {report['first_prediction_secs']:>10.3f} "
+                  f"{report['VmRSS']:>8.1f} {report['RssAnon']:>8.1f} {report['RssFile']:>8.1f} {report['Pss']:>8.1f}")
+        print(f"{mode:>8} total Pss of {args.workers} workers: {sum(report['Pss'] for report in reports):.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare the flattened forest engine (src/forest.py) with RandomForestRegressor.predict
+
+    python benchmarks/bench_forest.py --registry saved_models --data-file cleaned_zomato.csv
+
+Loads the latest model and preprocessor from the registry, exports the forest to a
+temporary directory when saved_models/<n>/forest is missing, then prints the median
+latency of both engines for a few batch sizes and the largest absolute difference
+between their predictions.
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from src.forest import FlatForest, export_forest
+from src.predictor import ModelResolver
+from src.utils import load_object
+
+FEATURES = ["online_order", "book_table", "location", "rest_type", "cuisines", "approx_cost", "votes"]
+
+
+def median_ms(fn, X, repeats):
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        fn(X)
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--registry", default="saved_models")
+    parser.add_argument("--data-file", default="cleaned_zomato.csv")
+    parser.add_argument("--batch-sizes", default="1,32,1000,20000")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    resolver = ModelResolver(model_registry=args.registry)
+    model = load_object(resolver.get_latest_model_path())
+    preprocessor = load_object(resolver.get_latest_preprocessor_path())
+    forest_dir = resolver.get_latest_forest_dir_path()
+    if not os.path.exists(forest_dir):
+        forest_dir = export_forest(model, os.path.join(tempfile.mkdtemp(), "forest"))
+    forest = FlatForest.load(forest_dir)
+
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    df = pd.read_csv(args.data_file, usecols=FEATURES).sample(n=max(batch_sizes), replace=True, random_state=42)
+    X = preprocessor.transform(df)
+    max_diff = float(np.abs(forest.predict(X) - model.predict(X)).max())
+
+    print(f"trees {len(forest.roots)} nodes {len(forest.feature)} features {forest.n_features_in_}")
+    print(f"{'batch':>8} {'sklearn ms':>12} {'flat ms':>10} {'speedup':>8}")
+    for batch_size in batch_sizes:
+        batch = X[:batch_size]
+        sklearn_ms = median_ms(model.predict, batch, args.repeats)
+        flat_ms = median_ms(forest.predict, batch, args.repeats)
+        print(f"{batch_size:>8} {sklearn_ms:>12.3f} {flat_ms:>10.3f} {sklearn_ms / flat_ms:>8.2f}")
+    print(f"max abs difference {max_diff:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Rows/sec and peak memory of the MongoDB readers in src/utils.py
+
+    python benchmarks/bench_mongo_reader.py --rows 50000            # in memory mongomock stand-in
+    python benchmarks/bench_mongo_reader.py --rows 50000 --real     # collection of MONGO_DB_URL (.env)
+
+A throwaway collection is filled with cleaned_zomato.csv rows padded with the raw
+scrape fields (url, reviews_list, menu_item, ...) that featurs_to_drop removes, then
+read with get_collection_as_dataframe (find() into a list of dicts) and with
+read_collection_columns (projected, batched, typed column buffers).
+Peak memory is the tracemalloc peak of the Python heap during the read.
+
+mongomock applies projections in Python and shares the stored string objects, so
+against the stand-in the projected reader looks slower than it is and the unused
+fields look cheaper than they are. Use --real for throughput numbers, where the
+dropped fields are neither sent over the wire nor decoded.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+import pandas as pd
+
+DATABASE_NAME = "Zomato_benchmark"
+COLLECTION_NAME = "Restaurant"
+
+
+def raw_documents(data_file, rows, seed=42):
+    df = pd.read_csv(data_file).sample(n=rows, replace=True, random_state=seed).reset_index(drop=True)
+    df["url"] = "https://www.zomato.com/bangalore/" + df.index.astype(str)
+    df["name"] = "restaurant " + df.index.astype(str)
+    df["address"] = "1st Main, " + df["location"]
+    df["reviews_list"] = "[('Rated 4.0', 'RATED\\n  " + "good food " * 60 + "')]"
+    df["menu_item"] = "[" + "'item', " * 40 + "]"
+    df["dish_liked"] = "Pasta, Burgers, Cocktails"
+    return df.to_dict(orient="records")
+
+
+def measure(reader):
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    df = reader()
+    seconds = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, seconds, peak / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--data-file", default="cleaned_zomato.csv")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--real", action="store_true", help="use MONGO_DB_URL instead of mongomock")
+    args = parser.parse_args()
+
+    if not args.real:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    from src.config import mongo_client
+    from src.utils import get_collection_as_dataframe, read_collection_columns
+
+    collection = mongo_client[DATABASE_NAME][COLLECTION_NAME]
+    collection.drop()
+    collection.insert_many(raw_documents(args.data_file, args.rows))
+    try:
+        readers = {
+            "find() list of dicts": lambda: get_collection_as_dataframe(DATABASE_NAME, COLLECTION_NAME),
+            "projected columnar": lambda: read_collection_columns(DATABASE_NAME, COLLECTION_NAME, batch_size=args.batch_size),
+        }
+        print(f"{'reader':>22} {'rows':>8} {'columns':>8} {'seconds':>8} {'rows/sec':>10} {'peak MB':>8}")
+        for name, reader in readers.items():
+            df, seconds, peak_mb = measure(reader)
+            print(f"{name:>22} {df.shape[0]:>8} {df.shape[1]:>8} {seconds:>8.2f} {df.shape[0] / seconds:>10.0f} {peak_mb:>8.1f}")
+    finally:
+        collection.drop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
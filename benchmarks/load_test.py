@@ -0,0 +1,77 @@
+"""
+Local load test for the prediction service (service.py)
+
+    uvicorn service:app --port 8000
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --requests 2000 --concurrency 8 --batch-size 1
+
+Rows are sampled from cleaned_zomato.csv, every worker thread keeps one
+keep-alive connection open. Client side p50/p99 latency and throughput are
+printed together with the server side /metrics summary.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+
+FEATURES = ["online_order", "book_table", "location", "rest_type", "cuisines", "approx_cost", "votes"]
+
+
+def build_payloads(data_file, n_payloads, batch_size, seed=42):
+    df = pd.read_csv(data_file, usecols=FEATURES).sample(n=n_payloads * batch_size, replace=True, random_state=seed)
+    records = df.to_dict(orient="records")
+    return [json.dumps({"instances": records[i:i + batch_size]}) for i in range(0, len(records), batch_size)]
+
+
+def worker(url, payloads, latencies, errors):
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    for payload in payloads:
+        start_time = time.perf_counter()
+        connection.request("POST", "/predict", body=payload, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        if response.status != 200:
+            errors.append(response.status)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the prediction service")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--data-file", default="cleaned_zomato.csv")
+    args = parser.parse_args()
+
+    url = urlparse(args.url)
+    payloads = build_payloads(args.data_file, args.requests, args.batch_size)
+    latencies, errors = [], []
+    threads = [threading.Thread(target=worker, args=(url, payloads[i::args.concurrency], latencies, errors))
+               for i in range(args.concurrency)]
+
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    latencies = np.asarray(latencies)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"requests={len(latencies)} errors={len(errors)} concurrency={args.concurrency} batch_size={args.batch_size}")
+    print(f"throughput={len(latencies) / elapsed:.1f} req/s rows={len(latencies) * args.batch_size / elapsed:.1f} rows/s")
+    print(f"client latency ms p50={p50:.2f} p95={p95:.2f} p99={p99:.2f} max={latencies.max():.2f}")
+
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    connection.request("GET", "/metrics")
+    print(f"server metrics {connection.getresponse().read().decode()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 import pandas as pd
 from src.config import mongo_client
+from concurrent.futures import ThreadPoolExecutor , wait , FIRST_COMPLETED
+from pymongo import UpdateOne
+import argparse
+import time
 import os ,sys
 
 database_name = "Zomato"
@@ -7,15 +11,93 @@ collection_name="Restaurant"
 file_path=os.path.join(os.getcwd() ,"cleaned_zomato.csv") #cleaned dataset inside researcj.ipynb file
 ##dataset link :- https://www.kaggle.com/datasets/himanshupoddar/zomato-bangalore-restaurants
 
+row_key_field="row_key" #natural key of every dumped row , _id stays an ObjectId for the ingestion watermark
+
 #creating a funtion to dump dataset into mongodb database
 
+def add_row_keys(df:pd.DataFrame , key_columns:list , seen:dict)->pd.DataFrame:
+    """
+    Natural key = hash of the key columns + occurrence number of that hash in the file ,
+    identical rows stay distinct documents and a rerun maps every row to the same key
+    df :pd.DataFrame = chunk read with dtype=str , the hash sees the csv text and not the dtypes
+                       pandas guessed for this chunk (int in one chunk , float in another with a NaN)
+    seen :dict = hash -> rows already keyed in previous chunks
+    """
+    hashes = pd.util.hash_pandas_object(df[key_columns].fillna("") , index=False)
+    occurrence = hashes.groupby(hashes).cumcount() + hashes.map(seen).fillna(0).astype(int)
+    for hash_value , count in hashes.value_counts().items():
+        seen[hash_value] = seen.get(hash_value , 0) + count
+    df[row_key_field] = [f"{hash_value:016x}-{n}" for hash_value , n in zip(hashes , occurrence)]
+    return df
+
+
+def restore_types(df:pd.DataFrame)->pd.DataFrame:
+    #columns read as text go back to numbers when every non empty value parses
+    for column in df.columns:
+        if column==row_key_field:
+            continue
+        numbers = pd.to_numeric(df[column] , errors="coerce")
+        if numbers.notna().sum()==df[column].notna().sum():
+            df[column] = numbers
+    return df
+
+
+def write_chunk(collection , records:list , upsert:bool)->int:
+    #unordered , one failing document does not stop the rest of the batch
+    if upsert:
+        collection.bulk_write([UpdateOne({row_key_field:record[row_key_field]} , {"$set":record} , upsert=True) for record in records] , ordered=False)
+    else:
+        collection.insert_many(records , ordered=False)
+    return len(records)
+
+
+def dump_csv(file_path:str , database_name:str , collection_name:str , chunk_size:int=5000 , workers:int=4 ,
+             key_columns:list=None , upsert:bool=True)->dict:
+    """
+    Streams the csv in chunks and writes them from a small thread pool
+    At most 2*workers chunks are in memory at any time
+    key_columns :list = natural key of a row , default every column: a rerun of the same file writes
+                        no duplicates , but a row whose values changed (e.g. votes of a re-scraped
+                        restaurant) gets a new key and is added next to the old document , never updated
+    return: dict with documents written , seconds and docs/sec
+    """
+    collection = mongo_client[database_name][collection_name]
+    if upsert and not key_columns:
+        print(f" No --key-columns given , rows are keyed by every column: changed rows are added as new documents , not updated")
+    if upsert:
+        collection.create_index(row_key_field , unique=True)
+    seen , written , pending = dict() , 0 , set()
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk in pd.read_csv(file_path , chunksize=chunk_size , dtype=str):
+            if upsert:
+                chunk = add_row_keys(chunk , key_columns or list(chunk.columns) , seen)
+            chunk = restore_types(chunk)
+            #To dump data into Mongo db we need to convert data into keys and values format(eg.Dict or json format)
+            pending.add(executor.submit(write_chunk , collection , chunk.to_dict(orient="records") , upsert))
+            if len(pending)>=2*workers:
+                done , pending = wait(pending , return_when=FIRST_COMPLETED)
+                written += sum(future.result() for future in done)
+        written += sum(future.result() for future in pending)
+    seconds = time.perf_counter() - start_time
+    return {"documents":written , "seconds":round(seconds , 2) , "docs_per_sec":round(written/seconds , 1) if seconds else None}
+
+
 if __name__=="__main__":
-    
-    df=pd.read_csv(file_path)
-    #To dump data into Mongo db we need to convert data into keys and values format(eg.Dict or json format)
-    data_dict=df.to_dict(orient="records")
 
-    #dumping data into MongoDB database
-    mongo_client[database_name][collection_name].insert_many(data_dict)
-    print(f' Data Sucessfully Dumped inside MongoDB Atlas Database')
+    parser = argparse.ArgumentParser(description="Dump a csv file into MongoDB")
+    parser.add_argument("--file" , default=file_path)
+    parser.add_argument("--database" , default=database_name)
+    parser.add_argument("--collection" , default=collection_name)
+    parser.add_argument("--chunk-size" , type=int , default=5000)
+    parser.add_argument("--workers" , type=int , default=4)
+    parser.add_argument("--key-columns" , default=None , help="comma separated natural key columns , default every column (changed rows are added , never updated)")
+    parser.add_argument("--insert" , action="store_true" , help="plain inserts , no upsert on the natural key (reruns duplicate rows)")
+    args = parser.parse_args()
 
+    #dumping data into MongoDB database
+    report = dump_csv(file_path=args.file , database_name=args.database , collection_name=args.collection ,
+                      chunk_size=args.chunk_size , workers=args.workers ,
+                      key_columns=args.key_columns.split(",") if args.key_columns else None ,
+                      upsert=not args.insert)
+    print(f' Data Sucessfully Dumped inside MongoDB Atlas Database : {report}')
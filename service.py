@@ -0,0 +1,132 @@
+import os
+import time
+import asyncio
+import threading
+import warnings
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import List, Union
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from dotenv import load_dotenv
+from src.predictor import get_predictor
+from src.batching import MicroBatcher
+from src.logger import logging
+
+warnings.filterwarnings("ignore")
+
+# Load environment variables from .env (for local testing)
+load_dotenv()
+
+MODEL_REGISTRY = os.getenv("MODEL_REGISTRY", "saved_models")
+MAX_BATCH_ROWS = 1000  # largest micro batch accepted by a single request
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))  # single row requests coalesced per model call
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "2"))  # deadline before a partial batch is flushed
+
+
+class RestaurantInput(BaseModel):
+    online_order: str
+    book_table: str
+    location: str
+    rest_type: str
+    cuisines: str  # comma joined, e.g. "North Indian, Chinese"
+    approx_cost: float
+    votes: float
+
+
+class PredictionRequest(BaseModel):
+    instances: List[RestaurantInput]
+
+
+class PredictionResponse(BaseModel):
+    model_version: int
+    predictions: List[float]
+
+
+class LatencyTracker:
+    """
+    Rolling window of server side prediction latencies (milliseconds)
+    """
+
+    def __init__(self, window: int = 10_000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rows = 0
+
+    def record(self, latency_ms: float, rows: int):
+        with self._lock:
+            self._latencies.append(latency_ms)
+            self.requests += 1
+            self.rows += rows
+
+    def summary(self) -> dict:
+        with self._lock:
+            latencies = np.fromiter(self._latencies, dtype=np.float64)
+            requests, rows = self.requests, self.rows
+        if len(latencies) == 0:
+            return {"requests": requests, "rows": rows, "p50_ms": None, "p99_ms": None, "max_ms": None}
+        p50, p99 = np.percentile(latencies, [50, 99])
+        return {"requests": requests, "rows": rows, "p50_ms": round(float(p50), 3),
+                "p99_ms": round(float(p99), 3), "max_ms": round(float(latencies.max()), 3)}
+
+
+predictor = get_predictor(model_registry=MODEL_REGISTRY)
+latency_tracker = LatencyTracker()
+batcher = MicroBatcher(predict_fn=predictor.predict_with_version, max_batch_size=BATCH_MAX_SIZE,
+                       max_wait_ms=BATCH_MAX_WAIT_MS, returns_version=True)
+
+
+def to_columns(instances: List[RestaurantInput]) -> dict:
+    # column mapping understood by RestaurantPreprocessor.transform, no DataFrame needed
+    return {field: [getattr(row, field) for row in instances] for field in RestaurantInput.model_fields}
+
+
+def predict_rows(instances: List[RestaurantInput]):
+    return predictor.predict_with_version(to_columns(instances))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Preload and warm up the model so the first request does not pay the deserialization cost
+    bundle = predictor.get_bundle()
+    logging.info(f"Prediction service loaded model version {bundle.version} from {MODEL_REGISTRY}")
+    yield
+    batcher.close()
+
+
+app = FastAPI(title="Restaurant Rating Prediction", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    bundle = predictor.get_bundle()
+    return {"status": "ok", "model_version": bundle.version}
+
+
+@app.get("/metrics")
+async def metrics():
+    return {**latency_tracker.summary(), "batcher": batcher.stats()}
+
+
+@app.post("/predict", response_model=PredictionResponse)
+async def predict(request: Union[PredictionRequest, RestaurantInput]):
+    instances = request.instances if isinstance(request, PredictionRequest) else [request]
+    if len(instances) == 0 or len(instances) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=422, detail=f"Send between 1 and {MAX_BATCH_ROWS} rows per request")
+    start_time = time.perf_counter()
+    try:
+        if len(instances) == 1:
+            # concurrent single row requests share one model call through the micro batcher
+            # version and prediction come from the same model call, a hot reload can not split them
+            version, prediction = await batcher.apredict(instances[0].model_dump())
+            predictions = np.asarray([prediction])
+        else:
+            # CPU bound, keep the event loop free for other connections
+            version, predictions = await asyncio.to_thread(predict_rows, instances)
+    except Exception as e:
+        logging.error(f"Prediction error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+    latency_tracker.record((time.perf_counter() - start_time) * 1000, len(instances))
+    return PredictionResponse(model_version=version, predictions=predictions.tolist())
@@ -0,0 +1,132 @@
+from src.exception import SrcException
+from src.logger import logging
+from concurrent.futures import Future
+from collections import Counter
+from typing import Callable , Dict , List
+import numpy as np
+import asyncio
+import threading
+import queue
+import time
+import sys
+
+
+class MicroBatcher:
+
+    """
+    =====================================================================================
+    Request coalescer in front of a model
+
+    Concurrent single row requests are queued and flushed as one batch as soon as either
+    max_batch_size rows are waiting or the oldest row has waited max_wait_ms , so one
+    forest walk is shared by many callers. Each caller gets its own prediction back.
+
+    predict_fn :Callable = receives a mapping column name -> list of values and returns one
+                           prediction per row (e.g. Predictor.predict)
+    returns_version :bool = predict_fn returns (model version , predictions) (e.g. Predictor.predict_with_version)
+                            and every caller gets (model version , prediction) of the same model call
+    max_batch_size :int = largest batch sent to predict_fn
+    max_wait_ms :float = deadline for the oldest queued row before a partial batch is flushed
+
+    Usable from threads (predict) and from asyncio code (apredict).
+    =====================================================================================
+    """
+
+    def __init__(self , predict_fn:Callable , max_batch_size:int=32 , max_wait_ms:float=2.0 , returns_version:bool=False):
+        self.predict_fn=predict_fn
+        self.returns_version=returns_version
+        self.max_batch_size=max_batch_size
+        self.max_wait=max_wait_ms/1000
+        self._queue=queue.Queue()
+        self._stats_lock=threading.Lock()
+        self._batch_size_histogram=Counter()
+        self._max_queue_depth=0
+        self._rows=0
+        self._closed=False
+        self._worker=threading.Thread(target=self._run , name="micro-batcher" , daemon=True)
+        self._worker.start()
+
+    def submit(self , row:Dict)->Future:
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future=Future()
+        self._queue.put((row , future))
+        with self._stats_lock:
+            self._max_queue_depth=max(self._max_queue_depth , self._queue.qsize())
+        return future
+
+    def predict(self , row:Dict , timeout:float=None):
+        return self.submit(row).result(timeout=timeout)
+
+    async def apredict(self , row:Dict):
+        return await asyncio.wrap_future(self.submit(row))
+
+    def _collect(self)->List:
+        #block for the first row , then wait at most max_wait for the batch to fill
+        batch=[self._queue.get()]
+        deadline=time.perf_counter()+self.max_wait
+        while len(batch)<self.max_batch_size:
+            remaining=deadline-time.perf_counter()
+            try:
+                item=self._queue.get(timeout=remaining) if remaining>0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+        return [item for item in batch if item is not None]
+
+    def _predict_batch(self , batch:List):
+        rows=[row for row , _ in batch]
+        columns={column:[row[column] for row in rows] for column in rows[0]}
+        try:
+            if self.returns_version:
+                version , predictions=self.predict_fn(columns)
+            else:
+                version , predictions=None , self.predict_fn(columns)
+            predictions=np.asarray(predictions).ravel()
+            if len(predictions)!=len(batch):
+                #checked before any result is set , so no caller is left waiting on a future zip would skip
+                raise ValueError(f"predict_fn returned {len(predictions)} predictions for {len(batch)} rows")
+            for (_ , future) , prediction in zip(batch , predictions):
+                future.set_result((version , float(prediction)) if self.returns_version else float(prediction))
+        except Exception as e:
+            if len(batch)==1:
+                batch[0][1].set_exception(e)
+                return
+            #one bad row must not fail the whole batch , score rows one by one
+            logging.warning(f"Micro batch of {len(batch)} rows failed , retrying rows individually: {e}")
+            for item in batch:
+                self._predict_batch([item])
+
+    def _run(self):
+        while True:
+            batch=self._collect()
+            if len(batch)>0:
+                with self._stats_lock:
+                    self._batch_size_histogram[len(batch)]+=1
+                    self._rows+=len(batch)
+                try:
+                    self._predict_batch(batch)
+                except Exception as e:
+                    logging.error(f"Micro batcher error: {e}")
+            if self._closed and self._queue.empty():
+                return
+
+    def stats(self)->Dict:
+        try:
+            with self._stats_lock:
+                histogram=dict(sorted(self._batch_size_histogram.items()))
+                batches=sum(histogram.values())
+                return {"queue_depth":self._queue.qsize() ,
+                        "max_queue_depth":self._max_queue_depth ,
+                        "batches":batches ,
+                        "rows":self._rows ,
+                        "mean_batch_size":round(self._rows/batches , 3) if batches else None ,
+                        "batch_size_histogram":histogram}
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def close(self):
+        #sentinel wakes up the worker , queued rows are still answered
+        self._closed=True
+        self._queue.put(None)
+        self._worker.join()
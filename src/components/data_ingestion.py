@@ -4,6 +4,8 @@ from src.logger import logging
 from sklearn.model_selection import train_test_split
 from src import utils
 from src.config import mongo_client , featurs_to_drop
+from bson import ObjectId
+from datetime import datetime
 import pandas as pd
 import os , sys
 
@@ -18,13 +20,80 @@ class DataIngestion:
             raise SrcException(e ,sys)    
         
 
+    @staticmethod
+    def encode_watermark(watermark)->dict:
+        if isinstance(watermark , ObjectId):
+            return {"type":"objectid" , "value":str(watermark)}
+        if isinstance(watermark , datetime):
+            return {"type":"datetime" , "value":watermark.isoformat()}
+        return {"type":"value" , "value":watermark}
+
+    @staticmethod
+    def decode_watermark(watermark:dict):
+        if watermark["type"]=="objectid":
+            return ObjectId(watermark["value"])
+        if watermark["type"]=="datetime":
+            return datetime.fromisoformat(watermark["value"])
+        return watermark["value"]
+
+    def read_watermark(self):
+        """
+        last ingested watermark , None when the local feature store or its watermark is missing (full load)
+        """
+        try:
+            store_file_path = self.data_ingestion_config.local_feature_store_file_path
+            watermark_file_path = self.data_ingestion_config.watermark_file_path
+            if not (os.path.exists(store_file_path) and os.path.exists(watermark_file_path)):
+                return None
+            watermark = utils.read_yaml_file(watermark_file_path)
+            if watermark.get("field")!=self.data_ingestion_config.watermark_field:
+                logging.info(f"Watermark field changed from {watermark.get('field')} , running a full load")
+                return None
+            return self.decode_watermark(watermark)
+        except Exception as e:
+            raise SrcException(e ,sys)
+
+    def update_local_feature_store(self)->pd.DataFrame:
+        """
+        Fetches the documents past the watermark and merges them into the local feature store
+        Changed documents replace the stored row with the same _id
+        return: full feature store dataframe
+        """
+        try:
+            watermark = self.read_watermark()
+            logging.info(f'Exporting Data from MongoDB past watermark {watermark}')
+            delta_df , new_watermark = utils.get_collection_delta_as_dataframe(database_name=self.data_ingestion_config.database_name ,
+                                                                              collection_name=self.data_ingestion_config.collection_name ,
+                                                                              watermark_field=self.data_ingestion_config.watermark_field ,
+                                                                              watermark=watermark)
+            store_file_path = self.data_ingestion_config.local_feature_store_file_path
+            if watermark is None:
+                df = delta_df
+            else:
+                store_df = utils.load_dataframe(file_path=store_file_path , categorical=False)
+                df = pd.concat([store_df , delta_df] , ignore_index=True).drop_duplicates(subset="_id" , keep="last")
+            logging.info(f'Local feature store rows {df.shape[0]} , delta rows {delta_df.shape[0]}')
+
+            if delta_df.shape[0]>0 or watermark is None:
+                #store is replaced atomically before the watermark moves , a crash in between only refetches the delta
+                os.makedirs(self.data_ingestion_config.local_feature_store_dir , exist_ok=True)
+                utils.save_dataframe(file_path=f"{store_file_path}.tmp" , df=df)
+                os.replace(f"{store_file_path}.tmp" , store_file_path)
+                utils.write_yaml_file(file_path=self.data_ingestion_config.watermark_file_path ,
+                                      data={"field":self.data_ingestion_config.watermark_field ,
+                                            **self.encode_watermark(new_watermark) ,
+                                            "rows":int(df.shape[0]) ,
+                                            "delta_rows":int(delta_df.shape[0])})
+            return df
+        except Exception as e:
+            raise SrcException(e ,sys)
+
     def initiate_data_ingestion(self)-> artifact_entity.DataIngestionArtifact:
 
         try:
-            logging.info(f'Exporting Data from MongoDB as pandas Dataframe')
-            df= utils.get_collection_as_dataframe(database_name=self.data_ingestion_config.database_name ,
-                                                  collection_name=self.data_ingestion_config.collection_name
-                                                  )
+            df = self.update_local_feature_store()
+            if "_id" in df.columns:
+                df = df.drop("_id" , axis=1)
             
             logging.info(f'Saving Data in feature store')
             #feature store directory path 
@@ -34,7 +103,7 @@ class DataIngestion:
             os.makedirs(feature_store_dir , exist_ok=True)
             logging.info(f'Save to feature Store Folder')
 
-            df.to_csv(path_or_buf=self.data_ingestion_config.feature_store_file_path , index=False  , header=True)
+            utils.save_dataframe(file_path=self.data_ingestion_config.feature_store_file_path , df=df)
             
             logging.info("split dataset into train and test set")
             #split dataset into train and test set
@@ -47,8 +116,8 @@ class DataIngestion:
 
             logging.info("Save df to feature store folder")
             #Save df to feature store folder
-            train_df.to_csv(path_or_buf=self.data_ingestion_config.train_file_path,index=False,header=True)
-            test_df.to_csv(path_or_buf=self.data_ingestion_config.test_file_path,index=False,header=True)
+            utils.save_dataframe(file_path=self.data_ingestion_config.train_file_path , df=train_df)
+            utils.save_dataframe(file_path=self.data_ingestion_config.test_file_path , df=test_df)
             
             #Prepare artifact
 
@@ -5,10 +5,12 @@ from src.entity.artifact_entity import DataIngestionArtifact , DataTransformatio
 from src.logger import logging
 from scipy.stats import ks_2samp, chi2_contingency
 from typing import Optional
-from src.config import target_column , ordinal_features , nominal_features
-from sklearn.preprocessing import OneHotEncoder , LabelEncoder
+from src.config import target_column , ordinal_features , nominal_features , multi_label_features , numerical_features , feature_store_columns
+from src.preprocessing import RestaurantPreprocessor
+from src.predictor import ModelResolver
 from src.utils import load_numpy_array_data , save_object , load_object , save_numpy_array_data 
 import numpy as np
+from scipy import sparse
 import dill
 import re
 import pandas as pd
@@ -29,69 +31,65 @@ class DataTransformation:
             raise SrcException(e ,sys)     
         
 
+    def registry_preprocessor(self , train_df:pd.DataFrame , test_df:pd.DataFrame)->Optional[RestaurantPreprocessor]:
+        """
+        Latest registry preprocessor when it can encode both splits , None when a new one has to be fitted
+        """
+        try:
+            model_resolver = ModelResolver(model_registry=self.data_transformation_config.model_registry)
+            if model_resolver.get_latest_dir_path() is None:
+                return None
+            preprocessor = load_object(file_path=model_resolver.get_latest_preprocessor_path())
+            if not (preprocessor.can_transform(train_df) and preprocessor.can_transform(test_df)):
+                logging.info(f"Registry preprocessor has no code for new ordinal labels , fitting a new one")
+                return None
+            return preprocessor
+        except Exception as e:
+            raise SrcException(e ,sys)
+
+
     def initiate_data_transformation(self)->DataTransformationArtifact:
         
         try:
             logging.info(f'Reading Train and Test data as DataFrame')
             #reading data as pd.dataframe
-            train_df= pd.read_csv(self.data_ingestion_artifact.train_file_path)
-            test_df= pd.read_csv(self.data_ingestion_artifact.test_file_path)
-            
-            #applying lable encoding to ordinal features
-            encoder=LabelEncoder() 
-            
-            for col in ordinal_features:
-                 train_df[col]=encoder.fit_transform(train_df[col])
-                 test_df[col]=encoder.transform(test_df[col])
+            train_df= utils.load_dataframe(self.data_ingestion_artifact.train_file_path , columns=list(feature_store_columns))
+            test_df= utils.load_dataframe(self.data_ingestion_artifact.test_file_path , columns=list(feature_store_columns))
             
-            one_hot_encoder= OneHotEncoder(sparse_output=False ,handle_unknown="ignore")
-            #Lets apply One_Hot_Encoder on train_df 
-            logging.info(f' Applying OneHotEncoding to this Nominal Features inside training data {nominal_features}')
-            encoded_train_df  = one_hot_encoder.fit_transform(train_df[nominal_features])
-            train_encoded_df = pd.DataFrame(encoded_train_df, columns=one_hot_encoder.get_feature_names_out())
-            
-            # Transform on test data
-            test_encoded_features = one_hot_encoder.transform(test_df[nominal_features])
-            test_encoded_df = pd.DataFrame(test_encoded_features, columns=one_hot_encoder.get_feature_names_out())
-            
-            logging.info(f"Data tranformed for this features :{nominal_features}")
-
-            # Concatenate the original DataFrame (without the nominal features) with the new encoded DataFrame
-            train_df = pd.concat([train_df, train_encoded_df], axis=1)
-            train_df=train_df.drop(nominal_features , axis=1)
-            
-            #test encoded feature
-            test_df = pd.concat([test_df , test_encoded_df], axis=1)
-            test_df=test_df.drop(nominal_features , axis=1)
-            
-           
-            logging.info(f"Spliting inpur features for both Train and Test data")
-            #Select Input Features for both train and test data
-            input_features_train_df= train_df.drop(target_column , axis=1)
-            input_features_test_df=test_df.drop(target_column , axis=1)
-
-            #selecting target features from both train and test dataframe
-            target_feature_train_df= train_df[target_column]
-            target_feature_test_df= test_df[target_column]
+            preprocessor=None
+            if self.data_transformation_config.reuse_registry_preprocessor:
+                preprocessor=self.registry_preprocessor(train_df=train_df , test_df=test_df)
+            if preprocessor is not None:
+                logging.info(f'Encoding with the registry preprocessor , feature layout unchanged')
+                train_features = preprocessor.transform(train_df)
+            else:
+                #single preprocessing object : label codes for ordinal , one hot for nominal and multi hot tokens for multi label features
+                preprocessor=RestaurantPreprocessor(ordinal_features=ordinal_features ,
+                                                    nominal_features=nominal_features ,
+                                                    multi_label_features=multi_label_features ,
+                                                    numerical_features=numerical_features ,
+                                                    tokenizer_min_frequency=self.data_transformation_config.tokenizer_min_frequency)
+                logging.info(f' Fitting preprocessor on training data , nominal {nominal_features} multi label {multi_label_features}')
+                train_features = preprocessor.fit_transform(train_df)
+            test_features = preprocessor.transform(test_df)
+            logging.info(f"Data tranformed , output features : {len(preprocessor.get_feature_names_out())}")
 
             logging.info(f"spliting target features for train and test data")
-           
-            #target encoder
-            train_arr = np.c_[input_features_train_df,target_feature_train_df]
-            test_arr=np.c_[input_features_test_df,target_feature_test_df]
+            #sparse csr matrix [input features , target] so the dense one-hot block is never built
+            train_arr = sparse.hstack([train_features , train_df[[target_column]].to_numpy(dtype=np.float64)] , format="csr")
+            test_arr = sparse.hstack([test_features , test_df[[target_column]].to_numpy(dtype=np.float64)] , format="csr")
+            logging.info(f"Transformed train shape {train_arr.shape} non zero {train_arr.nnz} , test shape {test_arr.shape}")
             
             #save numpy array 
             save_numpy_array_data(file_path=self.data_transformation_config.data_tranformed_train_file_path, array=train_arr)
             save_numpy_array_data(file_path=self.data_transformation_config.data_tranformed_test_file_path , array=test_arr)
             
-            #input feature  encoder object
-            save_object(self.data_transformation_config.transformed_object_file_path , obj=one_hot_encoder)
-            save_object(self.data_transformation_config.encoder_object_file_path , obj=encoder)
+            #input feature preprocessor object
+            save_object(self.data_transformation_config.preprocessor_object_file_path , obj=preprocessor)
 
 
             data_tranformation_artifact=DataTransformationArtifact(
-                                   transformed_object_file_path = self.data_transformation_config.transformed_object_file_path,
-                                   encoder_object_file_path=self.data_transformation_config.encoder_object_file_path,
+                                   preprocessor_object_file_path = self.data_transformation_config.preprocessor_object_file_path,
                                    transformed_train_file_path =self.data_transformation_config.data_tranformed_train_file_path,
                                    transformed_test_file_path =self.data_transformation_config.data_tranformed_test_file_path
             )
@@ -3,10 +3,10 @@ from src.exception import SrcException
 from src.entity.config_entity import DataValidationConfig
 from src.entity.artifact_entity import DataIngestionArtifact
 from src.logger import logging
-from scipy.stats import ks_2samp, chi2_contingency
 from typing import Optional
 from src.config import target_column
-import numpy as np
+from src.drift import BaselineProfile , DriftDetector
+from src.sketches import DataSketch , sketch_parquet_file
 import re
 import pandas as pd
 from src import utils
@@ -23,6 +23,7 @@ class DataValidation:
             self.data_validation_config=data_validation_config 
             self.data_ingestion_artifact=data_ingestion_artifact
             self.validation_error=dict()
+            self._drift_detector=None
         except Exception as e:
             raise SrcException(e,sys)    
 
@@ -55,10 +56,27 @@ class DataValidation:
             raise SrcException(e,sys) 
     
     
-    def is_required_columns_exists(self,base_df:pd.DataFrame,current_df:pd.DataFrame,report_key_name:str)->bool:
+    def drop_missing_value_profile_columns(self , base_profile:BaselineProfile , report_key_name:str)->list:
+        """
+        Same threshold as drop_missing_value_columns , applied to the null rates of the baseline profile
+        returns the base column names that are kept
+        """
+        try:
+            threshold=self.data_validation_config.missing_threshold
+            null_report=base_profile.null_rates()
+            drop_column_names = null_report[null_report>threshold].index
+
+            logging.info(f"Columns to drop: {list(drop_column_names)}")
+            self.validation_error[report_key_name]=list(drop_column_names)
+            return [column for column in null_report.index if column not in drop_column_names]
+
+        except Exception as e:
+            raise SrcException(e,sys)
+
+
+    def is_required_columns_exists(self,base_columns:list,current_df:pd.DataFrame,report_key_name:str)->bool:
         try:
            
-            base_columns = base_df.columns
             current_columns = current_df.columns
 
             missing_columns = []
@@ -76,94 +94,97 @@ class DataValidation:
             raise SrcException(e, sys)
    
     
-    def data_drift(self, base_df: pd.DataFrame, current_df: pd.DataFrame, report_key_name: str):
+    def data_drift(self, base_profile: BaselineProfile, current_df: pd.DataFrame, report_key_name: str):
+        """
+        KS test for numerical columns and chi square test on aligned category counts for categorical columns ,
+        both against the baseline profile so the base dataset is never read here
+        """
         try:
-            drift_report = dict()
+            self.validation_error[report_key_name] = self.get_drift_detector(base_profile).detect(current_df)
+        except Exception as e:
+            raise SrcException(e, sys)
 
-            base_columns = base_df.columns
-            current_columns = current_df.columns
 
-            for base_column in base_columns:
-                base_data = base_df[base_column]
-                current_data = current_df[base_column]
-                
-                # Handle numerical features
-                if base_data.dtype in [np.float64, np.int64]:
-                    logging.info(f"Hypothesis {base_column}: {base_data.dtype}, {current_data.dtype} ")
-                    same_distribution = ks_2samp(base_data, current_data)
-
-                    if same_distribution.pvalue > 0.05:
-                        drift_report[base_column] = {
-                            "pvalues": float(same_distribution.pvalue),
-                            "same_distribution": True
-                        }
-                    else:
-                        drift_report[base_column] = {
-                            "pvalues": float(same_distribution.pvalue),
-                            "same_distribution": False
-                        }
-                
-                # Handle categorical features
-                elif base_data.dtype == 'object':
-                    # Creating contingency table
-                    contingency_table = pd.crosstab(base_data, current_data)
-                    chi2, p_value, _, _ = chi2_contingency(contingency_table)
-
-                    if p_value > 0.05:
-                        drift_report[base_column] = {
-                            "pvalues": float(p_value),
-                            "same_distribution": True
-                        }
-                    else:
-                        drift_report[base_column] = {
-                            "pvalues": float(p_value),
-                            "same_distribution": False
-                        }
-
-            self.validation_error[report_key_name] = drift_report
+    def get_drift_detector(self, base_profile: BaselineProfile) -> DriftDetector:
+        #one detector per base profile , shared by the train and test checks
+        if self._drift_detector is None or self._drift_detector.profile is not base_profile:
+            self._drift_detector = DriftDetector(profile=base_profile,
+                                                 pvalue_threshold=self.data_validation_config.drift_pvalue_threshold,
+                                                 sample_size=self.data_validation_config.drift_sample_size,
+                                                 n_jobs=self.data_validation_config.drift_n_jobs)
+        return self._drift_detector
+
+   
+    def validate_with_sketches(self , base_profile:BaselineProfile , base_columns:list , file_path:str , dataset_name:str)->DataSketch:
+        """
+        Profiling mode for ingests that do not fit in memory: one chunked pass over the parquet file
+        builds mergeable column sketches (null counts , KLL quantiles , heavy hitters , HyperLogLog , samples) ,
+        missing values , required columns and drift are then checked on the sketch instead of a DataFrame
+        """
+        try:
+            logging.info(f"Sketching {dataset_name} dataset {file_path}")
+            data_sketch = sketch_parquet_file(file_path=file_path,
+                                              chunk_size=self.data_validation_config.sketch_chunk_size,
+                                              n_jobs=self.data_validation_config.sketch_n_jobs,
+                                              quantile_k=self.data_validation_config.sketch_quantile_k,
+                                              heavy_hitters=self.data_validation_config.sketch_heavy_hitters,
+                                              sample_size=self.data_validation_config.sketch_sample_size,
+                                              seed=self.data_validation_config.sketch_seed)
+            self.validation_error[f"profile_of_{dataset_name}_dataset"] = data_sketch.report()
+
+            threshold=self.data_validation_config.missing_threshold
+            null_report=data_sketch.null_rates()
+            drop_column_names = list(null_report[null_report>threshold].index)
+            logging.info(f"Columns to drop: {drop_column_names}")
+            self.validation_error[f"missing_values_within_{dataset_name}_dataset"]=drop_column_names
+            for column in drop_column_names:
+                data_sketch.columns.pop(column)
+
+            missing_columns = [column for column in base_columns if column not in data_sketch.columns]
+            if len(missing_columns)>0:
+                self.validation_error[f"missing_columns_within_{dataset_name}_dataset"]=missing_columns
+                return data_sketch
+
+            logging.info(f"As all column are available in {dataset_name} sketch hence detecting data drift")
+            self.validation_error[f"data_drift_within_{dataset_name}_dataset"] = self.get_drift_detector(base_profile).detect_sketch(data_sketch)
+            return data_sketch
         except Exception as e:
             raise SrcException(e, sys)
 
-   
+
     def initiate_data_validation(self)->artifact_entity.DataValidationArtifact:
         try:
-            logging.info(f"Reading base dataframe")
-            base_df = pd.read_csv(self.data_validation_config.base_data_file_path)
-            base_df.replace({"na":np.NAN},inplace=True)
-            
-            logging.info(f"Replace na value in base df")
-            #base_df has na as null
-            logging.info(f"Drop null values colums from base df")
-            base_df=self.drop_missing_value_columns(df=base_df,report_key_name="missing_values_within_base_dataset")
-
-            logging.info(f"Reading train dataframe")
-            train_df = pd.read_csv(self.data_ingestion_artifact.train_file_path)
-           
-            logging.info(f"Reading test dataframe")
-            test_df = pd.read_csv(self.data_ingestion_artifact.test_file_path)
-           
-            logging.info(f"Drop null values colums from train df")
-            train_df = self.drop_missing_value_columns(df=train_df,report_key_name="missing_values_within_train_dataset")
-            logging.info(f"Drop null values colums from test df")
-            test_df = self.drop_missing_value_columns(df=test_df,report_key_name="missing_values_within_test_dataset")
-            
             exclude_columns = [target_column]
-            base_df = utils.convert_columns_float(df=base_df, exclude_columns=exclude_columns)
-            train_df = utils.convert_columns_float(df=train_df, exclude_columns=exclude_columns)
-            test_df = utils.convert_columns_float(df=test_df, exclude_columns=exclude_columns)
-
-
-            logging.info(f"Is all required columns present in train df")
-            train_df_columns_status = self.is_required_columns_exists(base_df=base_df, current_df=train_df,report_key_name="missing_columns_within_train_dataset")
-            logging.info(f"Is all required columns present in test df")
-            test_df_columns_status = self.is_required_columns_exists(base_df=base_df, current_df=test_df,report_key_name="missing_columns_within_test_dataset")
-
-            if train_df_columns_status:
-                logging.info(f"As all column are available in train df hence detecting data drift")
-                self.data_drift(base_df=base_df, current_df=train_df,report_key_name="data_drift_within_train_dataset")
-            if test_df_columns_status:
-                logging.info(f"As all column are available in test df hence detecting data drift")
-                self.data_drift(base_df=base_df, current_df=test_df,report_key_name="data_drift_within_test_dataset")
+            logging.info(f"Reading baseline profile of the base dataset")
+            #built once from the base dataset ("na" as null , numeric columns as float) and rebuilt only when it changes
+            base_profile = BaselineProfile.from_base_file(base_data_file_path=self.data_validation_config.base_data_file_path,
+                                                          exclude_columns=exclude_columns,
+                                                          max_levels=self.data_validation_config.profile_max_levels,
+                                                          n_quantiles=self.data_validation_config.profile_quantiles)
+
+            logging.info(f"Drop null values colums from base profile")
+            base_columns = self.drop_missing_value_profile_columns(base_profile=base_profile,report_key_name="missing_values_within_base_dataset")
+            base_profile = base_profile.subset(base_columns)
+
+            datasets = (("train" , self.data_ingestion_artifact.train_file_path) , ("test" , self.data_ingestion_artifact.test_file_path))
+            for dataset_name , file_path in datasets:
+                if utils.parquet_row_count(file_path)>self.data_validation_config.sketch_row_threshold:
+                    #too large for a DataFrame , validated from one chunked pass of sketches
+                    self.validate_with_sketches(base_profile=base_profile, base_columns=base_columns, file_path=file_path, dataset_name=dataset_name)
+                    continue
+
+                logging.info(f"Reading {dataset_name} dataframe")
+                current_df = utils.load_dataframe(file_path=file_path , categorical=False)
+
+                logging.info(f"Drop null values colums from {dataset_name} df")
+                current_df = self.drop_missing_value_columns(df=current_df,report_key_name=f"missing_values_within_{dataset_name}_dataset")
+                current_df = utils.convert_columns_float(df=current_df, exclude_columns=exclude_columns)
+
+                logging.info(f"Is all required columns present in {dataset_name} df")
+                columns_status = self.is_required_columns_exists(base_columns=base_columns, current_df=current_df,report_key_name=f"missing_columns_within_{dataset_name}_dataset")
+                if columns_status:
+                    logging.info(f"As all column are available in {dataset_name} df hence detecting data drift")
+                    self.data_drift(base_profile=base_profile, current_df=current_df,report_key_name=f"data_drift_within_{dataset_name}_dataset")
 
             #write the report
             logging.info("Write reprt in yaml file")
@@ -6,9 +6,10 @@ import os, sys
 from src import utils
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.metrics import r2_score
 import streamlit as st
-from src.config import target_column, ordinal_features, nominal_features
+from src.config import target_column , feature_store_columns
 
 
 class ModelEvaluation:
@@ -16,96 +17,109 @@ class ModelEvaluation:
     def __init__(self,
                  model_evaluation_config: config_entity.ModelEvaluationConfig,
                  data_ingestion_artifact: artifact_entity.DataIngestionArtifact,
-                 data_transformation_artifact: artifact_entity.DataTransformationArtifact,
-                 model_trainer_artifact: artifact_entity.ModelTrainerArtifact):
+                 data_transformation_artifact: artifact_entity.DataTransformationArtifact = None,
+                 model_trainer_artifact: artifact_entity.ModelTrainerArtifact = None):
         try:
             logging.info(f'{">"*20} Model Evaluation {"<"*20}')
             self.model_evaluation_config = model_evaluation_config
             self.data_ingestion_artifact = data_ingestion_artifact
             self.data_transformation_artifact = data_transformation_artifact
             self.model_trainer_artifact = model_trainer_artifact
-            self.model_resolver = ModelResolver()
+            self.model_resolver = ModelResolver(model_registry=self.model_evaluation_config.model_registry)
         except Exception as e:
             raise SrcException(e, sys)
 
-    def _prepare_input(self, df: pd.DataFrame, encoder, transformer) -> pd.DataFrame:
+    def cached_score(self, model_dir: str, data_hash: str):
+        #r2 of the registry version on this test snapshot when an earlier run scored it , else None
+        score_file_path = os.path.join(model_dir, self.model_evaluation_config.score_cache_file_name)
+        if not os.path.exists(score_file_path):
+            return None
+        return (utils.read_yaml_file(file_path=score_file_path) or dict()).get(data_hash)
+
+    def save_score(self, model_dir: str, data_hash: str, score: float) -> None:
+        #registry versions never change , their score on a given test snapshot is computed once
+        score_file_path = os.path.join(model_dir, self.model_evaluation_config.score_cache_file_name)
+        scores = (utils.read_yaml_file(file_path=score_file_path) or dict()) if os.path.exists(score_file_path) else dict()
+        scores[data_hash] = score
+        utils.write_yaml_file(file_path=f"{score_file_path}.tmp", data=scores)
+        os.replace(f"{score_file_path}.tmp", score_file_path)
+
+    def score_previous_model(self) -> artifact_entity.PreviousModelScoreArtifact:
         """
-        Prepares the input DataFrame by:
-        - Dropping target column
-        - Encoding ordinal features using the provided encoder
-        - Applying transformer (e.g., OneHotEncoder) to nominal features
-        - Concatenating transformed features with non-encoded features
+        R2 score of the latest registry model on the current test data
+        Only needs the test split , so it can run while the current model is still training
+        The score is cached in the registry version keyed by the test file hash ,
+        an unchanged test split does not load the previous model again
         """
         try:
-            # Drop target column
-            input_df = df.drop(target_column, axis=1).copy()
+            logging.info(f"Checking if a previously saved model exists for comparison")
+            latest_dir_path = self.model_resolver.get_latest_dir_path()
+            if latest_dir_path is None:
+                return artifact_entity.PreviousModelScoreArtifact(model_dir=None, r2_score=None)
 
-            # Encode ordinal features
-            for col in ordinal_features:
-                input_df[col] = encoder.transform(input_df[col])
+            data_hash = utils.file_sha256(self.data_ingestion_artifact.test_file_path)
+            prev_r2_score = self.cached_score(model_dir=latest_dir_path, data_hash=data_hash)
+            if prev_r2_score is not None:
+                logging.info(f"R2 Score of previous model {latest_dir_path} cached for this test data: {prev_r2_score}")
+                return artifact_entity.PreviousModelScoreArtifact(model_dir=latest_dir_path, r2_score=float(prev_r2_score))
 
-            # Extract feature names used during transformation
-            input_features_name = list(transformer.feature_names_in_)
+            logging.info(f"Fetching paths for previous Preprocessor and Model")
+            preprocessor_path = self.model_resolver.get_latest_preprocessor_path()
+            model_path = self.model_resolver.get_latest_model_path()
 
-            # Apply transformer on nominal features
-            transformed = transformer.transform(input_df[input_features_name])
-            transformed_df = pd.DataFrame(
-                transformed,
-                columns=transformer.get_feature_names_out(input_features_name)
-            )
+            if not os.path.exists(preprocessor_path):
+                # Registry versions saved before the single preprocessor object can not encode the current test data
+                logging.info(f"Previous model has no preprocessor at {preprocessor_path}, accepting current model")
+                return artifact_entity.PreviousModelScoreArtifact(model_dir=None, r2_score=None)
 
-            # Combine transformed features with remaining features
-            final_input_df = pd.concat(
-                [
-                    input_df.drop(columns=input_features_name).reset_index(drop=True),
-                    transformed_df.reset_index(drop=True)
-                ],
-                axis=1
-            ).reset_index(drop=True)
+            logging.info(f"Loading previously trained Preprocessor and Model")
+            preprocessor = utils.load_object(file_path=preprocessor_path)
+            model = utils.load_object(file_path=model_path)
+
+            # Load test data
+            test_df = utils.load_dataframe(self.data_ingestion_artifact.test_file_path , columns=list(feature_store_columns))
+
+            # Evaluate previous model
+            prev_predictions = model.predict(preprocessor.transform(test_df))
+            prev_r2_score = float(r2_score(test_df[target_column], prev_predictions))
+            logging.info(f"R2 Score using previous model: {prev_r2_score}")
+            self.save_score(model_dir=latest_dir_path, data_hash=data_hash, score=prev_r2_score)
+            previous_model_score_artifact = artifact_entity.PreviousModelScoreArtifact(model_dir=latest_dir_path, r2_score=prev_r2_score)
+            logging.info(f"Previous model score artifact: {previous_model_score_artifact}")
+            return previous_model_score_artifact
 
-            return final_input_df
         except Exception as e:
             raise SrcException(e, sys)
 
-    def initiate_model_evaluation(self) -> artifact_entity.ModelEvaluationArtifact:
+    def score_current_model(self) -> float:
+        """
+        R2 score of the current model on the transformed test array of DataTransformation ,
+        the trainer already computed it on the same array
+        """
         try:
-            logging.info(f"Checking if a previously saved model exists for comparison")
-            latest_dir_path = self.model_resolver.get_latest_dir_path()
-            if latest_dir_path is None:
+            if self.model_trainer_artifact.r2_test_score is not None:
+                return float(self.model_trainer_artifact.r2_test_score)
+            current_model = utils.load_object(file_path=self.model_trainer_artifact.model_file_path)
+            test_array = utils.load_numpy_array_data(file_path=self.data_transformation_artifact.transformed_test_file_path)
+            y_test = test_array[:, -1].toarray().ravel() if sparse.issparse(test_array) else np.asarray(test_array[:, -1]).ravel()
+            return float(r2_score(y_test, current_model.predict(test_array[:, :-1])))
+        except Exception as e:
+            raise SrcException(e, sys)
+
+    def initiate_model_evaluation(self, previous_model_score_artifact: artifact_entity.PreviousModelScoreArtifact = None) -> artifact_entity.ModelEvaluationArtifact:
+        try:
+            if previous_model_score_artifact is None:
+                previous_model_score_artifact = self.score_previous_model()
+
+            if previous_model_score_artifact.r2_score is None:
                 model_evaluation_artifact = artifact_entity.ModelEvaluationArtifact(
                     is_model_accepted=True, improved_accuracy=None)
                 logging.info(f"Model Evaluation artifact: {model_evaluation_artifact}")
                 return model_evaluation_artifact
-
-            logging.info(f"Fetching paths for previous Transformer, Model, and Encoder")
-            transformer_path = self.model_resolver.get_latest_transformer_path()
-            model_path = self.model_resolver.get_latest_model_path()
-            encoder_path = self.model_resolver.get_latest_encoder_path()
-
-            logging.info(f"Loading previously trained Transformer, Model, and Encoder")
-            transformer = utils.load_object(file_path=transformer_path)
-            model = utils.load_object(file_path=model_path)
-            encoder = utils.load_object(file_path=encoder_path)
-
-            logging.info(f"Loading currently trained Transformer, Model, and Encoder")
-            current_model = utils.load_object(file_path=self.model_trainer_artifact.model_file_path)
-            current_transformer = utils.load_object(file_path=self.data_transformation_artifact.transformed_object_file_path)
-            current_encoder = utils.load_object(file_path=self.data_transformation_artifact.encoder_object_file_path)
-
-            # Load test data
-            test_df = pd.read_csv(self.data_ingestion_artifact.test_file_path)
-            target_df = test_df[target_column]
-
-            # Evaluate previous model
-            prev_input_df = self._prepare_input(test_df, encoder, transformer)
-            prev_predictions = model.predict(prev_input_df)
-            prev_r2_score = r2_score(target_df, prev_predictions)
-            logging.info(f"R2 Score using previous model: {prev_r2_score}")
+            prev_r2_score = previous_model_score_artifact.r2_score
 
             # Evaluate current model
-            current_input_df = self._prepare_input(test_df, current_encoder, current_transformer)
-            current_predictions = current_model.predict(current_input_df)
-            current_r2_score = r2_score(target_df, current_predictions)
+            current_r2_score = self.score_current_model()
             logging.info(f"R2 Score using current model: {current_r2_score}")
 
             if current_r2_score <= prev_r2_score:
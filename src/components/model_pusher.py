@@ -3,6 +3,8 @@ from src.entity.config_entity import ModelPusherConfig
 from src.exception import SrcException
 import os,sys
 from src.utils import load_object , save_object
+from src.forest import export_forest
+from sklearn.ensemble import RandomForestRegressor
 from src.logger import logging
 from src.entity.artifact_entity import DataTransformationArtifact,ModelTrainerArtifact,ModelPusherArtifact
 class ModelPusher:
@@ -22,26 +24,29 @@ class ModelPusher:
     def initiate_model_pusher(self,)->ModelPusherArtifact:
         try:
             #load object
-            logging.info(f"Loading transformer model and target encoder")
-            transformer = load_object(file_path=self.data_transformation_artifact.transformed_object_file_path)
+            logging.info(f"Loading preprocessor and model")
+            preprocessor = load_object(file_path=self.data_transformation_artifact.preprocessor_object_file_path)
             model = load_object(file_path=self.model_trainer_artifact.model_file_path)
-            encoder=load_object(file_path=self.data_transformation_artifact.encoder_object_file_path)
 
             #model pusher dir
             logging.info(f"Saving model into model pusher directory")
-            save_object(file_path=self.model_pusher_config.pusher_transformer_path, obj=transformer)
+            save_object(file_path=self.model_pusher_config.pusher_preprocessor_path, obj=preprocessor)
             save_object(file_path=self.model_pusher_config.pusher_model_path, obj=model)
-            save_object(file_path=self.model_pusher_config.pusher_encoder_path, obj=encoder)
+            if isinstance(model , RandomForestRegressor):
+                logging.info(f"Exporting forest arrays into model pusher directory")
+                export_forest(model=model , forest_dir=self.model_pusher_config.pusher_forest_dir)
             
             #saved model dir
             logging.info(f"Saving model in saved model dir")
-            transformer_path=self.model_resolver.get_latest_save_transformer_path()
+            preprocessor_path=self.model_resolver.get_latest_save_preprocessor_path()
             model_path=self.model_resolver.get_latest_save_model_path()
-            encoder_path=self.model_resolver.get_latest_save_encoder_path()
+            forest_dir=self.model_resolver.get_latest_save_forest_dir_path()
 
-            save_object(file_path=transformer_path, obj=transformer)
-            save_object(file_path=encoder_path, obj=encoder)
+            save_object(file_path=preprocessor_path, obj=preprocessor)
             save_object(file_path=model_path, obj=model)
+            if isinstance(model , RandomForestRegressor):
+                logging.info(f"Exporting forest arrays in saved model dir")
+                export_forest(model=model , forest_dir=forest_dir)
            
            
             model_pusher_artifact = ModelPusherArtifact(pusher_model_dir=self.model_pusher_config.pusher_model_dir,
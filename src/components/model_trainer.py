@@ -1,12 +1,19 @@
 from src.exception import SrcException
 from src.logger import logging 
-from src.utils import load_numpy_array_data , save_object
+from src.utils import load_numpy_array_data , save_object , write_yaml_file , load_object , serialized_size_mb , file_sha256 , available_cpus
+from src.forest import forest_node_count , single_row_latency_ms
+from src.predictor import ModelResolver
+from src.tuning import SuccessiveHalvingTuner
+from src.estimators import CandidateTrainer
 from src.entity import artifact_entity , config_entity 
 from sklearn.ensemble import BaggingRegressor , RandomForestRegressor
 from xgboost import XGBRFRegressor
 from sklearn.metrics import r2_score
-from sklearn.model_selection import RandomizedSearchCV
+import numpy as np
+from scipy import sparse
+from typing import Optional
 import warnings
+import hashlib
 import os , sys
 warnings.filterwarnings("ignore")
 
@@ -25,33 +32,36 @@ class ModelTrainer:
             raise SrcException(e , sys)    
         
     
-    def model_tuning(self , model , X_train , y_train): #might take long time 
+    def model_tuning(self , X_train , y_train)->Optional[RandomForestRegressor]:
        
         try:
             logging.info(f"Model Tunning")
-            # Define hyperparameter grid
+            # Define hyperparameter grid , tree count is the successive halving resource
             param_dist = {
-                      "n_estimators": [50, 100, 200, 500],
                       "max_depth": [None, 10, 20, 30, 50],
                       "min_samples_split": [2, 5, 10],
                       "min_samples_leaf": [1, 2, 4],
                       "max_features": ["sqrt", "log2", None]}
             
-            # Randomized Search
-            random_search = RandomizedSearchCV(
-                             estimator=model,
+            # Successive halving over tree count and row subsamples within the wall clock budget
+            tuner = SuccessiveHalvingTuner(
                              param_distributions=param_dist,
-                             n_iter=400,  # Number of parameter settings to try
-                             scoring='neg_mean_squared_error',  # Use appropriate metric
-                             cv=3,  # Number of cross-validation folds
-                             verbose=2,
-                             random_state=42,
-                             n_jobs=-1 ) # Use all processors
-            # Train the model
-            random_search.fit(X_train, y_train)
-
-            # Get the best parameters and model
-            best_model = random_search.best_estimator_
+                             n_candidates=self.model_trainer_config.tuning_candidates,
+                             eta=self.model_trainer_config.tuning_eta,
+                             max_trees=self.model_trainer_config.tuning_max_trees,
+                             cv=self.model_trainer_config.tuning_cv,
+                             budget_seconds=self.model_trainer_config.tuning_budget_seconds,
+                             cache_file_path=self.model_trainer_config.tuning_cache_file_path,
+                             n_jobs=self.model_trainer_config.tuning_n_jobs,
+                             seed=42)
+            best = tuner.search(X_train , y_train)
+            write_yaml_file(file_path=self.model_trainer_config.tuning_report_file_path , data=tuner.report)
+            if best is None:
+                return None
+
+            # Train the best configuration on every row
+            best_model = RandomForestRegressor(n_estimators=best["n_estimators"] , random_state=42 , n_jobs=available_cpus() , **best["params"])
+            best_model.fit(X_train , y_train)
 
             return best_model
         
@@ -59,6 +69,126 @@ class ModelTrainer:
             raise SrcException(e,sys)
     
     
+    def incremental_training(self , X_train , y_train)->Optional[RandomForestRegressor]:
+        """
+        Warm starts the registry forest: new trees are fitted on a random share of the train rows
+        and the oldest trees are retired , returns None when a full retrain is needed
+        (empty registry , other model type or changed feature layout)
+        """
+        try:
+            model_resolver = ModelResolver(model_registry=self.model_trainer_config.model_registry)
+            if model_resolver.get_latest_dir_path() is None:
+                logging.info(f"No registry model to start from , training from scratch")
+                return None
+
+            previous_model = load_object(file_path=model_resolver.get_latest_model_path())
+            if not isinstance(previous_model , RandomForestRegressor):
+                logging.info(f"Registry model is a {type(previous_model).__name__} , training from scratch")
+                return None
+
+            previous_preprocessor = load_object(file_path=model_resolver.get_latest_preprocessor_path())
+            current_preprocessor = load_object(file_path=self.data_transformation_artifact.preprocessor_object_file_path)
+            if not current_preprocessor.has_same_layout(previous_preprocessor):
+                logging.info(f"Feature layout changed since the registry model , training from scratch")
+                return None
+
+            #a fixed seed would give every week's new trees the seeds (and row sample) of last week's new trees ,
+            #seeding from the registry version and the train data keeps the surviving trees distinct
+            run_seed = int(hashlib.sha256(f"{model_resolver.get_latest_dir_path()}:{file_sha256(self.data_transformation_artifact.transformed_train_file_path)}".encode()).hexdigest()[:8] , 16)
+            rng = np.random.default_rng(run_seed)
+            n_rows = max(int(X_train.shape[0]*self.model_trainer_config.incremental_rows_fraction) , 1)
+            rows = np.sort(rng.choice(X_train.shape[0] , size=n_rows , replace=False))
+
+            logging.info(f"Adding {self.model_trainer_config.incremental_new_trees} trees on {n_rows} rows to {len(previous_model.estimators_)} registry trees")
+            model = previous_model
+            model.set_params(warm_start=True , random_state=run_seed ,
+                             n_estimators=len(model.estimators_)+self.model_trainer_config.incremental_new_trees)
+            model.fit(X_train[rows] , y_train[rows])
+
+            #estimators_ are in fitting order , the oldest trees come first
+            retired = len(model.estimators_)-self.model_trainer_config.incremental_max_trees
+            if retired>0:
+                model.estimators_ = model.estimators_[retired:]
+                logging.info(f"Retired the {retired} oldest trees")
+            model.set_params(warm_start=False , n_estimators=len(model.estimators_))
+            return model
+
+        except Exception as e:
+            raise SrcException(e,sys)
+    
+    
+    def size_budget_search(self , X_train , y_train , X_test , y_test)->RandomForestRegressor:
+        """
+        Fits every size candidate , reports serialized size , node count , p99 single row latency and r2 ,
+        returns the smallest forest inside the score thresholds and the size budget
+        """
+        try:
+            config = self.model_trainer_config
+            report , models , best_index = [] , [] , None
+            for params in config.size_candidates:
+                model = RandomForestRegressor(random_state=42 , **params)
+                model.fit(X_train , y_train)
+                r2_train , r2_test = r2_score(y_train , model.predict(X_train)) , r2_score(y_test , model.predict(X_test))
+                candidate = {"params":params ,
+                             "size_mb":round(serialized_size_mb(model) , 3) ,
+                             "nodes":forest_node_count(model) ,
+                             "latency_p99_ms":round(single_row_latency_ms(model , X_test) , 3) ,
+                             "r2_train":float(r2_train) ,
+                             "r2_test":float(r2_test)}
+                violations = []
+                if r2_test < config.expected_score:
+                    violations.append("expected_score")
+                if abs(r2_train-r2_test) > config.overfitting_threshold:
+                    violations.append("overfitting_threshold")
+                for limit , value in (("max_model_size_mb" , candidate["size_mb"]) , ("max_model_nodes" , candidate["nodes"]) ,
+                                      ("max_latency_p99_ms" , candidate["latency_p99_ms"])):
+                    if getattr(config , limit) is not None and value > getattr(config , limit):
+                        violations.append(limit)
+                candidate["violations"] = violations
+                logging.info(f"Size candidate {candidate}")
+                if len(violations)==0 and (best_index is None or candidate["size_mb"]<report[best_index]["size_mb"]):
+                    best_index , models = len(report) , [model] #only the smallest passing forest is kept in memory
+                report.append(candidate)
+
+            write_yaml_file(file_path=config.size_report_file_path ,
+                            data={"chosen":report[best_index]["params"] if best_index is not None else None , "candidates":report})
+            if best_index is None:
+                raise Exception(f"No size candidate fits the score thresholds and size budget , see {config.size_report_file_path}")
+            return models[0]
+
+        except Exception as e:
+            raise SrcException(e,sys)
+    
+    
+    def train_candidates(self , X_train , y_train , X_test , y_test):
+        """
+        Fits every configured candidate at the same time , writes fit time , predict throughput ,
+        model size and r2 of each and returns the configured candidate
+        """
+        try:
+            config = self.model_trainer_config
+            feature_blocks = load_object(file_path=self.data_transformation_artifact.preprocessor_object_file_path).feature_blocks()
+            candidate_trainer = CandidateTrainer(candidates=config.candidates ,
+                                                 feature_sets=config.feature_sets ,
+                                                 feature_blocks=feature_blocks ,
+                                                 work_dir=config.candidate_dir ,
+                                                 n_jobs=config.candidate_n_jobs)
+            model = candidate_trainer.train(X_train , y_train , X_test , y_test , chosen=config.candidate)
+            write_yaml_file(file_path=config.candidate_report_file_path , data=candidate_trainer.report)
+            return model
+
+        except Exception as e:
+            raise SrcException(e,sys)
+    
+    
+    @staticmethod
+    def target_to_dense(target)->np.ndarray:
+        #target column sliced from a sparse matrix is a (n,1) sparse matrix
+        if sparse.issparse(target):
+            return target.toarray().ravel()
+        return np.asarray(target).ravel()
+    
+    
     def initiate_model_training(self) -> artifact_entity.ModelTrainerArtifact:
 
         try:
@@ -68,15 +198,25 @@ class ModelTrainer:
             test_array= load_numpy_array_data(file_path=self.data_transformation_artifact.transformed_test_file_path)
 
             logging.info(f"Spliting Target Feature from both train and test data")
-            X_train , y_train =train_array[:,: -1] , train_array[:,-1]
-            X_test , y_test=test_array[:,:-1] , test_array[:,-1]
+            #feature matrix stays sparse csr , only the target column is densified
+            X_train , y_train =train_array[:,: -1] , self.target_to_dense(train_array[:,-1])
+            X_test , y_test=test_array[:,:-1] , self.target_to_dense(test_array[:,-1])
 
-            logging.info(f"Train the model")
-            model=RandomForestRegressor(max_depth=400 , random_state=42)
-            model.fit(X_train ,y_train)
+            model=None
+            if self.model_trainer_config.tuning:
+                #best model after Performing  hyper-parameter tuning , None when the budget ran out in the first rung
+                logging.info(f"Tune and train the model")
+                model=self.model_tuning(X_train=X_train , y_train=y_train)
+            if model is None and self.model_trainer_config.incremental:
+                logging.info(f"Incrementally train the registry model")
+                model=self.incremental_training(X_train=X_train , y_train=y_train)
+            if model is None and self.model_trainer_config.size_search:
+                logging.info(f"Search the smallest model inside the size budget")
+                model=self.size_budget_search(X_train=X_train , y_train=y_train , X_test=X_test , y_test=y_test)
+            if model is None:
+                logging.info(f"Train the model")
+                model=self.train_candidates(X_train=X_train , y_train=y_train , X_test=X_test , y_test=y_test)
             
-            #best model after Performing  hyper-parameter tuning 
-            #best_model=self.model_tuning(model=model , X_train=X_train , y_train=y_train)
             logging.info(f"Calculating r2 train score")
             yhat_train=model.predict(X_train)
             r2_train_score=r2_score(y_train,yhat_train)
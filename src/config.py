@@ -18,5 +18,10 @@ print(f'Connected to MongoDB Database')
 
 target_column= "rate" #dependent feature
 featurs_to_drop=['url', 'name' ,'address','phone' ,'listed_in(type)' ,'reviews_list' , "menu_item" , 'dish_liked' , 'listed_in(city)'] #irrevalent features
-nominal_features = ["location", "cuisines","rest_type"]
-ordinal_features = [ "online_order" , "book_table"]
\ No newline at end of file
+nominal_features = ["location","rest_type"]
+multi_label_features = ["cuisines"] #comma joined values , tokenized into a multi hot block
+ordinal_features = [ "online_order" , "book_table"]
+numerical_features = ["votes" , "approx_cost"]
+#columns read from MongoDB and their dtype , every other field stays on the server
+feature_store_columns = {**{col:"float64" for col in numerical_features+[target_column]} ,
+                         **{col:"object" for col in ordinal_features+nominal_features+multi_label_features}}
\ No newline at end of file
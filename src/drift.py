@@ -0,0 +1,287 @@
+from src.exception import SrcException
+from src.logger import logging
+from src import utils
+from src.sketches import ColumnSketch , DataSketch , PrioritySample
+from concurrent.futures import ProcessPoolExecutor
+from scipy.stats import chi2_contingency , kstwo
+from typing import Dict , Iterable , Optional
+import multiprocessing
+import pandas as pd
+import numpy as np
+import json
+import os , sys
+
+
+def reservoir_sample(chunks:Iterable[np.ndarray] , sample_size:int , seed:int=42)->np.ndarray:
+    """
+    Uniform sample of sample_size values from a stream of arrays in a single pass (see PrioritySample)
+    """
+    sample=PrioritySample(sample_size=sample_size , seed=seed)
+    for chunk in chunks:
+        sample.update(chunk)
+    return sample.values
+
+
+def step_cdf(values:np.ndarray , cdf:np.ndarray , points:np.ndarray)->np.ndarray:
+    #cdf given at increasing values , evaluated at any points
+    position=np.searchsorted(values , points , side="right")-1
+    return np.where(position>=0 , cdf[np.maximum(position , 0)] , 0.0)
+
+
+def ks_pvalue(statistic:float , n:int , m:int)->float:
+    en=n*m/(n+m)
+    return float(np.clip(kstwo.sf(statistic , np.round(en)) , 0 , 1))
+
+
+def ks_from_cdf(base_values:np.ndarray , base_cdf:np.ndarray , base_n:int , current_sorted:np.ndarray):
+    """
+    Two sample Kolmogorov Smirnov test of a sorted , NaN free current array against the step cdf of the base
+    base_values / base_cdf = base cdf at increasing values (exact on distinct values or approximate on quantiles)
+    return: (statistic , asymptotic p value) , same as ks_2samp(method="asymp") when the base cdf is exact
+    """
+    m=len(current_sorted)
+    if base_n==0 or m==0:
+        return np.nan , np.nan
+    values=np.concatenate([base_values , current_sorted])
+    cdf_current=np.searchsorted(current_sorted , values , side="right")/m
+    statistic=float(np.max(np.abs(step_cdf(base_values , base_cdf , values)-cdf_current)))
+    return statistic , ks_pvalue(statistic , base_n , m)
+
+
+def chi2_from_counts(base_counts:pd.Series , current_counts:pd.Series):
+    """
+    Chi square homogeneity test on a 2 x K table of category counts aligned by category
+    return: (statistic , p value)
+    """
+    table=pd.concat([base_counts , current_counts] , axis=1).fillna(0).to_numpy().T
+    table=table[: , table.sum(axis=0)>0]
+    if table.shape[1]<2 or (table.sum(axis=1)==0).any():
+        return 0.0 , 1.0
+    statistic , p_value , _ , _=chi2_contingency(table)
+    return float(statistic) , float(p_value)
+
+
+def _column_drift(kind:str , base_stat , current_values:np.ndarray):
+    if kind=="numerical":
+        current_sorted=np.sort(current_values[~np.isnan(current_values)])
+        return ks_from_cdf(*base_stat , current_sorted)[1]
+    return chi2_from_counts(base_stat , pd.Series(current_values).value_counts())[1]
+
+
+def _sketch_column_drift(entry:dict , column_sketch:ColumnSketch)->float:
+    #frequencies are exact while a column has no more distinct values than heavy hitter counters
+    frequencies=column_sketch.frequencies
+    if entry["kind"]=="numerical":
+        m=column_sketch.quantiles.count
+        if entry["count"]==0 or m==0:
+            return np.nan
+        if frequencies.exact:
+            counts=frequencies.counts.sort_index()
+            current_values , current_cdf=counts.index.to_numpy(dtype=np.float64) , np.cumsum(counts.to_numpy())/m
+            points=np.concatenate([entry["values"] , current_values])
+            cdf_current=step_cdf(current_values , current_cdf , points)
+        else:
+            points=np.concatenate([entry["values"] , column_sketch.quantiles.items()])
+            cdf_current=column_sketch.quantiles.cdf(points)
+        statistic=float(np.max(np.abs(step_cdf(entry["values"] , entry["cdf"] , points)-cdf_current)))
+        return ks_pvalue(statistic , entry["count"] , m)
+    if frequencies.exact:
+        return chi2_from_counts(entry["counts"] , frequencies.counts)[1]
+    return chi2_from_counts(entry["counts"] , pd.Series(column_sketch.sample.values).value_counts())[1]
+
+
+class BaselineProfile:
+
+    """
+    =====================================================================================
+    Compact statistics of the base dataset , built once and stored next to it (file.profile.npz)
+
+    Per column:
+        null rate and non null row count
+        numerical columns -> step cdf on the distinct values (exact) , or on n_quantiles
+                             quantiles when there are more than max_levels distinct values
+        categorical columns -> category frequency table
+    Drift checks compare current data against the profile , the base dataset is not read again.
+
+    columns :Dict[str , dict] = column -> {"kind" , "count" , "null_rate" , and "values"/"cdf" or "counts"}
+    settings :dict = max_levels and n_quantiles the profile was built with
+    =====================================================================================
+    """
+
+    def __init__(self , columns:Dict[str , dict] , settings:dict):
+        self.columns=columns
+        self.settings=settings
+
+    @classmethod
+    def from_dataframe(cls , df:pd.DataFrame , max_levels:int=4096 , n_quantiles:int=1001)->"BaselineProfile":
+        try:
+            columns=dict()
+            for column in df.columns:
+                series=df[column]
+                entry={"null_rate":float(series.isna().mean()) if len(series) else 0.0}
+                if pd.api.types.is_numeric_dtype(series):
+                    values=np.sort(series.to_numpy(dtype=np.float64))
+                    values=values[~np.isnan(values)]
+                    distinct , first_index=np.unique(values , return_index=True)
+                    if len(distinct)<=max_levels:
+                        #cdf at a distinct value = share of rows up to and including it
+                        cdf=np.append(first_index[1:] , len(values))/max(len(values) , 1)
+                    else:
+                        cdf=np.linspace(0 , 1 , n_quantiles)
+                        distinct=np.quantile(values , cdf)
+                    entry.update(kind="numerical" , count=len(values) , values=distinct , cdf=cdf)
+                else:
+                    counts=series.value_counts()
+                    counts.index=counts.index.astype(str)
+                    entry.update(kind="categorical" , count=int(counts.sum()) , counts=counts)
+                columns[column]=entry
+            return cls(columns=columns , settings={"max_levels":max_levels , "n_quantiles":n_quantiles})
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    @classmethod
+    def from_base_file(cls , base_data_file_path:str , exclude_columns:list , max_levels:int=4096 ,
+                       n_quantiles:int=1001)->"BaselineProfile":
+        """
+        Reads the profile written next to the base csv ,
+        it is built (once) again only when the csv is newer or the settings changed
+        """
+        try:
+            profile_file_path=f"{os.path.splitext(base_data_file_path)[0]}.profile.npz"
+            settings={"max_levels":max_levels , "n_quantiles":n_quantiles}
+            if os.path.exists(profile_file_path) and os.path.getmtime(profile_file_path)>=os.path.getmtime(base_data_file_path):
+                profile=cls.load(profile_file_path)
+                if profile.settings==settings:
+                    return profile
+            logging.info(f"Building baseline profile of {base_data_file_path} in {profile_file_path}")
+            base_df=pd.read_csv(base_data_file_path)
+            base_df.replace({"na":np.nan} , inplace=True)
+            base_df=utils.convert_columns_float(df=base_df , exclude_columns=exclude_columns)
+            profile=cls.from_dataframe(base_df , max_levels=max_levels , n_quantiles=n_quantiles)
+            profile.save(profile_file_path)
+            return profile
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def null_rates(self)->pd.Series:
+        return pd.Series({column:entry["null_rate"] for column , entry in self.columns.items()} , dtype=np.float64)
+
+    def subset(self , columns:list)->"BaselineProfile":
+        return BaselineProfile(columns={column:self.columns[column] for column in columns} , settings=self.settings)
+
+    def save(self , file_path:str)->None:
+        try:
+            arrays , meta=dict() , []
+            for i , (column , entry) in enumerate(self.columns.items()):
+                meta.append({"column":column , "kind":entry["kind"] , "count":entry["count"] , "null_rate":entry["null_rate"]})
+                if entry["kind"]=="numerical":
+                    arrays[f"{i}_values"] , arrays[f"{i}_cdf"]=entry["values"] , entry["cdf"]
+                else:
+                    arrays[f"{i}_categories"]=entry["counts"].index.to_numpy(dtype=str)
+                    arrays[f"{i}_counts"]=entry["counts"].to_numpy(dtype=np.int64)
+            arrays["meta"]=np.array(json.dumps({"columns":meta , "settings":self.settings}))
+            os.makedirs(os.path.dirname(file_path) or "." , exist_ok=True)
+            #written aside and swapped in , a concurrent reader never sees half a profile
+            temp_file_path=f"{file_path}.tmp"
+            with open(temp_file_path , "wb") as file_obj:
+                np.savez_compressed(file_obj , **arrays)
+            os.replace(temp_file_path , file_path)
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    @classmethod
+    def load(cls , file_path:str)->"BaselineProfile":
+        try:
+            with np.load(file_path , allow_pickle=False) as arrays:
+                meta=json.loads(str(arrays["meta"]))
+                columns=dict()
+                for i , entry in enumerate(meta["columns"]):
+                    column=entry.pop("column")
+                    if entry["kind"]=="numerical":
+                        entry.update(values=arrays[f"{i}_values"] , cdf=arrays[f"{i}_cdf"])
+                    else:
+                        entry.update(counts=pd.Series(arrays[f"{i}_counts"] , index=arrays[f"{i}_categories"]))
+                    columns[column]=entry
+            return cls(columns=columns , settings=meta["settings"])
+        except Exception as e:
+            raise SrcException(e , sys)
+
+
+class DriftDetector:
+
+    """
+    =====================================================================================
+    Column drift of current data against a baseline profile
+
+    Only the current data is read , every column is compared with the profile:
+        numerical columns -> KS test against the base step cdf
+        categorical columns -> 2 x K chi square test against the base category counts
+    Columns are fanned out over a process pool.
+
+    profile :BaselineProfile = base dataset statistics
+    pvalue_threshold :float = p value below which a column has drifted
+    sample_size :int = optional reservoir sample size for very large current data
+    n_jobs :int = worker processes , 1 runs every column inline
+    =====================================================================================
+    """
+
+    def __init__(self , profile:BaselineProfile , pvalue_threshold:float=0.05 , sample_size:Optional[int]=None ,
+                 n_jobs:Optional[int]=None , seed:int=42):
+        try:
+            self.profile=profile
+            self.pvalue_threshold=pvalue_threshold
+            self.sample_size=sample_size
+            self.n_jobs=n_jobs or utils.available_cpus()
+            self.seed=seed
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def _sample(self , values:np.ndarray)->np.ndarray:
+        if self.sample_size is None or len(values)<=self.sample_size:
+            return values
+        return reservoir_sample([values] , self.sample_size , seed=self.seed)
+
+    def detect(self , current_df:pd.DataFrame)->Dict[str , dict]:
+        """
+        return: {column: {"pvalues":float , "same_distribution":bool}} for every profile column of current_df
+        """
+        try:
+            columns=[column for column in self.profile.columns if column in current_df.columns]
+            tasks=[]
+            for column in columns:
+                entry=self.profile.columns[column]
+                values=self._sample(current_df[column].to_numpy())
+                if entry["kind"]=="numerical":
+                    tasks.append(("numerical" , (entry["values"] , entry["cdf"] , entry["count"]) , values.astype(np.float64)))
+                else:
+                    tasks.append(("categorical" , entry["counts"] , pd.Series(values).dropna().astype(str).to_numpy()))
+
+            if self.n_jobs==1 or len(tasks)<2:
+                p_values=[_column_drift(*task) for task in tasks]
+            else:
+                start_method="fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+                with ProcessPoolExecutor(max_workers=min(self.n_jobs , len(tasks)) , mp_context=multiprocessing.get_context(start_method)) as executor:
+                    p_values=list(executor.map(_column_drift , *zip(*tasks)))
+
+            return self._report(columns , p_values)
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def detect_sketch(self , data_sketch:DataSketch)->Dict[str , dict]:
+        """
+        Same report as detect() from a one pass DataSketch of the current data ,
+        numerical columns with more distinct values than heavy hitter counters use the KLL cdf
+        """
+        try:
+            columns=[column for column in self.profile.columns if column in data_sketch.columns]
+            p_values=[_sketch_column_drift(self.profile.columns[column] , data_sketch.columns[column]) for column in columns]
+            return self._report(columns , p_values)
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def _report(self , columns:list , p_values:list)->Dict[str , dict]:
+        report=dict()
+        for column , p_value in zip(columns , p_values):
+            report[column]={"pvalues":float(p_value) , "same_distribution":bool(p_value>self.pvalue_threshold)}
+            logging.info(f"Drift {column} ({self.profile.columns[column]['kind']}) p value {p_value}")
+        return report
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 @dataclass
 class DataIngestionArtifact:
@@ -14,8 +15,7 @@ class DataValidationArtifact:
 
 @dataclass
 class DataTransformationArtifact:
-    transformed_object_file_path:str   
-    encoder_object_file_path:str 
+    preprocessor_object_file_path:str
     transformed_train_file_path:str
     transformed_test_file_path:str
 
@@ -27,6 +27,17 @@ class ModelTrainerArtifact:
     r2_test_score:str    
 
 
+@dataclass
+class RegistryModelArtifact:
+    model_dir:Optional[str] #registry version incremental training starts from , None when the registry is empty
+
+
+@dataclass
+class PreviousModelScoreArtifact:
+    model_dir:Optional[str] #registry version that was scored , None when there is no comparable previous model
+    r2_score:Optional[float]
+
+
 @dataclass
 class ModelEvaluationArtifact:
     is_model_accepted:bool
@@ -10,6 +10,9 @@ class TrainingPipelineConfig:
         
         try:
             self.artifact_directory= os.path.join(os.getcwd() , "artifact" ,f"{datetime.now().strftime('%m%d%y__%H%M%S')}")
+            self.stage_cache_dir= os.path.join(os.getcwd() , "artifact" , "stage_cache") #stage key -> artifact of the run that computed it
+            #weekly runs keep the registry feature layout and add trees to the registry forest instead of retraining it
+            self.incremental_training= False
 
         except Exception as e:
             raise SrcException(e ,sys)    
@@ -22,9 +25,14 @@ class DataIngestionConfig:
         self.database_name="Zomato" #name of database 
         self.collection_name= "Restaurant" #Collection name
         self.data_ingestion_dir = os.path.join(training_pipeline_config.artifact_directory , "data_ingestion") 
-        self.feature_store_file_path= os.path.join(self.data_ingestion_dir , "Feature_Store" , "ZOMATO.csv")
-        self.train_file_path = os.path.join(self.data_ingestion_dir , "Datasets" , "train.csv")
-        self.test_file_path = os.path.join(self.data_ingestion_dir , "Datasets" , "test.csv")
+        self.feature_store_file_path= os.path.join(self.data_ingestion_dir , "Feature_Store" , "ZOMATO.parquet")
+        #persistent feature store shared by every run , only documents past the watermark are fetched
+        self.local_feature_store_dir = os.path.join(os.getcwd() , "feature_store")
+        self.local_feature_store_file_path = os.path.join(self.local_feature_store_dir , "ZOMATO.parquet")
+        self.watermark_file_path = os.path.join(self.local_feature_store_dir , "watermark.yml")
+        self.watermark_field = "_id" #ObjectId catches new documents , use a last modified timestamp field to also catch updates
+        self.train_file_path = os.path.join(self.data_ingestion_dir , "Datasets" , "train.parquet")
+        self.test_file_path = os.path.join(self.data_ingestion_dir , "Datasets" , "test.parquet")
         self.test_size= 0.3 #Choose Threshold value provided by Domain Experts
           
 
@@ -36,13 +44,29 @@ class DataValidationConfig:
           self.report_file_path = os.path.join(self.data_validation_dir , "report.yml")
           self.missing_threshold=0.3 #random threshold
           self.base_data_file_path =os.path.join("cleaned_zomato.csv")  #Production dataset /old data for validation
+          self.drift_pvalue_threshold=0.05 #p value below which a column has drifted
+          self.drift_sample_size=None #reservoir sample size per column for very large snapshots , None uses every row
+          self.drift_n_jobs=None #processes for the per column drift tests , None uses every core
+          self.profile_max_levels=4096 #numerical base columns with more distinct values are profiled by quantiles
+          self.profile_quantiles=1001 #quantiles kept per high cardinality numerical column
+          self.sketch_row_threshold=1_000_000 #train/test files with more rows are validated from one chunked pass of mergeable sketches
+          self.sketch_chunk_size=100_000 #rows per chunk of the sketch pass
+          self.sketch_quantile_k=1024 #KLL top level size , rank error shrinks roughly as 1/k
+          self.sketch_heavy_hitters=4096 #category counters per column , counts are exact up to this many distinct values
+          self.sketch_sample_size=20_000 #uniform sample per categorical column , used for drift once heavy hitter counters were cut
+          self.sketch_n_jobs=None #workers sharing the parquet row groups , None uses every core
+          self.sketch_seed=42 #KLL compaction and sample priorities , fixed so the same file gives the same p-values every run
 
 class DataTransformationConfig:
 
     def __init__(self , training_pipeline_config:TrainingPipelineConfig):
           self.data_tranformer_dir=os.path.join(training_pipeline_config.artifact_directory , "data_transformer")
-          self.transformed_object_file_path=os.path.join(self.data_tranformer_dir , "transformer.pkl")
-          self.encoder_object_file_path=os.path.join(self.data_tranformer_dir , "encoder.pkl")
+          self.preprocessor_object_file_path=os.path.join(self.data_tranformer_dir , "preprocessor.pkl")
+          self.tokenizer_min_frequency=1 #cuisines seen less often than this are dropped from the multi hot block
+          #encode with the registry preprocessor so incremental training sees the same feature layout ,
+          #unseen locations , rest types and cuisines encode as zeros until the next full retrain
+          self.reuse_registry_preprocessor=training_pipeline_config.incremental_training
+          self.model_registry=os.path.join("saved_models")
           self.data_tranformed_train_file_path= os.path.join(self.data_tranformer_dir , "transformed" , "train.npz")
           self.data_tranformed_test_file_path= os.path.join(self.data_tranformer_dir , "transformed" , "test.npz")
                              
@@ -56,12 +80,52 @@ class ModelTrainerConfig:
         self.model_file_path=os.path.join(self.model_trainer_dir ,"model" , "model.pkl")
         self.expected_score=0.8
         self.overfitting_threshold=0.1
+        #candidate models trained at the same time every run , estimator is a name in src.estimators.ESTIMATORS
+        self.candidates=[{"name":"random_forest" , "estimator":"random_forest" , "feature_set":"all"} ,
+                         {"name":"hist_gradient_boosting" , "estimator":"hist_gradient_boosting" , "feature_set":"all"} ,
+                         {"name":"xgboost_hist" , "estimator":"xgboost_hist" , "feature_set":"all"} ,
+                         {"name":"hist_gradient_boosting_without_cuisines" , "estimator":"hist_gradient_boosting" , "feature_set":"without_cuisines"}]
+        self.feature_sets={"all":[] , "without_cuisines":["cuisines"]} #input features left out of the model
+        self.candidate="random_forest" #candidate name handed to model evaluation , or "best" for the highest test r2
+        self.candidate_n_jobs=None #processes fitting candidates , None uses every core
+        self.candidate_dir=os.path.join(self.model_trainer_dir , "candidates") #memory mapped arrays and candidate models , removed after training
+        self.candidate_report_file_path=os.path.join(self.model_trainer_dir , "candidate_report.yml")
+        self.tuning=False #successive halving search of the forest hyperparameters before training
+        self.tuning_budget_seconds=2*60*60 #wall clock limit of the search , fits inside the weekly training DAG window
+        self.tuning_candidates=27 #configurations in the first rung
+        self.tuning_eta=3 #keep the best 1/eta configurations per rung , rows and trees grow by eta
+        self.tuning_max_trees=200 #trees of the last rung and of the tuned model
+        self.tuning_cv=3 #cross validation folds per configuration
+        self.tuning_n_jobs=None #processes fitting folds , None uses every core
+        #fold scores shared by every run , reruns resume from them
+        self.tuning_cache_file_path=os.path.join(training_pipeline_config.stage_cache_dir , "tuning" , "fold_scores.jsonl")
+        self.tuning_report_file_path=os.path.join(self.model_trainer_dir , "tuning_report.yml")
+        #model size budget , the smallest candidate inside expected_score , overfitting_threshold and every set limit is trained
+        self.size_search=False
+        self.max_model_size_mb=None #serialized model.pkl size
+        self.max_model_nodes=None #tree nodes of the whole forest
+        self.max_latency_p99_ms=None #p99 single row latency on the serving path
+        self.size_candidates=[{"n_estimators":25 , "max_depth":12 , "min_samples_leaf":2} ,
+                              {"n_estimators":50 , "max_depth":16 , "min_samples_leaf":2} ,
+                              {"n_estimators":50 , "max_depth":24 , "min_samples_leaf":1} ,
+                              {"n_estimators":100 , "max_depth":24 , "min_samples_leaf":1} ,
+                              {"n_estimators":100 , "max_leaf_nodes":4096} ,
+                              {"n_estimators":100 , "max_depth":400}] #last one is the unbounded default forest
+        self.size_report_file_path=os.path.join(self.model_trainer_dir , "model_size_report.yml")
+        self.incremental=training_pipeline_config.incremental_training #add trees to the registry forest , full retrain when the feature layout changed
+        self.model_registry=os.path.join("saved_models")
+        self.incremental_new_trees=25 #trees fitted on this run's data
+        self.incremental_max_trees=100 #oldest trees are retired above this ensemble size
+        self.incremental_rows_fraction=0.25 #share of train rows (random) the new trees are fitted on
 
 
 class ModelEvaluationConfig:
 
     def __init__(self ,training_pipeline_config:TrainingPipelineConfig ):
              self.change_threshold = 0.1
+             self.model_registry = os.path.join("saved_models")
+             #r2 of a registry version per test snapshot , saved_models/<version>/scores.yml keyed by test file sha256
+             self.score_cache_file_name = "scores.yml"
     
 class ModelPusherConfig:
 
@@ -70,5 +134,5 @@ class ModelPusherConfig:
         self.saved_model_dir = os.path.join("saved_models")
         self.pusher_model_dir = os.path.join(self.model_pusher_dir,"saved_models")
         self.pusher_model_path = os.path.join(self.pusher_model_dir,"model.pkl")
-        self.pusher_transformer_path = os.path.join(self.pusher_model_dir,"transformer.pkl")
-        self.pusher_encoder_path=os.path.join(self.pusher_model_dir , "encoder.pkl")
\ No newline at end of file
+        self.pusher_preprocessor_path = os.path.join(self.pusher_model_dir,"preprocessor.pkl")
+        self.pusher_forest_dir = os.path.join(self.pusher_model_dir,"forest") #flattened forest arrays for FlatForest
\ No newline at end of file
@@ -0,0 +1,383 @@
+from src.exception import SrcException
+from src.logger import logging
+from src.utils import save_object , load_object , save_shared_arrays , load_shared_arrays , serialized_size_mb , available_cpus
+from concurrent.futures import ProcessPoolExecutor , as_completed
+from sklearn.metrics import r2_score
+from threadpoolctl import threadpool_limits
+from sklearn.ensemble import RandomForestRegressor , HistGradientBoostingRegressor
+from xgboost import XGBRegressor
+from scipy import sparse
+from typing import Callable , Dict , List , Optional
+import multiprocessing
+import pandas as pd
+import numpy as np
+import traceback
+import shutil
+import time
+import os , sys
+
+#train and test arrays of the pool workers , memory mapped once per worker by _set_candidate_data
+_CANDIDATE_DATA=dict()
+
+
+class NativeCategoricalRegressor:
+
+    """
+    =====================================================================================
+    Feeds the preprocessor output to a boosting model with native categorical support
+
+    The sparse matrix is compacted before fit and predict:
+        ordinal label codes and numerical columns are kept ,
+        every one hot nominal block becomes a single category code column (NaN when no
+        category is set) , the multi hot token block stays as 0/1 columns
+    so location and rest type are one column each instead of one per category.
+
+    estimator = HistGradientBoostingRegressor or XGBRegressor(enable_categorical=True)
+    feature_blocks :dict = RestaurantPreprocessor.feature_blocks()
+    as_frame :bool = pass a DataFrame with category dtypes (XGBoost) instead of a numpy array
+    =====================================================================================
+    """
+
+    def __init__(self , estimator , feature_blocks:dict , as_frame:bool=False):
+        self.estimator=estimator
+        self.feature_blocks=feature_blocks
+        self.as_frame=as_frame
+
+    def compact(self , X)->np.ndarray:
+        #ordinal and numerical columns , one category code column per nominal block , then the token columns
+        X=sparse.csr_matrix(X)
+        blocks=self.feature_blocks
+        n_dense=len(blocks["ordinal"])+len(blocks["numerical"])
+        dense=X[: , :n_dense].toarray()
+        columns=[dense[: , index] for index in {**blocks["ordinal"] , **blocks["numerical"]}.values()]
+        for start , stop in blocks["nominal"].values():
+            block=X[: , start:stop]
+            codes=np.asarray(block.argmax(axis=1)).ravel().astype(np.float64)
+            codes[block.getnnz(axis=1)==0]=np.nan #category unseen while fitting the preprocessor
+            columns.append(codes)
+        tokens=X[: , blocks["multi_label"][0]:blocks["multi_label"][1]].toarray()
+        return np.column_stack(columns+[tokens])
+
+    def _named_columns(self)->List[str]:
+        blocks=self.feature_blocks
+        return list({**blocks["ordinal"] , **blocks["numerical"]})+list(blocks["nominal"])
+
+    def categorical_mask(self)->np.ndarray:
+        n_tokens=self.feature_blocks["multi_label"][1]-self.feature_blocks["multi_label"][0]
+        return np.asarray([col in self.feature_blocks["n_categories"] for col in self._named_columns()]+[False]*n_tokens)
+
+    def _model_input(self , X_compact:np.ndarray):
+        #XGBoost reads the categorical columns from pandas category dtypes
+        if not self.as_frame:
+            return X_compact
+        names=self._named_columns()
+        frame=pd.DataFrame(X_compact[: , :len(names)] , columns=names)
+        for col , n_categories in self.feature_blocks["n_categories"].items():
+            codes=np.nan_to_num(frame[col].to_numpy() , nan=-1).astype(int)
+            frame[col]=pd.Categorical.from_codes(codes , categories=range(n_categories))
+        tokens=X_compact[: , len(names):]
+        tokens=pd.DataFrame(tokens , columns=[f"token_{i}" for i in range(tokens.shape[1])] , index=frame.index)
+        return pd.concat([frame , tokens] , axis=1)
+
+    def fit_compact(self , X_compact:np.ndarray , y):
+        #fit on the output of compact() , CandidateTrainer shares it between workers
+        try:
+            if isinstance(self.estimator , HistGradientBoostingRegressor):
+                self.estimator.set_params(categorical_features=self.categorical_mask())
+            self.estimator.fit(self._model_input(X_compact) , y)
+            self.n_features_in_=self.feature_blocks["multi_label"][1]
+            return self
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def predict_compact(self , X_compact:np.ndarray)->np.ndarray:
+        try:
+            return np.asarray(self.estimator.predict(self._model_input(X_compact)) , dtype=np.float64)
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def fit(self , X , y):
+        return self.fit_compact(self.compact(X) , y)
+
+    def predict(self , X)->np.ndarray:
+        return self.predict_compact(self.compact(X))
+
+
+class FeatureSubsetRegressor:
+
+    """
+    =====================================================================================
+    Fits and predicts an estimator on a subset of the preprocessor output columns
+
+    estimator = any estimator of ESTIMATORS built for the subset feature_blocks
+    columns :np.ndarray = preprocessor output columns the estimator sees , in order
+    =====================================================================================
+    """
+
+    def __init__(self , estimator , columns:np.ndarray):
+        self.estimator=estimator
+        self.columns=np.asarray(columns)
+
+    def fit(self , X , y):
+        try:
+            self.estimator.fit(X[: , self.columns] , y)
+            self.n_features_in_=X.shape[1]
+            return self
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def predict(self , X)->np.ndarray:
+        try:
+            return np.asarray(self.estimator.predict(X[: , self.columns]) , dtype=np.float64)
+        except Exception as e:
+            raise SrcException(e , sys)
+
+
+def feature_subset(feature_blocks:dict , exclude_features:List[str]):
+    """
+    Columns left after dropping every output column of exclude_features , with feature_blocks
+    renumbered for the subset
+    return: (columns np.ndarray , subset feature_blocks)
+    """
+    columns , blocks=[] , {"ordinal":dict() , "numerical":dict() , "nominal":dict() , "n_categories":dict()}
+    dense={**feature_blocks["ordinal"] , **feature_blocks["numerical"]}
+    for col , index in sorted(dense.items() , key=lambda item:item[1]):
+        if col not in exclude_features:
+            blocks["ordinal" if col in feature_blocks["ordinal"] else "numerical"][col]=len(columns)
+            columns.append(index)
+    for col , (start , stop) in feature_blocks["nominal"].items():
+        if col not in exclude_features:
+            blocks["nominal"][col]=(len(columns) , len(columns)+stop-start)
+            columns.extend(range(start , stop))
+    start , stop=feature_blocks["multi_label"]
+    multi_label_start=len(columns)
+    if not any(col in exclude_features for col in feature_blocks["multi_label_features"]):
+        columns.extend(range(start , stop))
+    blocks["multi_label"]=(multi_label_start , len(columns))
+    blocks["multi_label_features"]=[col for col in feature_blocks["multi_label_features"] if col not in exclude_features]
+    blocks["n_categories"]={col:n for col , n in feature_blocks["n_categories"].items() if col not in exclude_features}
+    return np.asarray(columns , dtype=np.int64) , blocks
+
+
+#estimator name -> factory(feature_blocks) , every model takes the sparse preprocessor output in fit and predict
+ESTIMATORS:Dict[str , Callable[[dict] , object]] = {
+    "random_forest":lambda feature_blocks:RandomForestRegressor(max_depth=400 , random_state=42) ,
+    "hist_gradient_boosting":lambda feature_blocks:NativeCategoricalRegressor(
+        HistGradientBoostingRegressor(max_iter=200 , learning_rate=0.2 , max_leaf_nodes=127 , min_samples_leaf=5 ,
+                                      early_stopping=False , random_state=42) ,
+        feature_blocks=feature_blocks) ,
+    "xgboost_hist":lambda feature_blocks:NativeCategoricalRegressor(
+        XGBRegressor(tree_method="hist" , enable_categorical=True , n_estimators=500 , learning_rate=0.1 , max_depth=10 ,
+                     max_cat_to_onehot=1 , random_state=42 , n_jobs=available_cpus()) ,
+        feature_blocks=feature_blocks , as_frame=True) ,
+}
+
+
+def get_estimator(name:str , feature_blocks:dict , exclude_features:Optional[List[str]]=None):
+    try:
+        if name not in ESTIMATORS:
+            raise ValueError(f"Unknown estimator {name} , choose one of {list(ESTIMATORS)}")
+        logging.info(f"Estimator {name} , excluded features {exclude_features or []}")
+        if not exclude_features:
+            return ESTIMATORS[name](feature_blocks)
+        columns , subset_blocks=feature_subset(feature_blocks , exclude_features)
+        return FeatureSubsetRegressor(ESTIMATORS[name](subset_blocks) , columns=columns)
+    except Exception as e:
+        raise SrcException(e , sys)
+
+
+def input_layout(model)->str:
+    #"compact" for boosting models , "sparse" for forests , candidates with the same layout and feature set share inputs
+    if isinstance(model , FeatureSubsetRegressor):
+        model=model.estimator
+    return "compact" if isinstance(model , NativeCategoricalRegressor) else "sparse"
+
+
+def prepare_inputs(model , X):
+    """
+    X in the layout the innermost estimator of model consumes , so CandidateTrainer can write it once
+    and no worker converts (copies) it again: the feature subset is applied , boosting models get the
+    compacted dense matrix , forests get float32 csc for fit and float32 csr for predict
+    return: (fit input , predict input) , the same object when one layout serves both
+    """
+    if isinstance(model , FeatureSubsetRegressor):
+        model , X=model.estimator , X[: , model.columns]
+    if isinstance(model , NativeCategoricalRegressor):
+        X_compact=model.compact(X)
+        return X_compact , X_compact
+    X=sparse.csr_matrix(X , dtype=np.float32)
+    return X.tocsc() , X
+
+
+def fit_prepared(model , X_fit , y , n_features:int):
+    #n_features = columns of the preprocessor output the model predicts on
+    estimator=model.estimator if isinstance(model , FeatureSubsetRegressor) else model
+    if isinstance(estimator , NativeCategoricalRegressor):
+        estimator.fit_compact(X_fit , y)
+    else:
+        estimator.fit(X_fit , y)
+    if isinstance(model , FeatureSubsetRegressor):
+        model.n_features_in_=n_features
+    return model
+
+
+def predict_prepared(model , X_predict)->np.ndarray:
+    estimator=model.estimator if isinstance(model , FeatureSubsetRegressor) else model
+    if isinstance(estimator , NativeCategoricalRegressor):
+        return estimator.predict_compact(X_predict)
+    return np.asarray(estimator.predict(X_predict) , dtype=np.float64)
+
+
+def set_estimator_threads(model , n_threads:int)->Optional[int]:
+    #XGBoost keeps its own thread count , return: the previous one (None for other estimators)
+    while isinstance(model , (FeatureSubsetRegressor , NativeCategoricalRegressor)):
+        model=model.estimator
+    if isinstance(model , XGBRegressor):
+        previous=model.get_params()["n_jobs"]
+        model.set_params(n_jobs=n_threads)
+        return previous
+    return None
+
+
+def _set_candidate_data(shared_dir:str)->None:
+    _CANDIDATE_DATA.update(load_shared_arrays(shared_dir))
+
+
+def _fit_candidate(candidate:dict , feature_blocks:dict , exclude_features:List[str] , input_key:str ,
+                   model_file_path:str , n_threads:int)->dict:
+    #runs inside a pool worker , exceptions are returned as text because SrcException does not pickle
+    try:
+        X_train_fit=_CANDIDATE_DATA[f"{input_key}.X_train_fit"]
+        X_train=_CANDIDATE_DATA.get(f"{input_key}.X_train_predict" , X_train_fit)
+        X_test=_CANDIDATE_DATA[f"{input_key}.X_test"]
+        y_train , y_test=_CANDIDATE_DATA["y_train"] , _CANDIDATE_DATA["y_test"]
+        model=get_estimator(candidate["estimator"] , feature_blocks , exclude_features=exclude_features)
+        #each of the n_jobs workers gets its share of the cores (OpenMP of HistGradientBoosting , XGBoost threads)
+        serving_threads=set_estimator_threads(model , n_threads)
+        with threadpool_limits(limits=n_threads):
+            start_time=time.perf_counter()
+            fit_prepared(model , X_train_fit , y_train , n_features=feature_blocks["multi_label"][1])
+            fit_seconds=time.perf_counter()-start_time
+            start_time=time.perf_counter()
+            yhat_test=predict_prepared(model , X_test)
+            predict_seconds=time.perf_counter()-start_time
+            r2_train=r2_score(y_train , predict_prepared(model , X_train))
+        if serving_threads is not None:
+            set_estimator_threads(model , serving_threads)
+        save_object(file_path=model_file_path , obj=model)
+        return {"estimator":candidate["estimator"] ,
+                "feature_set":candidate["feature_set"] ,
+                "threads":n_threads ,
+                "fit_seconds":round(fit_seconds , 3) ,
+                "predict_rows_per_second":round(X_test.shape[0]/predict_seconds) ,
+                "size_mb":round(serialized_size_mb(model) , 3) ,
+                "r2_train":float(r2_train) ,
+                "r2_test":float(r2_score(y_test , yhat_test)) ,
+                "error":None}
+    except Exception as e:
+        return {"estimator":candidate["estimator"] , "feature_set":candidate["feature_set"] ,
+                "error":f"{e}\n{traceback.format_exc()}"}
+
+
+class CandidateTrainer:
+
+    """
+    =====================================================================================
+    Trains several candidate models at the same time on a process pool
+
+    A candidate is {"name":str , "estimator":name in ESTIMATORS , "feature_set":name in
+    feature_sets}. Train and test arrays are written once to work_dir as .npy files (sparse
+    matrices as their components) in the layout each estimator consumes , one copy per
+    feature set and input layout (prepare_inputs): float32 csc / csr for forests , the
+    compacted dense matrix for boosting models. Every worker memory maps them , so the
+    input is neither pickled nor converted per candidate. The estimators still build their
+    own internal structures from it (histogram bins , XGBoost DMatrix , the XGBoost
+    DataFrame of category dtypes).
+
+    Each worker runs with available_cpus() // n_jobs threads. It saves its fitted model to
+    work_dir and only the chosen model is loaded back. work_dir is removed after train().
+
+    candidates :List[dict] = models to fit
+    feature_sets :dict = feature set name -> input features left out of the model
+    feature_blocks :dict = RestaurantPreprocessor.feature_blocks()
+    work_dir :str = shared arrays and candidate models
+    n_jobs :int = worker processes , 1 fits every candidate inline , None uses utils.available_cpus()
+    =====================================================================================
+    """
+
+    def __init__(self , candidates:List[dict] , feature_sets:Dict[str , List[str]] , feature_blocks:dict , work_dir:str ,
+                 n_jobs:Optional[int]=None):
+        try:
+            unknown=[candidate["name"] for candidate in candidates
+                     if candidate["estimator"] not in ESTIMATORS or candidate["feature_set"] not in feature_sets]
+            if len(unknown)>0:
+                raise ValueError(f"Candidates {unknown} use an unknown estimator or feature set")
+            self.candidates=candidates
+            self.feature_sets=feature_sets
+            self.feature_blocks=feature_blocks
+            self.work_dir=work_dir
+            self.n_jobs=min(n_jobs or available_cpus() , len(candidates))
+            self.report=dict()
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def train(self , X_train , y_train , X_test , y_test , chosen:str="best"):
+        """
+        chosen :str = candidate name to return , or "best" for the highest test r2
+        return: fitted model of the chosen candidate , details of every candidate in self.report
+        """
+        try:
+            start_time=time.perf_counter()
+            shared_dir=os.path.join(self.work_dir , "shared")
+            arrays , tasks={"y_train":np.asarray(y_train) , "y_test":np.asarray(y_test)} , dict()
+            n_threads=max(available_cpus()//self.n_jobs , 1)
+            for candidate in self.candidates:
+                exclude_features=self.feature_sets[candidate["feature_set"]]
+                model=get_estimator(candidate["estimator"] , self.feature_blocks , exclude_features=exclude_features)
+                input_key=f"{input_layout(model)}.{candidate['feature_set']}"
+                if f"{input_key}.X_train_fit" not in arrays:
+                    X_train_fit , X_train_predict=prepare_inputs(model , X_train)
+                    arrays[f"{input_key}.X_train_fit"]=X_train_fit
+                    if X_train_predict is not X_train_fit:
+                        arrays[f"{input_key}.X_train_predict"]=X_train_predict
+                    arrays[f"{input_key}.X_test"]=prepare_inputs(model , X_test)[1]
+                tasks[candidate["name"]]=(candidate , self.feature_blocks , exclude_features , input_key ,
+                                          os.path.join(self.work_dir , "models" , f"{candidate['name']}.pkl") , n_threads)
+            save_shared_arrays(shared_dir , arrays)
+            del arrays
+            logging.info(f"Training {len(tasks)} candidates on {self.n_jobs} processes")
+            results=dict()
+            try:
+                if self.n_jobs>1:
+                    start_method="fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+                    with ProcessPoolExecutor(max_workers=self.n_jobs , mp_context=multiprocessing.get_context(start_method) ,
+                                             initializer=_set_candidate_data , initargs=(shared_dir ,)) as executor:
+                        futures={executor.submit(_fit_candidate , *task):name for name , task in tasks.items()}
+                        for future in as_completed(futures):
+                            results[futures[future]]=future.result()
+                            logging.info(f"Candidate {futures[future]} : {results[futures[future]]}")
+                else:
+                    _set_candidate_data(shared_dir)
+                    for name , task in tasks.items():
+                        results[name]=_fit_candidate(*task)
+                        logging.info(f"Candidate {name} : {results[name]}")
+                    _CANDIDATE_DATA.clear()
+
+                fitted={name:result for name , result in results.items() if result["error"] is None}
+                if chosen=="best":
+                    chosen=max(fitted , key=lambda name:fitted[name]["r2_test"]) if len(fitted)>0 else None
+                if chosen not in fitted:
+                    raise Exception(f"Candidate {chosen} was not trained , errors: "
+                                    f"{ {name:result['error'] for name , result in results.items() if result['error']} }")
+                model=load_object(file_path=tasks[chosen][4])
+            finally:
+                shutil.rmtree(self.work_dir , ignore_errors=True)
+
+            self.report={"seconds":round(time.perf_counter()-start_time , 3) ,
+                         "n_jobs":self.n_jobs ,
+                         "chosen":chosen ,
+                         "candidates":{name:results[name] for name in tasks}}
+            logging.info(f"Chosen candidate {chosen} after {self.report['seconds']}s")
+            return model
+        except Exception as e:
+            raise SrcException(e , sys)
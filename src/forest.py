@@ -0,0 +1,150 @@
+from src.exception import SrcException
+from src.logger import logging
+from scipy import sparse
+import numpy as np
+import tempfile
+import time
+import json
+import os , sys
+
+forest_meta_file_name="forest.json"
+FOREST_ARRAYS=("feature" , "threshold" , "left" , "right" , "value" , "roots")
+
+
+def export_forest(model , forest_dir:str)->str:
+    """
+    =====================================================================================
+    Flattens every tree of a fitted sklearn forest regressor into contiguous numpy arrays
+
+    feature , threshold , left , right , value : one entry per node of all trees ,
+    child indexes are global so the whole forest is a single node table
+    roots : index of the root node of every tree
+
+    Leaves keep feature -2 (sklearn TREE_UNDEFINED) and point to themselves.
+    Arrays are written as .npy files so FlatForest can memory map them.
+    return: forest_dir
+    =====================================================================================
+    """
+    try:
+        trees=[estimator.tree_ for estimator in model.estimators_]
+        offsets=np.cumsum([0]+[tree.node_count for tree in trees])
+        arrays={"feature":[] , "threshold":[] , "left":[] , "right":[] , "value":[]}
+        for offset , tree in zip(offsets , trees):
+            node_index=np.arange(tree.node_count)
+            is_leaf=tree.children_left<0
+            arrays["feature"].append(tree.feature.astype(np.int32))
+            arrays["threshold"].append(tree.threshold.astype(np.float64))
+            arrays["left"].append(np.where(is_leaf , node_index , tree.children_left)+offset)
+            arrays["right"].append(np.where(is_leaf , node_index , tree.children_right)+offset)
+            arrays["value"].append(tree.value[:,0,0].astype(np.float64))
+        arrays={name:np.ascontiguousarray(np.concatenate(values)) for name , values in arrays.items()}
+        arrays["left"]=arrays["left"].astype(np.int32)
+        arrays["right"]=arrays["right"].astype(np.int32)
+        arrays["roots"]=offsets[:-1].astype(np.int32)
+
+        os.makedirs(forest_dir , exist_ok=True)
+        for name in FOREST_ARRAYS:
+            np.save(os.path.join(forest_dir , f"{name}.npy") , arrays[name])
+        meta={"n_trees":len(trees) , "n_nodes":int(offsets[-1]) , "n_features":int(model.n_features_in_) ,
+              "max_depth":int(max(tree.max_depth for tree in trees))}
+        with open(os.path.join(forest_dir , forest_meta_file_name) , "w") as meta_file:
+            json.dump(meta , meta_file)
+        logging.info(f"Forest exported to {forest_dir} : {meta}")
+        return forest_dir
+    except Exception as e:
+        raise SrcException(e , sys)
+
+
+class FlatForest:
+
+    """
+    =====================================================================================
+    Vectorized predictor over the arrays written by export_forest
+
+    All (row , tree) pairs of a batch walk the node table together , one numpy step per
+    tree level , and only pairs that have not reached a leaf are kept in the next step.
+    Rows are compared as float32 like sklearn does , so predictions match
+    RandomForestRegressor.predict up to float summation order.
+    =====================================================================================
+    """
+
+    def __init__(self , feature , threshold , left , right , value , roots , n_features:int , chunk_size:int=4096):
+        self.feature=feature
+        self.threshold=threshold
+        self.left=left
+        self.right=right
+        self.value=value
+        self.roots=np.asarray(roots)
+        self.n_features_in_=n_features
+        self.chunk_size=chunk_size
+
+    @classmethod
+    def load(cls , forest_dir:str , mmap_mode:str="r"):
+        try:
+            with open(os.path.join(forest_dir , forest_meta_file_name)) as meta_file:
+                meta=json.load(meta_file)
+            arrays={name:np.load(os.path.join(forest_dir , f"{name}.npy") , mmap_mode=mmap_mode) for name in FOREST_ARRAYS}
+            return cls(n_features=meta["n_features"] , **arrays)
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def _predict_chunk(self , X:np.ndarray)->np.ndarray:
+        n_rows , n_trees=X.shape[0] , len(self.roots)
+        flat_X=X.ravel()
+        leaf=np.empty(n_rows*n_trees , dtype=np.int32)
+        #one entry per (row , tree) pair , row major
+        active=np.arange(n_rows*n_trees)
+        current=np.tile(self.roots , n_rows)
+        row_offset=np.repeat(np.arange(n_rows , dtype=np.int64)*X.shape[1] , n_trees)
+        while active.size>0:
+            feature=self.feature[current]
+            internal=feature>=0
+            if not internal.all():
+                #pairs that reached a leaf are parked and dropped from the next step
+                leaf[active[~internal]]=current[~internal]
+                active , current , feature , row_offset=active[internal] , current[internal] , feature[internal] , row_offset[internal]
+                if active.size==0:
+                    break
+            go_left=flat_X[row_offset+feature]<=self.threshold[current]
+            current=np.where(go_left , self.left[current] , self.right[current])
+        return self.value[leaf].reshape(n_rows , n_trees).mean(axis=1)
+
+    def predict(self , X)->np.ndarray:
+        try:
+            if X.shape[1]!=self.n_features_in_:
+                raise ValueError(f"X has {X.shape[1]} features , forest expects {self.n_features_in_}")
+            predictions=[]
+            for start in range(0 , X.shape[0] , self.chunk_size):
+                chunk=X[start:start+self.chunk_size]
+                chunk=chunk.toarray() if sparse.issparse(chunk) else np.asarray(chunk)
+                predictions.append(self._predict_chunk(np.ascontiguousarray(chunk , dtype=np.float32)))
+            return np.concatenate(predictions) if predictions else np.empty(0 , dtype=np.float64)
+        except Exception as e:
+            raise SrcException(e , sys)
+
+
+def forest_node_count(model)->int:
+    return int(sum(estimator.tree_.node_count for estimator in model.estimators_))
+
+
+def single_row_latency_ms(model , X , n_rows:int=200 , percentile:float=99.0)->float:
+    """
+    Latency percentile of one row predictions , on the serving path:
+    forests are exported and scored through a memory mapped FlatForest like the prediction service does
+    """
+    try:
+        rows=np.random.default_rng(42).integers(0 , X.shape[0] , size=n_rows)
+        with tempfile.TemporaryDirectory() as forest_dir:
+            predictor=model
+            if hasattr(model , "estimators_") and hasattr(model.estimators_[0] , "tree_"):
+                predictor=FlatForest.load(export_forest(model , forest_dir))
+            predictor.predict(X[rows[:1]]) #warm up , first call pages the arrays in
+            timings=[]
+            for row in rows:
+                start_time=time.perf_counter()
+                predictor.predict(X[row:row+1])
+                timings.append(time.perf_counter()-start_time)
+            del predictor #memory maps are released before the directory goes away
+        return float(np.percentile(timings , percentile)*1000)
+    except Exception as e:
+        raise SrcException(e , sys)
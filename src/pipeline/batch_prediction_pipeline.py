@@ -1,62 +1,156 @@
 from src.exception import SrcException
 from src.logger import logging
-from src.predictor import ModelResolver
+from src.predictor import get_predictor
 import pandas as pd
 import numpy as np
-from src.utils import load_object
+from src.utils import write_yaml_file
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from typing import Optional
 import os,sys
+import time
 from datetime import datetime
-from src.config import ordinal_features , nominal_features , target_column
 import warnings 
 warnings.filterwarnings("ignore")
 
 PREDICTION_DIR="prediction"
+DEFAULT_CHUNK_SIZE=50_000 #rows per chunk when streaming large input files
 
 
-def start_batch_prediction(input_file_path):
-    try:
-        logging.info(f'{">"*20} Batch Prediction {"<"*20}')
-        os.makedirs(PREDICTION_DIR,exist_ok=True)
-        logging.info(f"Creating model resolver object")
-        model_resolver = ModelResolver(model_registry="saved_models")
+def predict_dataframe(df:pd.DataFrame , preprocessor , model)->pd.DataFrame:
+    """
+    Adds the Prediction column to a raw input dataframe
+    df: raw rows as read from the input csv
+    preprocessor: fitted RestaurantPreprocessor from the model registry
+    model: trained model from the model registry
+    """
+    df.replace({"na":np.NAN},inplace=True)
+    input_arr = preprocessor.transform(df) #sparse feature matrix , same layout as training
+    df["Prediction"] = model.predict(input_arr) #adding new column for Prediction 
+    return df
+
+
+def score_file(input_file_path , preprocessor , model , chunk_size:Optional[int]=None)->dict:
+    """
+    Scores one input csv with an already loaded preprocessor and model
+    return: dict with prediction_file_path , rows , seconds and rows_per_sec
+    """
+    prediction_file_name = os.path.basename(input_file_path).replace(".csv",f"{datetime.now().strftime('%m%d%Y__%H%M%S')}.csv")
+    prediction_file_path = os.path.join(PREDICTION_DIR,prediction_file_name)
+
+    start_time = time.perf_counter()
+    if chunk_size is None:
         logging.info(f"Reading file :{input_file_path}")
         df = pd.read_csv(input_file_path)
-        df.replace({"na":np.NAN},inplace=True)
-  
-        logging.info(f"Loading transformer to transform dataset")
-        
-        #Lets load transformer pkl file
-        transformer = load_object(file_path=model_resolver.get_latest_transformer_path()) 
-        encoder=load_object(file_path=model_resolver.get_latest_encoder_path()) 
-
-        
-        #applying LableEncoder on Ordinal Features
-        for feature_name in ordinal_features:
-            df[feature_name]=encoder.transform(df[feature_name])
-
-        input_feature_names =  list(transformer.feature_names_in_)  #all features tranformed while training model same as before
-        feature_encoded_to_encoded = transformer.transform(df[input_feature_names]) #feature name  to be  tranformed 
-        feature_encoded_df=pd.DataFrame(feature_encoded_to_encoded, columns=transformer.get_feature_names_out(input_feature_names)) #getting transformed features name
-        #merging both tranformed  features and main df features
-        df_encoded=pd.concat([df.drop(columns=input_feature_names).reset_index(drop=True), feature_encoded_df.reset_index(drop=True)], axis=1) 
-        
-        logging.info(f'{">"*20} Selecting Most Important Input Features  {"<"*20}')
-        input_df=df_encoded.drop(target_column, axis=1) #new independent features after transformation 
-        target_df=df_encoded[target_column] #In my case my Target is already Encoded 
-        
-        model = load_object(file_path=model_resolver.get_latest_model_path()) #loading best model
-        prediction = model.predict(input_df)
-        
-        #applying LableEncoder on Ordinal Features
-        for feature_name in ordinal_features:
-            df[feature_name]=encoder.inverse_transform(df[feature_name])
-
-        df["Prediction"] = prediction #adding new column for Prediction 
-        prediction_file_name = os.path.basename(input_file_path).replace(".csv",f"{datetime.now().strftime('%m%d%Y__%H%M%S')}.csv")
-        prediction_file_path = os.path.join(PREDICTION_DIR,prediction_file_name)
+        df = predict_dataframe(df , preprocessor , model)
         df.to_csv(prediction_file_path,index=False,header=True)
+        total_rows = len(df)
+    else:
+        logging.info(f"Streaming file :{input_file_path} in chunks of {chunk_size} rows")
+        total_rows = 0
+        for chunk in pd.read_csv(input_file_path , chunksize=chunk_size):
+            chunk = predict_dataframe(chunk , preprocessor , model)
+            #first chunk creates the file with header , next chunks are appended
+            chunk.to_csv(prediction_file_path , index=False , header=total_rows==0 , mode="w" if total_rows==0 else "a")
+            total_rows += len(chunk)
+            logging.info(f"Scored {total_rows} rows")
+        if total_rows==0:
+            #header only input file
+            empty_df = pd.read_csv(input_file_path , nrows=0)
+            empty_df["Prediction"] = pd.Series(dtype=np.float64)
+            empty_df.to_csv(prediction_file_path , index=False , header=True)
+
+    elapsed = time.perf_counter() - start_time
+    rows_per_sec = total_rows/max(elapsed , 1e-9)
+    logging.info(f"Scored {total_rows} rows in {elapsed:.2f}s ({rows_per_sec:.0f} rows/sec)")
+    return {"prediction_file_path":prediction_file_path , "rows":int(total_rows) ,
+            "seconds":round(elapsed , 4) , "rows_per_sec":round(rows_per_sec , 1)}
+
+
+def start_batch_prediction(input_file_path , chunk_size:Optional[int]=None):
+    """
+    input_file_path: csv file to score
+    chunk_size: when given the file is streamed in chunks of this many rows and every
+                scored chunk is appended to the output file , so memory stays flat
+                whatever the input size. None scores the whole file at once
+    return: path of the prediction csv
+    """
+    try:
+        logging.info(f'{">"*20} Batch Prediction {"<"*20}')
+        os.makedirs(PREDICTION_DIR,exist_ok=True)
+        logging.info(f"Fetching cached model bundle")
+        #deserialized once per registry version , repeated calls reuse the loaded preprocessor and model
+        #bulk scoring keeps the sklearn model , its compiled tree walk beats FlatForest on large batches
+        bundle = get_predictor(model_registry="saved_models" , mapped_forest=False).get_bundle()
+        logging.info(f"Using model registry version {bundle.version}")
+
+        file_report = score_file(input_file_path , bundle.preprocessor , bundle.model , chunk_size=chunk_size)
         logging.info(f'{">"*20} Batch Prediction Completed Sucessfully {"<"*20}')
-        return prediction_file_path
+        return file_report["prediction_file_path"]
     
     except Exception as e:
-        raise SrcException(e, sys)
\ No newline at end of file
+        raise SrcException(e, sys)
+
+
+#model bundle used inside pool workers , inherited from the parent on fork
+_worker_bundle=None
+
+def _init_worker(bundle):
+    global _worker_bundle
+    if bundle is not None:
+        _worker_bundle = bundle
+
+def _score_file_in_worker(input_file_path , chunk_size):
+    preprocessor , model = _worker_bundle
+    try:
+        return {"input_file_path":input_file_path , "status":"success" , **score_file(input_file_path , preprocessor , model , chunk_size)}
+    except Exception as e:
+        logging.error(f"Batch prediction failed for {input_file_path}: {e}")
+        return {"input_file_path":input_file_path , "status":"failed" , "error":str(e)}
+
+
+def start_parallel_batch_prediction(input_dir , max_workers:Optional[int]=None , chunk_size:Optional[int]=DEFAULT_CHUNK_SIZE):
+    """
+    Scores every csv file inside input_dir on a process pool
+    The preprocessor and model come from the cached Predictor , forked workers share the loaded pages copy on write
+    (spawn platforms receive one pickled copy per worker instead of one load per file)
+    A manifest with rows and timings for every file is written next to the predictions
+    return: path of the manifest yaml file
+    """
+    global _worker_bundle
+    try:
+        logging.info(f'{">"*20} Parallel Batch Prediction {"<"*20}')
+        os.makedirs(PREDICTION_DIR,exist_ok=True)
+        input_files = sorted(os.path.join(input_dir , file_name) for file_name in os.listdir(input_dir) if file_name.endswith(".csv"))
+        logging.info(f"Found {len(input_files)} csv files inside {input_dir}")
+
+        bundle = get_predictor(model_registry="saved_models" , mapped_forest=False).get_bundle()
+        logging.info(f"Using model registry version {bundle.version}")
+        _worker_bundle = (bundle.preprocessor , bundle.model)
+
+        max_workers = max_workers or min(max(len(input_files) , 1) , os.cpu_count() or 1)
+        start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        mp_context = multiprocessing.get_context(start_method)
+        start_time = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=max_workers , mp_context=mp_context ,
+                                 initializer=_init_worker ,
+                                 initargs=(None if start_method=="fork" else _worker_bundle ,)) as executor:
+            files_report = list(executor.map(_score_file_in_worker , input_files , [chunk_size]*len(input_files)))
+        elapsed = time.perf_counter() - start_time
+
+        manifest = {"input_dir":input_dir , "workers":max_workers , "chunk_size":chunk_size ,
+                    "files":files_report ,
+                    "total_rows":int(sum(report.get("rows" , 0) for report in files_report)) ,
+                    "wall_seconds":round(elapsed , 4)}
+        manifest_file_path = os.path.join(PREDICTION_DIR , f"manifest_{datetime.now().strftime('%m%d%Y__%H%M%S')}.yml")
+        write_yaml_file(file_path=manifest_file_path , data=manifest)
+        logging.info(f"Batch manifest written to {manifest_file_path}")
+
+        failed_files = [report["input_file_path"] for report in files_report if report["status"]!="success"]
+        if len(failed_files)>0:
+            raise Exception(f"Batch prediction failed for files: {failed_files} , see {manifest_file_path}")
+        logging.info(f'{">"*20} Parallel Batch Prediction Completed Sucessfully {"<"*20}')
+        return manifest_file_path
+
+    except Exception as e:
+        raise SrcException(e, sys)
@@ -0,0 +1,131 @@
+from src.exception import SrcException
+from src.logger import logging
+from src.utils import CPU_BUDGET_ENV
+from concurrent.futures import ProcessPoolExecutor , wait , FIRST_COMPLETED
+from dataclasses import dataclass , field
+from typing import Callable , Dict , List , Optional
+import multiprocessing
+import traceback
+import time
+import os , sys
+
+
+@dataclass
+class Stage:
+    name:str
+    fn:Callable #picklable callable , receives the result of every dependency as keyword argument named after it
+    deps:List[str]=field(default_factory=list)
+
+
+def _run_stage(fn:Callable , kwargs:dict , cpu_budget:int)->dict:
+    #runs inside a pool worker , exceptions are returned as text because SrcException does not pickle
+    #pools and thread counts opened by the stage default to cpu_budget through utils.available_cpus()
+    os.environ[CPU_BUDGET_ENV]=str(cpu_budget)
+    start_time=time.perf_counter()
+    try:
+        return {"result":fn(**kwargs) , "error":None , "seconds":time.perf_counter()-start_time}
+    except Exception as e:
+        return {"result":None , "error":f"{e}\n{traceback.format_exc()}" , "seconds":time.perf_counter()-start_time}
+
+
+class DagExecutor:
+
+    """
+    =====================================================================================
+    Runs a small dependency graph of pipeline stages on a process pool
+
+    A stage is submitted as soon as all of its dependencies have finished , so independent
+    stages run at the same time. After run() , report holds the wall time of every stage ,
+    the total wall time and the critical path (longest chain of dependent stage times).
+    Every stage gets cpu count // max_workers cores (at least 1) as its budget , so the
+    drift , candidate and tuning pools of stages running side by side do not oversubscribe.
+
+    stages :List[Stage] = graph nodes , dependencies must be stage names of the same graph
+    max_workers :int = pool size , default min(number of stages , cpu count)
+    =====================================================================================
+    """
+
+    def __init__(self , stages:List[Stage] , max_workers:Optional[int]=None):
+        try:
+            self.stages={stage.name:stage for stage in stages}
+            for stage in stages:
+                unknown=[dep for dep in stage.deps if dep not in self.stages]
+                if len(unknown)>0:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stages {unknown}")
+            self.order=self.topological_order()
+            self.max_workers=max_workers or min(len(stages) , os.cpu_count() or 1)
+            self.cpu_budget=max((os.cpu_count() or 1)//self.max_workers , 1)
+            self.report=dict()
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def topological_order(self)->List[str]:
+        order , visiting , done=[] , set() , set()
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through stage {name}")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def critical_path(self , seconds:Dict[str , float]):
+        #longest finishing chain , dependencies come first in topological order
+        finish , previous=dict() , dict()
+        for name in self.order:
+            deps=self.stages[name].deps
+            slowest_dep=max(deps , key=lambda dep:finish[dep]) if deps else None
+            finish[name]=seconds[name]+(finish[slowest_dep] if slowest_dep else 0.0)
+            previous[name]=slowest_dep
+        name=max(finish , key=finish.get)
+        path=[]
+        while name is not None:
+            path.append(name)
+            name=previous[name]
+        return path[::-1] , max(finish.values())
+
+    def run(self)->Dict[str , object]:
+        try:
+            results , timings , running=dict() , dict() , dict()
+            pending=list(self.order)
+            start_method="fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+            start_time=time.perf_counter()
+            with ProcessPoolExecutor(max_workers=self.max_workers , mp_context=multiprocessing.get_context(start_method)) as executor:
+                while pending or running:
+                    for name in [name for name in pending if all(dep in results for dep in self.stages[name].deps)]:
+                        pending.remove(name)
+                        logging.info(f"Submitting stage {name}")
+                        kwargs={dep:results[dep] for dep in self.stages[name].deps}
+                        running[executor.submit(_run_stage , self.stages[name].fn , kwargs , self.cpu_budget)]=(name , time.perf_counter()-start_time)
+                    done , _=wait(running , return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name , submitted=running.pop(future)
+                        outcome=future.result()
+                        if outcome["error"] is not None:
+                            #stages already running finish , nothing new is submitted
+                            pending.clear()
+                            wait(running)
+                            raise Exception(f"Stage {name} failed: {outcome['error']}")
+                        results[name]=outcome["result"]
+                        timings[name]={"seconds":round(outcome["seconds"] , 3) , "started_at":round(submitted , 3) ,
+                                       "finished_at":round(time.perf_counter()-start_time , 3) , "deps":self.stages[name].deps}
+                        logging.info(f"Stage {name} finished in {outcome['seconds']:.2f}s")
+
+            path , path_seconds=self.critical_path({name:timing["seconds"] for name , timing in timings.items()})
+            self.report={"wall_seconds":round(time.perf_counter()-start_time , 3) ,
+                         "critical_path":path ,
+                         "critical_path_seconds":round(path_seconds , 3) ,
+                         "max_workers":self.max_workers ,
+                         "cpu_budget":self.cpu_budget ,
+                         "stages":timings}
+            logging.info(f"Pipeline finished in {self.report['wall_seconds']}s , critical path {path} {path_seconds:.2f}s")
+            return results
+        except Exception as e:
+            raise SrcException(e , sys)
@@ -0,0 +1,120 @@
+from src.exception import SrcException
+from src.logger import logging
+from src import utils
+from dataclasses import asdict , is_dataclass
+from typing import Callable , List , Optional , Tuple
+import hashlib
+import json
+import os , sys
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StageCache:
+
+    """
+    =====================================================================================
+    Content addressed cache of pipeline stage artifacts
+
+    Every stage is keyed by a sha256 of
+        stage name , config values (artifact directory paths excluded) ,
+        content of every file referenced by the input artifacts and the src code version
+    A stage whose key was already computed by an earlier run reuses that run's artifact
+    (its files inside artifact/<timestamp>) instead of running again.
+
+    cache_dir :str = one <stage>/<key>.yml file per cached artifact
+    code_dir :str = python sources hashed into the code version
+    =====================================================================================
+    """
+
+    def __init__(self , cache_dir:str , code_dir:str=CODE_DIR):
+        self.cache_dir=cache_dir
+        self.code_dir=code_dir
+        self._file_hashes=dict()
+        self.code_version=self._code_version()
+
+    def _code_version(self)->str:
+        digest=hashlib.sha256()
+        for root , dirs , files in os.walk(self.code_dir):
+            dirs[:]=sorted(directory for directory in dirs if directory!="__pycache__")
+            for file_name in sorted(files):
+                if file_name.endswith(".py"):
+                    file_path=os.path.join(root , file_name)
+                    digest.update(os.path.relpath(file_path , self.code_dir).encode())
+                    digest.update(self.file_hash(file_path).encode())
+        return digest.hexdigest()
+
+    def file_hash(self , file_path:str)->str:
+        #memoized per (path , size , mtime) , every file is read at most once per run
+        stat=os.stat(file_path)
+        memo_key=(os.path.abspath(file_path) , stat.st_size , stat.st_mtime_ns)
+        if memo_key not in self._file_hashes:
+            self._file_hashes[memo_key]=utils.file_sha256(file_path)
+        return self._file_hashes[memo_key]
+
+    def _fingerprint(self , value , artifact_directory:str=None):
+        #output paths of the config change with every run and caches under cache_dir (e.g. tuning fold scores)
+        #grow with every run , neither is part of the key
+        if artifact_directory is not None and isinstance(value , str) and value.startswith((artifact_directory , self.cache_dir)):
+            return None
+        if isinstance(value , str) and os.path.isfile(value):
+            return {"file":self.file_hash(value)}
+        if isinstance(value , (str , int , float , bool)) or value is None:
+            return value
+        return repr(value)
+
+    def key(self , stage_name:str , config , input_artifacts:List , artifact_directory:str)->str:
+        try:
+            payload={"stage":stage_name ,
+                     "code_version":self.code_version ,
+                     "config":{name:self._fingerprint(value , artifact_directory) for name , value in sorted(vars(config).items())} ,
+                     "inputs":[{name:self._fingerprint(value) for name , value in asdict(artifact).items()}
+                               for artifact in input_artifacts]}
+            return hashlib.sha256(json.dumps(payload , sort_keys=True , default=str).encode()).hexdigest()
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def _entry_path(self , stage_name:str , key:str)->str:
+        return os.path.join(self.cache_dir , stage_name , f"{key}.yml")
+
+    def load(self , stage_name:str , key:str , artifact_class)->Optional[object]:
+        try:
+            entry_path=self._entry_path(stage_name , key)
+            if not os.path.exists(entry_path):
+                return None
+            artifact=artifact_class(**utils.read_yaml_file(entry_path))
+            #the earlier run directory may have been cleaned up
+            missing=[value for value in asdict(artifact).values() if isinstance(value , str) and os.path.isabs(value) and not os.path.exists(value)]
+            if len(missing)>0:
+                logging.info(f"Stage cache entry {entry_path} points to missing files {missing}")
+                return None
+            return artifact
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def save(self , stage_name:str , key:str , artifact)->None:
+        try:
+            #numpy scalars (e.g. r2 scores) are stored as plain python values
+            data={name:value.item() if hasattr(value , "item") else value for name , value in asdict(artifact).items()}
+            utils.write_yaml_file(file_path=self._entry_path(stage_name , key) , data=data)
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def run(self , stage_name:str , config , input_artifacts:List , artifact_class , stage_fn:Callable ,
+            artifact_directory:str)->Tuple[object , bool]:
+        """
+        Returns (artifact , cache_hit) , stage_fn() only runs on a cache miss
+        """
+        try:
+            key=self.key(stage_name , config , input_artifacts , artifact_directory)
+            artifact=self.load(stage_name , key , artifact_class)
+            if artifact is not None:
+                logging.info(f"Stage {stage_name} cache hit {key[:12]} , reusing {artifact}")
+                return artifact , True
+            logging.info(f"Stage {stage_name} cache miss {key[:12]}")
+            artifact=stage_fn()
+            if is_dataclass(artifact):
+                self.save(stage_name , key , artifact)
+            return artifact , False
+        except Exception as e:
+            raise SrcException(e , sys)
@@ -6,60 +6,156 @@ from src.components.model_pusher import ModelPusher
 from src.entity.config_entity import TrainingPipelineConfig , DataIngestionConfig , DataValidationConfig , DataTransformationConfig , ModelTrainerConfig
 from src.entity.config_entity import ModelEvaluationConfig  , ModelPusherConfig
 from src.components.model_evaluation import ModelEvaluation
+from src.entity.artifact_entity import DataValidationArtifact , DataTransformationArtifact , ModelTrainerArtifact , RegistryModelArtifact
+from src.predictor import ModelResolver
+from src.pipeline.stage_cache import StageCache
+from src.pipeline.dag_executor import DagExecutor , Stage
+from src.pipeline.training_stages import TRAINING_STAGE_DEPS
 from src.exception import SrcException
 from src.logger import logging
-import warnings 
+from src import utils
+from functools import partial
+from typing import List , Optional
+import warnings
 warnings.filterwarnings("ignore")
 import os,sys
 
-def initiate_training_pipeline():
 
+def _completed(stage_title:str):
+    print(f' {">"*20} {stage_title} Pipeline Completed {"<"*20}')
+    logging.info(f' {">"*20} {stage_title} Pipeline Completed {"<"*20}')
+
+
+def _run_cached(training_pipeline_config , use_stage_cache , stage_name , config , input_artifacts , artifact_class , stage_fn):
+    #validation , transformation and training reuse the artifact of an earlier run when data , config and code did not change
+    if not use_stage_cache:
+        return stage_fn()
+    stage_cache = StageCache(cache_dir=training_pipeline_config.stage_cache_dir)
+    artifact , _ = stage_cache.run(stage_name , config , input_artifacts , artifact_class , stage_fn , training_pipeline_config.artifact_directory)
+    return artifact
+
+
+def _registry_model_input(model_registry:str)->RegistryModelArtifact:
+    #stages starting from the registry model get a new cache key when a new version is pushed
+    return RegistryModelArtifact(model_dir=ModelResolver(model_registry=model_registry).get_latest_dir_path())
+
+
+#every stage is a module level function so it can run in a pool worker or in its own Airflow task ,
+#the results of its dependencies arrive as keyword arguments named after the dependency stage
+
+def data_ingestion_stage(training_pipeline_config , use_stage_cache):
+    data_ingestion_config= DataIngestionConfig(training_pipeline_config=training_pipeline_config)
+    data_ingestion_artifact=DataIngestion(data_ingestion_config=data_ingestion_config).initiate_data_ingestion()
+    _completed("Data Ingestion")
+    return data_ingestion_artifact
+
+
+def data_validation_stage(training_pipeline_config , use_stage_cache , data_ingestion):
+    data_validation_config=DataValidationConfig(training_pipeline_config=training_pipeline_config)
+    data_validation_artifact=_run_cached(training_pipeline_config , use_stage_cache , "data_validation" , data_validation_config , [data_ingestion] , DataValidationArtifact ,
+                                         lambda:DataValidation(data_validation_config , data_ingestion).initiate_data_validation())
+    _completed("Data Validation")
+    return data_validation_artifact
+
+
+def data_transformation_stage(training_pipeline_config , use_stage_cache , data_ingestion):
+    data_transformation_config=DataTransformationConfig(training_pipeline_config=training_pipeline_config)
+    input_artifacts=[data_ingestion]
+    if data_transformation_config.reuse_registry_preprocessor:
+        input_artifacts.append(_registry_model_input(data_transformation_config.model_registry))
+    data_transformation_artifact=_run_cached(training_pipeline_config , use_stage_cache , "data_transformation" , data_transformation_config , input_artifacts , DataTransformationArtifact ,
+                                             lambda:DataTransformation(data_transformation_config , data_ingestion).initiate_data_transformation())
+    _completed("Data Transformation")
+    return data_transformation_artifact
+
+
+def model_trainer_stage(training_pipeline_config , use_stage_cache , data_transformation):
+    model_trainer_config = ModelTrainerConfig(training_pipeline_config)
+    input_artifacts=[data_transformation]
+    if model_trainer_config.incremental:
+        input_artifacts.append(_registry_model_input(model_trainer_config.model_registry))
+    model_trainer_artifact=_run_cached(training_pipeline_config , use_stage_cache , "model_trainer" , model_trainer_config , input_artifacts , ModelTrainerArtifact ,
+                                       lambda:ModelTrainer(model_trainer_config , data_transformation).initiate_model_training())
+    _completed("Model Training")
+    return model_trainer_artifact
+
+
+def previous_model_score_stage(training_pipeline_config , use_stage_cache , data_ingestion):
+    #scores the registry model on the new test split while the current model trains
+    model_evaluation_config=ModelEvaluationConfig(training_pipeline_config)
+    previous_model_score_artifact=ModelEvaluation(model_evaluation_config , data_ingestion).score_previous_model()
+    _completed("Previous Model Scoring")
+    return previous_model_score_artifact
+
+
+def model_evaluation_stage(training_pipeline_config , use_stage_cache , data_ingestion , data_transformation , model_trainer , previous_model_score):
+    if not model_trainer.model_file_path.startswith(training_pipeline_config.artifact_directory):
+        #the run that trained this exact model already evaluated (and pushed when accepted) it
+        print(f' {">"*20} Model unchanged since an earlier run , skipping Evaluation and Pusher {"<"*20}')
+        logging.info(f"Model {model_trainer.model_file_path} reused from stage cache , skipping evaluation and pusher")
+        return None
+    model_evaluation_config=ModelEvaluationConfig(training_pipeline_config)
+    model_evaluation=ModelEvaluation(model_evaluation_config , data_ingestion , data_transformation , model_trainer)
+    model_evaluation_artifact=model_evaluation.initiate_model_evaluation(previous_model_score_artifact=previous_model_score)
+    _completed("Model Evaluation")
+    return model_evaluation_artifact
+
+
+def model_pusher_stage(training_pipeline_config , use_stage_cache , data_validation , data_transformation , model_trainer , model_evaluation):
+    if model_evaluation is None:
+        return None
+    model_pusher_config=ModelPusherConfig(training_pipeline_config)
+    model_pusher_artifact=ModelPusher(model_pusher_config , data_transformation , model_trainer).initiate_model_pusher()
+    _completed("Model Pusher")
+    return model_pusher_artifact
+
+
+#stage name -> function , the graph itself lives in src.pipeline.training_stages
+STAGE_FUNCTIONS = {
+    "data_ingestion":data_ingestion_stage ,
+    "data_validation":data_validation_stage ,
+    "data_transformation":data_transformation_stage ,
+    "model_trainer":model_trainer_stage ,
+    "previous_model_score":previous_model_score_stage ,
+    "model_evaluation":model_evaluation_stage ,
+    "model_pusher":model_pusher_stage ,
+}
+
+
+def training_stages(training_pipeline_config:TrainingPipelineConfig , use_stage_cache:bool=True)->List[Stage]:
+    return [Stage(name=name , fn=partial(STAGE_FUNCTIONS[name] , training_pipeline_config=training_pipeline_config , use_stage_cache=use_stage_cache) , deps=deps)
+            for name , deps in TRAINING_STAGE_DEPS.items()]
+
+
+def run_training_stage(stage_name:str , training_pipeline_config:TrainingPipelineConfig , use_stage_cache:bool=True , **dependencies):
+    """
+    Runs a single stage , used by the Airflow training DAG where every stage is its own task
+    dependencies = results of the dependency stages keyed by stage name
+    """
+    try:
+        stage=next(stage for stage in training_stages(training_pipeline_config , use_stage_cache) if stage.name==stage_name)
+        return stage.fn(**{dep:dependencies[dep] for dep in stage.deps})
+    except Exception as e:
+        raise SrcException(e,sys)
+
+
+def initiate_training_pipeline(use_stage_cache:bool=True , max_workers:Optional[int]=None):
+
+    """
+    use_stage_cache :bool = validation , transformation and training reuse the artifact of an
+                            earlier run when their data , config and code did not change
+    max_workers :int = processes running independent stages at the same time
+    Stage timings and the critical path are written to artifact/<timestamp>/pipeline_report.yml
+    """
     try:
         #pipeline test
         training_pipeline_config = TrainingPipelineConfig()
-        
-        #Data Ingestion
-        data_ingestion_config= DataIngestionConfig(training_pipeline_config=training_pipeline_config)
-        data_ingestion = DataIngestion(data_ingestion_config=data_ingestion_config)
-        data_ingestion_artifact=data_ingestion.initiate_data_ingestion()
-        print(f' {">"*20} Data Ingestion Pipeline Completed {"<"*20}')
-        logging.info(f' {">"*20} Data Ingestion Pipeline Completed {"<"*20}')
-        
-        #Data Validation 
-        data_validation_config=DataValidationConfig(training_pipeline_config=training_pipeline_config)
-        data_validation=DataValidation(data_validation_config , data_ingestion_artifact)
-        data_validation_artifact=data_validation.initiate_data_validation()
-        print(f' {">"*20} Data Validation Pipeline Completed {"<"*20}')
-        logging.info(f' {">"*20} Data Validation Pipeline Completed {"<"*20}')
-        
-        #Data Transformation 
-        data_transformation_config=DataTransformationConfig(training_pipeline_config=training_pipeline_config)
-        data_transfomation=DataTransformation(data_transformation_config , data_ingestion_artifact)
-        data_transformation_artifact=data_transfomation.initiate_data_transformation()
-        print(f' {">"*20} Data Transformation Pipeline Completed {"<"*20}')
-        logging.info(f' {">"*20} Data Transformation Pipeline Completed {"<"*20}')
-        
-        #model Trainer
-        model_trainer_config = ModelTrainerConfig(training_pipeline_config)
-        model_trainer = ModelTrainer(model_trainer_config , data_transformation_artifact)
-        model_trainer_artifact= model_trainer.initiate_model_training()
-        print(f' {">"*20} Model Training Pipeline Completed {"<"*20}')
-        logging.info(f' {">"*20} Model Training Pipeline Completed {"<"*20}')
-        
-        #model Evaluation 
-        model_evaluation_config=ModelEvaluationConfig(training_pipeline_config)
-        model_evaluation=ModelEvaluation(model_evaluation_config , data_ingestion_artifact , data_transformation_artifact , model_trainer_artifact)
-        model_evaluation_artifact=model_evaluation.initiate_model_evaluation()
-        print(f' {">"*20} Model Evaluation Pipeline Completed {"<"*20}')
-        logging.info(f' {">"*20} Model Evaluation Pipeline Completed {"<"*20}')
-      
-        #Model Pusher 
-        model_pusher_config=ModelPusherConfig(training_pipeline_config)
-        model_pusher=ModelPusher(model_pusher_config , data_transformation_artifact , model_trainer_artifact)
-        model_pusher_artifact=model_pusher.initiate_model_pusher()
-        print(f' {">"*20} Model Pusher Pipeline Completed {"<"*20}')
-        logging.info(f' {">"*20} Model Pusher Pipeline Completed {"<"*20}')
-    
+        executor = DagExecutor(stages=training_stages(training_pipeline_config , use_stage_cache) , max_workers=max_workers)
+        results = executor.run()
+        utils.write_yaml_file(file_path=os.path.join(training_pipeline_config.artifact_directory , "pipeline_report.yml") , data=executor.report)
+        print(f' {">"*20} Training Pipeline finished in {executor.report["wall_seconds"]}s , critical path {" -> ".join(executor.report["critical_path"])} {"<"*20}')
+        return results["model_trainer"]
+
     except Exception as e:
         raise SrcException(e,sys)
-        
+
@@ -0,0 +1,12 @@
+#training pipeline graph , stage name -> dependency stages
+#kept free of heavy imports so the Airflow DAG file can read it at parse time
+TRAINING_STAGE_DEPS = {
+    "data_ingestion":[],
+    "data_validation":["data_ingestion"],
+    "data_transformation":["data_ingestion"],
+    "model_trainer":["data_transformation"],
+    "previous_model_score":["data_ingestion"],
+    "model_evaluation":["data_ingestion" , "data_transformation" , "model_trainer" , "previous_model_score"],
+    #validation gates the push like it did when every stage ran in sequence
+    "model_pusher":["data_validation" , "data_transformation" , "model_trainer" , "model_evaluation"],
+}
@@ -1,28 +1,33 @@
 import os , sys
+import time
+import threading
+import numpy as np
 from glob import glob 
-from typing import Optional
+from dataclasses import dataclass
+from typing import Dict , Optional , Tuple
 from src.logger import logging
 from src.exception import SrcException
+from src.utils import load_object
+from src.forest import FlatForest , forest_meta_file_name
 
 file_name = "cleaned_zomato.csv"
 train_file_name="train.csv"
 test_file_name="test.csv"
-transformer_object_file_name="transformer.pkl"
-encoder_object_file_name="encoder.pkl"
+preprocessor_object_file_name="preprocessor.pkl"
 model_file_name="model.pkl"
 
 class ModelResolver:
 
     def __init__(self , model_registry:str ="saved_models" , 
-                 transformer_dir_name="transformer" , 
+                 preprocessor_dir_name="preprocessor" , 
                  model_dir_name="model" ,
-                 encoder_dir_name="encoder"):
+                 forest_dir_name="forest"):
         try:
             self.model_registry=model_registry
             os.makedirs(self.model_registry , exist_ok=True)
-            self.transformer_dir_name=transformer_dir_name
+            self.preprocessor_dir_name=preprocessor_dir_name
             self.model_dir_name=model_dir_name
-            self.encoder_dir_name=encoder_dir_name
+            self.forest_dir_name=forest_dir_name
         except Exception as e:
             raise SrcException(e,sys)  
         
@@ -46,23 +51,23 @@ class ModelResolver:
         except Exception as e:
             raise e
         
-    def get_latest_transformer_path(self):
+    def get_latest_forest_dir_path(self):
         try:
             latest_dir=self.get_latest_dir_path()
             if latest_dir is None:
-                raise Exception(f"Transformer is not Available")
-            return os.path.join(latest_dir,self.transformer_dir_name,transformer_object_file_name)
+                raise Exception(f"Forest is not Available")
+            return os.path.join(latest_dir,self.forest_dir_name)
         except Exception as e:
             raise e
-        
-    def get_latest_encoder_path(self):
+
+    def get_latest_preprocessor_path(self):
         try:
             latest_dir=self.get_latest_dir_path()
             if latest_dir is None:
-                raise Exception(f"Transformer is not Available")
-            return os.path.join(latest_dir,self.encoder_dir_name , encoder_object_file_name)
+                raise Exception(f"Preprocessor is not Available")
+            return os.path.join(latest_dir,self.preprocessor_dir_name,preprocessor_object_file_name)
         except Exception as e:
-            raise e 
+            raise e
     
     def get_latest_save_dir_path(self)->str:
         try:
@@ -81,22 +86,118 @@ class ModelResolver:
         except Exception as e:
             raise e
 
-    def get_latest_save_transformer_path(self):
+    def get_latest_save_forest_dir_path(self):
         try:
             latest_dir = self.get_latest_save_dir_path()
-            return os.path.join(latest_dir,self.transformer_dir_name,transformer_object_file_name)
+            return os.path.join(latest_dir,self.forest_dir_name)
         except Exception as e:
             raise e
 
-    def get_latest_save_encoder_path(self):
+    def get_latest_save_preprocessor_path(self):
         try:
             latest_dir = self.get_latest_save_dir_path()
-            return os.path.join(latest_dir,self.encoder_dir_name,encoder_object_file_name)
+            return os.path.join(latest_dir,self.preprocessor_dir_name,preprocessor_object_file_name)
         except Exception as e:
             raise e
 
+@dataclass
+class ModelBundle:
+    version:int
+    model:object
+    preprocessor:object
+
+
 class Predictor:
 
-    def __init__(self,model_resolver:ModelResolver):
+    """
+    =====================================================================================
+    In process cache of the latest (model , preprocessor) bundle of the model registry
+
+    The bundle is deserialized once per registry version. A cheap stat of the registry
+    directory (at most once every poll_interval seconds) detects a new saved_models/<n>
+    directory , the new bundle is loaded aside and swapped in atomically , callers keep
+    using the previous version until the new one has loaded completely.
+
+    mapped_forest :bool = serve the forest arrays of saved_models/<n>/forest through
+                          FlatForest with memory mapping instead of unpickling model.pkl ,
+                          so every process shares the same pages of the OS page cache.
+                          Versions without a forest directory fall back to model.pkl
+    =====================================================================================
+    """
+
+    def __init__(self,model_resolver:ModelResolver , poll_interval:float=5.0 , mapped_forest:bool=True):
         self.model_resolver=model_resolver
-      
\ No newline at end of file
+        self.poll_interval=poll_interval
+        self.mapped_forest=mapped_forest
+        self._bundle:Optional[ModelBundle]=None
+        self._registry_mtime=None
+        self._last_poll=0.0
+        self._lock=threading.Lock()
+
+    def refresh(self , force:bool=False)->Optional[ModelBundle]:
+        try:
+            with self._lock:
+                self._last_poll=time.monotonic()
+                registry_mtime=os.stat(self.model_resolver.model_registry).st_mtime_ns
+                if not force and self._bundle is not None and registry_mtime==self._registry_mtime:
+                    return self._bundle
+
+                latest_dir=self.model_resolver.get_latest_dir_path()
+                if latest_dir is None:
+                    raise Exception(f"Model is not Available")
+                version=int(os.path.basename(latest_dir))
+                if self._bundle is not None and self._bundle.version==version:
+                    self._registry_mtime=registry_mtime
+                    return self._bundle
+
+                try:
+                    logging.info(f"Loading model bundle version {version} from {latest_dir}")
+                    bundle=ModelBundle(version=version ,
+                                       model=self._load_model() ,
+                                       preprocessor=load_object(file_path=self.model_resolver.get_latest_preprocessor_path()))
+                except Exception as e:
+                    #version still being written or synced , keep serving the current one and retry on next poll
+                    if self._bundle is None:
+                        raise e
+                    logging.warning(f"Could not load model bundle version {version} , keeping version {self._bundle.version}: {e}")
+                    return self._bundle
+
+                self._bundle=bundle
+                self._registry_mtime=registry_mtime
+                return self._bundle
+        except Exception as e:
+            raise SrcException(e,sys)
+
+    def _load_model(self):
+        forest_dir=self.model_resolver.get_latest_forest_dir_path()
+        #forest.json is written last by export_forest , its presence means the arrays are complete
+        if self.mapped_forest and os.path.exists(os.path.join(forest_dir , forest_meta_file_name)):
+            return FlatForest.load(forest_dir=forest_dir , mmap_mode="r")
+        return load_object(file_path=self.model_resolver.get_latest_model_path())
+
+    def get_bundle(self)->ModelBundle:
+        if self._bundle is None or time.monotonic()-self._last_poll>=self.poll_interval:
+            return self.refresh()
+        return self._bundle
+
+    def predict(self , df)->np.ndarray:
+        return self.predict_with_version(df)[1]
+
+    def predict_with_version(self , df)->Tuple[int , np.ndarray]:
+        #version of the bundle that made the predictions , a hot reload in between can not mix them up
+        bundle=self.get_bundle()
+        return bundle.version , bundle.model.predict(bundle.preprocessor.transform(df))
+
+
+_predictors:Dict[tuple , Predictor]=dict()
+_predictors_lock=threading.Lock()
+
+def get_predictor(model_registry:str="saved_models" , mapped_forest:bool=True)->Predictor:
+    """
+    Process wide Predictor for a model registry , so every caller shares one cached bundle
+    """
+    with _predictors_lock:
+        key=(model_registry , mapped_forest)
+        if key not in _predictors:
+            _predictors[key]=Predictor(model_resolver=ModelResolver(model_registry=model_registry) , mapped_forest=mapped_forest)
+        return _predictors[key]
@@ -0,0 +1,197 @@
+from src.exception import SrcException
+from src.logger import logging
+from scipy import sparse
+from typing import Dict , List , Mapping
+import pandas as pd
+import numpy as np
+import sys
+
+
+class CuisineTokenizer:
+
+    """
+    =====================================================================================
+    Multi label tokenizer for comma joined columns like cuisines ("North Indian, Mughlai, Chinese")
+
+    Every value is split into individual tokens and encoded as a sparse multi hot block ,
+    one column per token instead of one column per unique combination.
+    Tokens not seen while fitting are ignored so unseen combinations still encode
+    the known cuisines.
+
+    separator :str = character used to join the tokens
+    min_frequency :int = tokens seen less than this many times while fitting are dropped
+    =====================================================================================
+    """
+
+    def __init__(self , separator:str="," , min_frequency:int=1):
+        self.separator=separator
+        self.min_frequency=min_frequency
+
+    def _tokenize(self , values:pd.Series)->pd.Series:
+        #one row per token , index points back to the source row position
+        tokens = pd.Series(np.asarray(values , dtype=object)).str.split(self.separator).explode()
+        tokens = tokens.str.strip()
+        return tokens[tokens.notna() & (tokens!="")]
+
+    def fit(self , df:pd.DataFrame):
+        try:
+            self.feature_names_in_ = np.asarray(df.columns , dtype=object)
+            self.vocabulary_:Dict[str , np.ndarray]=dict()
+            for column in self.feature_names_in_:
+                counts = self._tokenize(df[column]).value_counts()
+                self.vocabulary_[column] = np.sort(counts[counts>=self.min_frequency].index.to_numpy(dtype=object))
+                logging.info(f"Tokenizer vocabulary for {column} : {len(self.vocabulary_[column])} tokens")
+            return self
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def transform(self , df:pd.DataFrame)->sparse.csr_matrix:
+        try:
+            blocks=[]
+            for column in self.feature_names_in_:
+                vocabulary = self.vocabulary_[column]
+                values = np.asarray(df[column] , dtype=object)
+                tokens = self._tokenize(values)
+                token_index = pd.Index(vocabulary).get_indexer(tokens.to_numpy())
+                known = token_index>=0
+                rows = tokens.index.to_numpy()[known]
+                block = sparse.csr_matrix((np.ones(known.sum() , dtype=np.float64) , (rows , token_index[known])) ,
+                                          shape=(len(values) , len(vocabulary)))
+                #repeated token inside a single value still counts once
+                block.sum_duplicates()
+                block.data[:]=1.0
+                blocks.append(block)
+            return sparse.hstack(blocks , format="csr")
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def fit_transform(self , df:pd.DataFrame)->sparse.csr_matrix:
+        return self.fit(df).transform(df)
+
+    def get_feature_names_out(self , input_features=None)->np.ndarray:
+        return np.asarray([f"{column}_{token}" for column in self.feature_names_in_ for token in self.vocabulary_[column]] , dtype=object)
+
+
+class RestaurantPreprocessor:
+
+    """
+    =====================================================================================
+    Single fitted preprocessing object that turns raw restaurant rows into the model feature matrix
+
+    Output layout (sparse csr , float64):
+        [ordinal features (label codes) , numerical features , one hot nominal features , multi hot tokens]
+
+    transform accepts a pandas DataFrame or any mapping of column name -> sequence
+    (for example {"votes":[100] , ...}) and works on numpy arrays only ,
+    so training , evaluation , batch prediction and the app all share the exact same encoding.
+    =====================================================================================
+    """
+
+    def __init__(self , ordinal_features:List[str] , nominal_features:List[str] ,
+                 multi_label_features:List[str] , numerical_features:List[str] ,
+                 tokenizer_min_frequency:int=1):
+        self.ordinal_features=list(ordinal_features)
+        self.nominal_features=list(nominal_features)
+        self.multi_label_features=list(multi_label_features)
+        self.numerical_features=list(numerical_features)
+        self.tokenizer_min_frequency=tokenizer_min_frequency
+
+    @staticmethod
+    def _categories(values:np.ndarray)->np.ndarray:
+        values = pd.unique(values)
+        return np.sort(values[pd.notna(values)].astype(object))
+
+    def fit(self , df:pd.DataFrame):
+        try:
+            #label encoder semantics , sorted classes mapped to 0..n-1
+            self.ordinal_classes_:Dict[str , np.ndarray]={col:self._categories(np.asarray(df[col] , dtype=object)) for col in self.ordinal_features}
+            #one hot encoder semantics , unknown categories encode as all zeros
+            self.nominal_categories_:Dict[str , np.ndarray]={col:self._categories(np.asarray(df[col] , dtype=object)) for col in self.nominal_features}
+            self.tokenizer_=CuisineTokenizer(min_frequency=self.tokenizer_min_frequency)
+            if len(self.multi_label_features)>0:
+                self.tokenizer_.fit(df[self.multi_label_features])
+            self._index_lookup={col:pd.Index(categories) for col , categories in {**self.ordinal_classes_ , **self.nominal_categories_}.items()}
+            logging.info(f"Preprocessor fitted with {len(self.get_feature_names_out())} output features")
+            return self
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def transform(self , df:Mapping)->sparse.csr_matrix:
+        try:
+            dense_columns=[]
+            for col in self.ordinal_features:
+                values = np.asarray(df[col] , dtype=object)
+                codes = self._index_lookup[col].get_indexer(values)
+                if (codes<0).any():
+                    raise ValueError(f"{col} contains previously unseen labels: {list(pd.unique(values[codes<0]))}")
+                dense_columns.append(codes.astype(np.float64))
+            for col in self.numerical_features:
+                dense_columns.append(pd.to_numeric(np.asarray(df[col] , dtype=object) , errors="coerce").astype(np.float64))
+            n_rows = len(dense_columns[0]) if dense_columns else len(np.asarray(df[self.nominal_features[0]]))
+            blocks=[sparse.csr_matrix(np.column_stack(dense_columns)) if dense_columns else sparse.csr_matrix((n_rows , 0))]
+
+            for col in self.nominal_features:
+                codes = self._index_lookup[col].get_indexer(np.asarray(df[col] , dtype=object))
+                known = codes>=0
+                blocks.append(sparse.csr_matrix((np.ones(known.sum() , dtype=np.float64) , (np.flatnonzero(known) , codes[known])) ,
+                                                shape=(n_rows , len(self.nominal_categories_[col]))))
+
+            if len(self.multi_label_features)>0:
+                blocks.append(self.tokenizer_.transform(df))
+            return sparse.hstack(blocks , format="csr")
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def fit_transform(self , df:pd.DataFrame)->sparse.csr_matrix:
+        return self.fit(df).transform(df)
+
+    def feature_blocks(self)->Dict[str , object]:
+        """
+        Where every input feature lands in the transform output:
+        {"ordinal":{col:index} , "numerical":{col:index} , "nominal":{col:(start , stop)} ,
+         "multi_label":(start , stop) , "multi_label_features":[col] ,
+         "n_categories":{col:categories} for ordinal and nominal features}
+        """
+        dense_features=self.ordinal_features+self.numerical_features
+        blocks={"ordinal":{col:dense_features.index(col) for col in self.ordinal_features} ,
+                "numerical":{col:dense_features.index(col) for col in self.numerical_features} ,
+                "nominal":dict() ,
+                "n_categories":{col:len(classes) for col , classes in {**self.ordinal_classes_ , **self.nominal_categories_}.items()}}
+        start=len(dense_features)
+        for col in self.nominal_features:
+            blocks["nominal"][col]=(start , start+len(self.nominal_categories_[col]))
+            start=blocks["nominal"][col][1]
+        blocks["multi_label"]=(start , len(self.get_feature_names_out()))
+        blocks["multi_label_features"]=list(self.multi_label_features)
+        return blocks
+
+    def unseen_labels(self , df:Mapping)->Dict[str , list]:
+        #ordinal labels transform would reject , {} when it will succeed , only the ordinal lookups run
+        unseen=dict()
+        for col in self.ordinal_features:
+            values = np.asarray(df[col] , dtype=object)
+            codes = self._index_lookup[col].get_indexer(values)
+            if (codes<0).any():
+                unseen[col]=list(pd.unique(values[codes<0]))
+        return unseen
+
+    def can_transform(self , df:pd.DataFrame)->bool:
+        #ordinal features have no unknown code (NaN included) , any other unseen value encodes as zeros
+        return not self.unseen_labels(df)
+
+    def has_same_layout(self , other:"RestaurantPreprocessor")->bool:
+        """
+        True when other encodes rows into the same columns with the same label codes ,
+        so a model fitted on one output can keep scoring the other
+        """
+        if list(self.get_feature_names_out())!=list(other.get_feature_names_out()):
+            return False
+        return all(list(self.ordinal_classes_[col])==list(other.ordinal_classes_.get(col , [])) for col in self.ordinal_features)
+
+    def get_feature_names_out(self , input_features=None)->np.ndarray:
+        names = self.ordinal_features + self.numerical_features
+        for col in self.nominal_features:
+            names += [f"{col}_{category}" for category in self.nominal_categories_[col]]
+        if len(self.multi_label_features)>0:
+            names += list(self.tokenizer_.get_feature_names_out())
+        return np.asarray(names , dtype=object)
@@ -0,0 +1,357 @@
+from src.exception import SrcException
+from src.logger import logging
+from src import utils
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict , Optional
+import multiprocessing
+import pandas as pd
+import numpy as np
+import os , sys
+
+
+def hash_values(values:np.ndarray)->np.ndarray:
+    #64 bit hash of every value , strings and numbers alike
+    return pd.util.hash_array(np.asarray(values , dtype=object)).astype(np.uint64)
+
+
+class PrioritySample:
+
+    """
+    Uniform sample of sample_size values from a stream in a single pass
+    Every value gets a uniform random priority and the sample_size smallest priorities are kept ,
+    so memory stays O(sample_size) and two samples merge by priority as well
+    """
+
+    def __init__(self , sample_size:int , seed:Optional[int]=None):
+        self.sample_size=sample_size
+        self.rng=np.random.default_rng(seed)
+        self.values=np.empty(0)
+        self.priorities=np.empty(0)
+
+    def _keep(self , values:np.ndarray , priorities:np.ndarray)->"PrioritySample":
+        if len(self.values)>0:
+            values , priorities=np.concatenate([self.values , values]) , np.concatenate([self.priorities , priorities])
+        if len(values)>self.sample_size:
+            keep=np.argpartition(priorities , self.sample_size-1)[:self.sample_size]
+            values , priorities=values[keep] , priorities[keep]
+        self.values , self.priorities=values , priorities
+        return self
+
+    def update(self , values:np.ndarray)->"PrioritySample":
+        values=np.asarray(values)
+        return self._keep(values , self.rng.random(len(values)))
+
+    def merge(self , other:"PrioritySample")->"PrioritySample":
+        return self._keep(other.values , other.priorities)
+
+
+class KLLSketch:
+
+    """
+    =====================================================================================
+    KLL quantile sketch of a numerical stream
+
+    Items live in levels , an item of level h stands for 2**h values. A full level is
+    sorted and every other item (random offset) is promoted to the level above , the
+    top level keeps k items and every lower level two thirds of the one above it.
+    Two sketches merge by concatenating their levels and compacting again.
+
+    k :int = size of the top level , rank error shrinks roughly as 1/k
+    =====================================================================================
+    """
+
+    def __init__(self , k:int=1024 , seed:Optional[int]=None):
+        self.k=k
+        self.count=0
+        self.levels=[np.empty(0)]
+        self.rng=np.random.default_rng(seed)
+
+    def _capacity(self , level:int)->int:
+        depth=len(self.levels)-level-1
+        return max(int(np.ceil(self.k*(2/3)**depth)) , 2)
+
+    def _compress(self)->None:
+        while True:
+            full=[level for level in range(len(self.levels)) if len(self.levels[level])>self._capacity(level)]
+            if len(full)==0:
+                return
+            level=full[0]
+            if level+1==len(self.levels):
+                self.levels.append(np.empty(0))
+            items=np.sort(self.levels[level])
+            #an odd item out stays on its level so the total weight is unchanged
+            leftover , items=(items[-1:] , items[:-1]) if len(items)%2==1 else (items[:0] , items)
+            self.levels[level]=leftover
+            self.levels[level+1]=np.concatenate([self.levels[level+1] , items[self.rng.integers(2)::2]])
+
+    def update(self , values:np.ndarray)->"KLLSketch":
+        values=np.asarray(values , dtype=np.float64)
+        values=values[~np.isnan(values)]
+        self.count+=len(values)
+        self.levels[0]=np.concatenate([self.levels[0] , values])
+        self._compress()
+        return self
+
+    def merge(self , other:"KLLSketch")->"KLLSketch":
+        if other.k!=self.k:
+            raise ValueError(f"Cannot merge KLL sketches with k {self.k} and {other.k}")
+        while len(self.levels)<len(other.levels):
+            self.levels.append(np.empty(0))
+        for level , items in enumerate(other.levels):
+            self.levels[level]=np.concatenate([self.levels[level] , items])
+        self.count+=other.count
+        self._compress()
+        return self
+
+    def _weighted_items(self):
+        items=np.concatenate(self.levels)
+        weights=np.concatenate([np.full(len(level_items) , 2.0**level) for level , level_items in enumerate(self.levels)])
+        order=np.argsort(items , kind="stable")
+        return items[order] , np.cumsum(weights[order])
+
+    def items(self)->np.ndarray:
+        return np.sort(np.concatenate(self.levels))
+
+    def cdf(self , points:np.ndarray)->np.ndarray:
+        """share of values <= every point"""
+        items , cumulative=self._weighted_items()
+        if len(items)==0:
+            return np.zeros(len(points))
+        position=np.searchsorted(items , points , side="right")-1
+        return np.where(position>=0 , cumulative[np.maximum(position , 0)] , 0.0)/cumulative[-1]
+
+    def quantiles(self , probabilities:np.ndarray)->np.ndarray:
+        items , cumulative=self._weighted_items()
+        if len(items)==0:
+            return np.full(len(probabilities) , np.nan)
+        position=np.searchsorted(cumulative/cumulative[-1] , probabilities , side="left")
+        return items[np.minimum(position , len(items)-1)]
+
+
+class HeavyHitters:
+
+    """
+    =====================================================================================
+    Misra Gries frequent items summary
+
+    Keeps at most capacity counters , each count is underestimated by at most
+    decremented (<= total/(capacity+1)). With no more distinct values than capacity
+    the counts are exact. Two summaries merge by adding counters and cutting back.
+
+    capacity :int = number of counters kept
+    =====================================================================================
+    """
+
+    def __init__(self , capacity:int=4096):
+        self.capacity=capacity
+        self.counts=pd.Series(dtype=np.int64)
+        self.total=0
+        self.decremented=0
+
+    @property
+    def exact(self)->bool:
+        return self.decremented==0
+
+    def _add(self , counts:pd.Series , total:int , decremented:int)->"HeavyHitters":
+        counts=self.counts.add(counts , fill_value=0).astype(np.int64)
+        self.total+=total
+        self.decremented+=decremented
+        if len(counts)>self.capacity:
+            cut=int(counts.nlargest(self.capacity+1).iloc[-1])
+            counts=counts[counts>cut]-cut
+            self.decremented+=cut
+        self.counts=counts
+        return self
+
+    def update_counts(self , counts:pd.Series)->"HeavyHitters":
+        #counts = value -> occurrences of one chunk (value_counts)
+        return self._add(counts , int(counts.sum()) , 0)
+
+    def merge(self , other:"HeavyHitters")->"HeavyHitters":
+        return self._add(other.counts , other.total , other.decremented)
+
+    def top(self , n:int)->Dict[str , int]:
+        return {str(value):int(count) for value , count in self.counts.nlargest(n).items()}
+
+
+class HyperLogLog:
+
+    """
+    =====================================================================================
+    HyperLogLog distinct count estimate
+
+    2**precision registers keep the longest run of leading zeros seen among the hashes
+    routed to them , two sketches merge by taking the register wise maximum.
+    Relative error is about 1.04/sqrt(2**precision).
+
+    precision :int = number of hash bits choosing the register
+    =====================================================================================
+    """
+
+    def __init__(self , precision:int=12):
+        self.precision=precision
+        self.registers=np.zeros(2**precision , dtype=np.uint8)
+
+    def update_hashes(self , hashes:np.ndarray)->"HyperLogLog":
+        if len(hashes)==0:
+            return self
+        bits=64-self.precision
+        index=(hashes>>np.uint64(bits)).astype(np.int64)
+        rest=hashes&np.uint64((1<<bits)-1)
+        #rank = leading zeros of the remaining bits + 1 , frexp gives floor(log2)+1 exactly below 2**53
+        _ , exponent=np.frexp(rest.astype(np.float64))
+        rank=np.where(rest>0 , bits-exponent+1 , bits+1).astype(np.uint8)
+        np.maximum.at(self.registers , index , rank)
+        return self
+
+    def merge(self , other:"HyperLogLog")->"HyperLogLog":
+        if other.precision!=self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches with precision {self.precision} and {other.precision}")
+        np.maximum(self.registers , other.registers , out=self.registers)
+        return self
+
+    def estimate(self)->float:
+        m=len(self.registers)
+        alpha=0.7213/(1+1.079/m)
+        estimate=alpha*m*m/np.sum(2.0**-self.registers.astype(np.float64))
+        zeros=int(np.count_nonzero(self.registers==0))
+        if estimate<=2.5*m and zeros>0:
+            #small range correction (linear counting)
+            estimate=m*np.log(m/zeros)
+        return float(estimate)
+
+
+class ColumnSketch:
+
+    """
+    Null count , distinct count and value frequencies of a column ,
+    numerical columns also keep a KLL quantile sketch and categorical columns a uniform sample
+    (heavy hitter counts are biased once counters were cut , the sample is not)
+    """
+
+    def __init__(self , kind:str , quantile_k:int=1024 , heavy_hitters:int=4096 , hll_precision:int=12 ,
+                 sample_size:int=20_000 , seed:Optional[int]=None):
+        self.kind=kind
+        self.rows=0
+        self.nulls=0
+        self.frequencies=HeavyHitters(capacity=heavy_hitters)
+        self.distinct=HyperLogLog(precision=hll_precision)
+        self.quantiles=KLLSketch(k=quantile_k , seed=seed) if kind=="numerical" else None
+        self.sample=PrioritySample(sample_size=sample_size , seed=seed) if kind=="categorical" else None
+
+    def update(self , series:pd.Series)->"ColumnSketch":
+        self.rows+=len(series)
+        values=series.dropna()
+        self.nulls+=len(series)-len(values)
+        if self.kind=="numerical":
+            values=values.astype(np.float64)
+            self.quantiles.update(values.to_numpy())
+            counts=values.value_counts()
+        else:
+            self.sample.update(values.to_numpy(dtype=object))
+            counts=values.value_counts()
+            counts=counts[counts>0]
+            counts.index=counts.index.astype(str)
+        self.frequencies.update_counts(counts)
+        #registers only keep a maximum , hashing every distinct value of the chunk once is enough
+        self.distinct.update_hashes(hash_values(counts.index.to_numpy()))
+        return self
+
+    def merge(self , other:"ColumnSketch")->"ColumnSketch":
+        self.rows+=other.rows
+        self.nulls+=other.nulls
+        self.frequencies.merge(other.frequencies)
+        self.distinct.merge(other.distinct)
+        if self.quantiles is not None:
+            self.quantiles.merge(other.quantiles)
+        if self.sample is not None:
+            self.sample.merge(other.sample)
+        return self
+
+    def report(self , top:int=10)->dict:
+        report={"kind":self.kind ,
+                "rows":self.rows ,
+                "null_rate":self.nulls/self.rows if self.rows else 0.0 ,
+                "distinct_estimate":round(self.distinct.estimate()) ,
+                "frequent_values":self.frequencies.top(top) ,
+                "frequencies_exact":self.frequencies.exact}
+        if self.quantiles is not None:
+            probabilities=[0.0 , 0.01 , 0.25 , 0.5 , 0.75 , 0.99 , 1.0]
+            report["quantiles"]={f"p{round(p*100)}":float(q) for p , q in zip(probabilities , self.quantiles.quantiles(np.array(probabilities)))}
+        return report
+
+
+class DataSketch:
+
+    """
+    =====================================================================================
+    One pass profile of a dataset made of mergeable column sketches
+
+    update() takes one chunk at a time , sketches of chunks or workers merge() into the
+    sketch of the whole dataset , memory does not grow with the number of rows.
+
+    quantile_k , heavy_hitters , hll_precision , sample_size = sizes of the column sketches
+    =====================================================================================
+    """
+
+    def __init__(self , quantile_k:int=1024 , heavy_hitters:int=4096 , hll_precision:int=12 , sample_size:int=20_000 ,
+                 seed:Optional[int]=None):
+        self.sketch_args={"quantile_k":quantile_k , "heavy_hitters":heavy_hitters , "hll_precision":hll_precision ,
+                          "sample_size":sample_size , "seed":seed}
+        self.columns:Dict[str , ColumnSketch]=dict()
+
+    def update(self , df:pd.DataFrame)->"DataSketch":
+        for column in df.columns:
+            if column not in self.columns:
+                kind="numerical" if pd.api.types.is_numeric_dtype(df[column]) else "categorical"
+                self.columns[column]=ColumnSketch(kind=kind , **self.sketch_args)
+            self.columns[column].update(df[column])
+        return self
+
+    def merge(self , other:"DataSketch")->"DataSketch":
+        for column , column_sketch in other.columns.items():
+            if column in self.columns:
+                self.columns[column].merge(column_sketch)
+            else:
+                self.columns[column]=column_sketch
+        return self
+
+    def null_rates(self)->pd.Series:
+        return pd.Series({column:sketch.nulls/sketch.rows if sketch.rows else 0.0 for column , sketch in self.columns.items()} , dtype=np.float64)
+
+    def report(self)->Dict[str , dict]:
+        return {column:sketch.report() for column , sketch in self.columns.items()}
+
+
+def _sketch_row_groups(file_path:str , row_groups:list , chunk_size:int , sketch_args:dict)->DataSketch:
+    data_sketch=DataSketch(**sketch_args)
+    for chunk in utils.iter_dataframe_chunks(file_path=file_path , chunk_size=chunk_size , row_groups=row_groups , categorical=True):
+        data_sketch.update(chunk)
+    return data_sketch
+
+
+def sketch_parquet_file(file_path:str , chunk_size:int=100_000 , n_jobs:Optional[int]=None , **sketch_args)->DataSketch:
+    """
+    Profiles a parquet file in one pass of chunk_size rows ,
+    row groups are shared out to n_jobs workers whose sketches are merged ,
+    worker i sketches with seed+i so the merged samples come from independent random streams
+    """
+    try:
+        row_groups=list(range(utils.parquet_row_group_count(file_path)))
+        n_jobs=min(n_jobs or utils.available_cpus() , max(len(row_groups) , 1))
+        logging.info(f"Sketching {file_path} , {len(row_groups)} row groups on {n_jobs} workers")
+        if n_jobs==1:
+            return _sketch_row_groups(file_path , row_groups , chunk_size , sketch_args)
+        seed=sketch_args.get("seed")
+        def worker_sketch_args(worker:int)->dict:
+            return {**sketch_args , "seed":None if seed is None else seed+worker}
+        start_method="fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        with ProcessPoolExecutor(max_workers=n_jobs , mp_context=multiprocessing.get_context(start_method)) as executor:
+            sketches=list(executor.map(_sketch_row_groups , [file_path]*n_jobs , [row_groups[worker::n_jobs] for worker in range(n_jobs)] ,
+                                       [chunk_size]*n_jobs , [worker_sketch_args(worker) for worker in range(n_jobs)]))
+        data_sketch=sketches[0]
+        for other in sketches[1:]:
+            data_sketch.merge(other)
+        return data_sketch
+    except Exception as e:
+        raise SrcException(e , sys)
@@ -0,0 +1,225 @@
+from src.exception import SrcException
+from src.logger import logging
+from src.utils import available_cpus
+from concurrent.futures import ProcessPoolExecutor , wait , FIRST_COMPLETED
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import KFold , ParameterSampler
+from sklearn.metrics import r2_score
+from scipy import sparse
+from typing import Dict , List , Optional
+import multiprocessing
+import numpy as np
+import hashlib
+import json
+import math
+import time
+import os , sys
+
+#training data of the pool workers , set once per worker by _set_tuning_data
+_TUNING_DATA=dict()
+
+
+def _set_tuning_data(X , y , permutation , cv:int , seed:int)->None:
+    _TUNING_DATA.update(X=X , y=y , permutation=permutation , cv=cv , seed=seed)
+
+
+def _fit_fold(params:dict , n_estimators:int , rows:int , fold:int)->dict:
+    #one cross validation fold of one configuration on the first rows of the shuffled train data
+    start_time=time.perf_counter()
+    X , y=_TUNING_DATA["X"] , _TUNING_DATA["y"]
+    subset=_TUNING_DATA["permutation"][:rows]
+    train_index , valid_index=list(KFold(n_splits=_TUNING_DATA["cv"] , shuffle=True , random_state=_TUNING_DATA["seed"]).split(subset))[fold]
+    model=RandomForestRegressor(n_estimators=n_estimators , random_state=_TUNING_DATA["seed"] , n_jobs=1 , **params)
+    model.fit(X[subset[train_index]] , y[subset[train_index]])
+    score=r2_score(y[subset[valid_index]] , model.predict(X[subset[valid_index]]))
+    return {"r2":float(score) , "seconds":round(time.perf_counter()-start_time , 3)}
+
+
+def data_fingerprint(X , y)->str:
+    digest=hashlib.sha256()
+    arrays=[X.data , X.indices , X.indptr] if sparse.issparse(X) else [np.asarray(X)]
+    for array in arrays+[np.asarray(y)]:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+class SuccessiveHalvingTuner:
+
+    """
+    =====================================================================================
+    Budgeted successive halving search of RandomForestRegressor hyperparameters
+
+    n_candidates configurations are sampled from param_distributions. Rung i fits every
+    surviving configuration with cv folds on a row subsample with fewer trees , keeps the
+    best 1/eta of them by mean r2 and multiplies rows and trees by eta , the last rung uses
+    every row and max_trees. Folds of a rung run on a process pool.
+
+    Every fold score is appended to cache_file_path keyed by data , configuration , trees ,
+    rows and fold , a rerun (or a run stopped by the budget) resumes from it. When
+    budget_seconds runs out no new fold starts (folds already fitting finish and are cached) ,
+    the best configuration of the highest completed rung wins.
+
+    param_distributions :dict = RandomForestRegressor parameters except n_estimators
+    n_candidates :int = configurations in the first rung
+    eta :int = halving rate of configurations and growth rate of rows and trees
+    max_trees :int = trees of the last rung (and of the tuned model)
+    cv :int = cross validation folds per configuration
+    budget_seconds :float = wall clock limit of the search
+    cache_file_path :str = json lines file of fold scores
+    n_jobs :int = worker processes , 1 fits every fold inline
+    =====================================================================================
+    """
+
+    def __init__(self , param_distributions:dict , n_candidates:int=27 , eta:int=3 , max_trees:int=200 , min_trees:int=5 ,
+                 cv:int=3 , budget_seconds:float=3600 , cache_file_path:Optional[str]=None , n_jobs:Optional[int]=None , seed:int=42):
+        try:
+            self.param_distributions=param_distributions
+            self.n_candidates=n_candidates
+            self.eta=eta
+            self.max_trees=max_trees
+            self.min_trees=min_trees
+            self.cv=cv
+            self.budget_seconds=budget_seconds
+            self.cache_file_path=cache_file_path
+            self.n_jobs=n_jobs or available_cpus()
+            self.seed=seed
+            self.report=dict()
+        except Exception as e:
+            raise SrcException(e , sys)
+
+    def candidates(self)->List[dict]:
+        sampled=ParameterSampler(self.param_distributions , n_iter=self.n_candidates , random_state=self.seed)
+        unique={json.dumps(params , sort_keys=True , default=str):params for params in sampled}
+        return list(unique.values())
+
+    def schedule(self , n_rows:int , n_candidates:int)->List[dict]:
+        #rows and trees of every rung , the last rung uses every row and max_trees
+        n_rungs=int(math.floor(math.log(max(n_candidates , 1) , self.eta)+1e-9))+1
+        rungs=[]
+        for rung in range(n_rungs):
+            share=self.eta**(rung-n_rungs+1)
+            rungs.append({"rows":max(int(n_rows*share) , 2*self.cv) ,
+                          "n_estimators":max(int(round(self.max_trees*share)) , self.min_trees) ,
+                          "keep":max(int(math.ceil(n_candidates/self.eta**(rung+1))) , 1)})
+        return rungs
+
+    def _load_cache(self)->Dict[str , dict]:
+        cache=dict()
+        if self.cache_file_path and os.path.exists(self.cache_file_path):
+            with open(self.cache_file_path) as file_obj:
+                for line in file_obj:
+                    try:
+                        entry=json.loads(line)
+                        cache[entry["key"]]=entry
+                    except ValueError:
+                        continue #half written line of an interrupted run
+        return cache
+
+    def _append_cache(self , entry:dict)->None:
+        if self.cache_file_path:
+            os.makedirs(os.path.dirname(self.cache_file_path) , exist_ok=True)
+            with open(self.cache_file_path , "a") as file_obj:
+                file_obj.write(json.dumps(entry , default=str)+"\n")
+
+    @staticmethod
+    def _fold_key(data_hash:str , params:dict , n_estimators:int , rows:int , fold:int , cv:int , seed:int)->str:
+        payload=json.dumps({"data":data_hash , "params":params , "n_estimators":n_estimators , "rows":rows ,
+                            "fold":fold , "cv":cv , "seed":seed} , sort_keys=True , default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def search(self , X , y)->dict:
+        """
+        return: best configuration {"params":dict , "n_estimators":int , "r2":float} , details in self.report
+                None when the budget ended before the first rung completed
+        """
+        try:
+            start_time=time.perf_counter()
+            y=np.asarray(y).ravel()
+            data_hash=data_fingerprint(X , y)
+            permutation=np.random.default_rng(self.seed).permutation(X.shape[0])
+            cache=self._load_cache()
+            candidates=self.candidates()
+            rungs=self.schedule(X.shape[0] , len(candidates))
+            evaluations , completed_rungs , out_of_budget=[] , [] , False
+            logging.info(f"Successive halving: {len(candidates)} candidates , rungs {rungs} , budget {self.budget_seconds}s")
+
+            start_method="fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+            executor=None
+            if self.n_jobs>1:
+                executor=ProcessPoolExecutor(max_workers=self.n_jobs , mp_context=multiprocessing.get_context(start_method) ,
+                                             initializer=_set_tuning_data , initargs=(X , y , permutation , self.cv , self.seed))
+            else:
+                _set_tuning_data(X , y , permutation , self.cv , self.seed)
+            try:
+                for rung_number , rung in enumerate(rungs):
+                    scores={index:dict() for index in range(len(candidates))}
+                    tasks=[]
+                    for index , params in enumerate(candidates):
+                        for fold in range(self.cv):
+                            key=self._fold_key(data_hash , params , rung["n_estimators"] , rung["rows"] , fold , self.cv , self.seed)
+                            if key in cache:
+                                scores[index][fold]=cache[key]["r2"]
+                            else:
+                                tasks.append((index , fold , key))
+                    logging.info(f"Rung {rung_number}: {len(candidates)} candidates , {rung['rows']} rows , {rung['n_estimators']} trees , "
+                                 f"{len(tasks)} folds to fit , {len(candidates)*self.cv-len(tasks)} from cache")
+
+                    def record(index , fold , key , outcome):
+                        scores[index][fold]=outcome["r2"]
+                        entry={"key":key , "params":candidates[index] , "n_estimators":rung["n_estimators"] , "rows":rung["rows"] ,
+                               "fold":fold , **outcome}
+                        cache[key]=entry
+                        self._append_cache(entry)
+                        logging.info(f"Evaluated {candidates[index]} trees {rung['n_estimators']} rows {rung['rows']} fold {fold}: r2 {outcome['r2']:.4f} in {outcome['seconds']}s")
+
+                    #at most n_jobs folds in flight , the budget is checked before every fold starts
+                    pending , running=list(tasks) , dict()
+                    while pending or running:
+                        while pending and len(running)<self.n_jobs and not out_of_budget:
+                            if time.perf_counter()-start_time>self.budget_seconds:
+                                out_of_budget=True
+                                break
+                            index , fold , key=pending.pop(0)
+                            if executor is None:
+                                record(index , fold , key , _fit_fold(candidates[index] , rung["n_estimators"] , rung["rows"] , fold))
+                            else:
+                                running[executor.submit(_fit_fold , candidates[index] , rung["n_estimators"] , rung["rows"] , fold)]=(index , fold , key)
+                        if not running:
+                            break
+                        done , _=wait(running , return_when=FIRST_COMPLETED)
+                        for future in done:
+                            index , fold , key=running.pop(future)
+                            record(index , fold , key , future.result())
+
+                    rung_results=[{"rung":rung_number , "params":candidates[index] , "n_estimators":rung["n_estimators"] , "rows":rung["rows"] ,
+                                   "fold_r2":[fold_scores[fold] for fold in sorted(fold_scores)] ,
+                                   "mean_r2":float(np.mean(list(fold_scores.values()))) if len(fold_scores)==self.cv else None}
+                                  for index , fold_scores in scores.items()]
+                    evaluations.extend(rung_results)
+                    if all(result["mean_r2"] is not None for result in rung_results):
+                        completed_rungs.append(rung_results)
+                    if out_of_budget:
+                        logging.info(f"Tuning budget of {self.budget_seconds}s spent in rung {rung_number}")
+                        break
+                    ranked=sorted(range(len(candidates)) , key=lambda index:rung_results[index]["mean_r2"] , reverse=True)
+                    candidates=[candidates[index] for index in ranked[:rung["keep"]]]
+            finally:
+                if executor is not None:
+                    executor.shutdown(wait=True , cancel_futures=True)
+
+            self.report={"seconds":round(time.perf_counter()-start_time , 3) ,
+                         "out_of_budget":out_of_budget ,
+                         "rungs":rungs ,
+                         "completed_rungs":len(completed_rungs) ,
+                         "best":None ,
+                         "evaluations":evaluations}
+            if len(completed_rungs)==0:
+                logging.info(f"Tuning budget of {self.budget_seconds}s ended before the first rung completed")
+                return None
+            best=max(completed_rungs[-1] , key=lambda result:result["mean_r2"])
+            best_configuration={"params":best["params"] , "n_estimators":self.max_trees , "r2":best["mean_r2"]}
+            self.report["best"]={**best_configuration , "rung":best["rung"] , "rows":best["rows"] , "rung_n_estimators":best["n_estimators"]}
+            logging.info(f"Best configuration {best_configuration} after {self.report['seconds']}s")
+            return best_configuration
+        except Exception as e:
+            raise SrcException(e , sys)
@@ -1,13 +1,27 @@
 import pandas as pd
 import numpy as np 
+import pyarrow.parquet as pq
+from scipy import sparse
 from sklearn.preprocessing import LabelEncoder
-from src.config import mongo_client
+from src.config import mongo_client , feature_store_columns
+from typing import Dict
 from src.exception import SrcException
 import dill
 import yaml
+import hashlib
 from src.logger import logging
 import os,sys
 
+#cores one pipeline stage may use , set by DagExecutor in its workers so stages running side by side
+#do not each start a pool of every core
+CPU_BUDGET_ENV="PIPELINE_STAGE_CPU_BUDGET"
+
+
+def available_cpus()->int:
+    budget=os.environ.get(CPU_BUDGET_ENV)
+    return max(int(budget) , 1) if budget else (os.cpu_count() or 1)
+
+
 def get_collection_as_dataframe(database_name , collection_name):
     """
     ===================================================================
@@ -33,6 +47,169 @@ def get_collection_as_dataframe(database_name , collection_name):
         print(e,sys)
 
 
+def _fill_column_buffers(documents , columns:Dict[str , str] , n_rows:int)->Dict[str , np.ndarray]:
+    #one typed buffer per column , documents are read once and never kept
+    buffers={col:np.full(n_rows , np.nan) if dtype=="float64" else np.full(n_rows , None , dtype=object) for col , dtype in columns.items()}
+    float_columns=[col for col , dtype in columns.items() if dtype=="float64"]
+    object_columns=[col for col , dtype in columns.items() if dtype!="float64"]
+    for i , document in enumerate(documents):
+        for col in object_columns:
+            buffers[col][i]=document.get(col)
+        for col in float_columns:
+            value=document.get(col)
+            if value is not None:
+                try:
+                    buffers[col][i]=value
+                except (TypeError , ValueError):
+                    pass
+    return buffers
+
+
+def read_collection_columns(database_name , collection_name , columns:Dict[str , str]=feature_store_columns ,
+                            query:dict=None , sort_field:str=None , batch_size:int=10_000)->pd.DataFrame:
+    """
+    ===================================================================
+    Columnar MongoDB reader
+
+    Only the requested columns are projected on the server and the cursor is
+    consumed batch_size documents at a time , each batch goes straight into
+    typed numpy column buffers (float64 or object) instead of a list of dicts.
+
+    database_name :str = name of database inside MongoDB Atlas
+    collection_name :str = collection name inside MongoDB Atlas
+    columns :dict = column name -> "float64" or "object" , non numeric float values become NaN
+    query :dict = MongoDB filter
+    sort_field :str = ascending sort key pushed down to MongoDB
+
+    return dataframe with _id (ObjectId) and the requested columns
+    ====================================================================
+    """
+    try:
+        columns = {"_id":"object" , **columns}
+        projection = {col:1 for col in columns}
+        cursor = mongo_client[database_name][collection_name].find(query or {} , projection=projection , batch_size=batch_size)
+        if sort_field is not None:
+            cursor = cursor.sort(sort_field , 1)
+        chunks=[]
+        while True:
+            documents = [document for _ , document in zip(range(batch_size) , cursor)]
+            if len(documents)==0:
+                break
+            chunks.append(_fill_column_buffers(documents , columns , len(documents)))
+            if len(documents)<batch_size:
+                break
+        if len(chunks)==0:
+            return pd.DataFrame({col:pd.Series(dtype=dtype) for col , dtype in columns.items()})
+        return pd.DataFrame({col:np.concatenate([chunk[col] for chunk in chunks]) for col in columns})
+    except Exception as e:
+        raise SrcException(e , sys)
+
+
+def get_collection_delta_as_dataframe(database_name , collection_name , watermark_field:str="_id" , watermark=None):
+    """
+    ===================================================================
+    Export only the documents newer than a high water mark from MongoDB
+
+    database_name :str = name of database inside MongoDB Atlas
+    collection_name :str = collection name inside MongoDB Atlas
+    watermark_field :str = monotonically increasing field , "_id" (ObjectId , new documents)
+                           or a last modified timestamp (new and changed documents)
+    watermark = last value already ingested , None exports the whole collection
+
+    _id is kept (as string) so the caller can merge changed documents by key
+
+    return (delta dataframe , new watermark)
+    ====================================================================
+    """
+    try:
+        query = {} if watermark is None else {watermark_field:{"$gt":watermark}}
+        logging.info(f'collecting Data from Database {database_name} Collection {collection_name} where {query}')
+        columns = {**feature_store_columns , watermark_field:feature_store_columns.get(watermark_field , "object")}
+        df = read_collection_columns(database_name , collection_name , columns=columns , query=query , sort_field=watermark_field)
+        logging.info(f'Delta rows {df.shape[0]} columns {df.shape[1]}')
+        if df.shape[0]==0:
+            return df , watermark
+        new_watermark = max(df[watermark_field])
+        df["_id"] = df["_id"].astype(str)
+        return df , new_watermark
+    except Exception as e:
+        raise SrcException(e , sys)
+
+
+def read_yaml_file(file_path)->dict:
+    try:
+        with open(file_path) as file_reader:
+            return yaml.safe_load(file_reader)
+    except Exception as e:
+        raise SrcException(e, sys)
+
+
+def file_sha256(file_path:str)->str:
+    #content hash , read in 1 MB blocks
+    digest=hashlib.sha256()
+    with open(file_path , "rb") as file_obj:
+        for block in iter(lambda:file_obj.read(1<<20) , b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def save_dataframe(file_path:str , df:pd.DataFrame)->None:
+    """
+    Save dataframe as a typed parquet file
+    string columns are stored as dictionary encoded categoricals , numbers keep their dtype
+    _id stays a plain string column , every value is unique
+    """
+    try:
+        os.makedirs(os.path.dirname(file_path) or "." , exist_ok=True)
+        categorical_columns = [col for col in df.columns if df[col].dtype==object and col!="_id"]
+        df = df.astype({col:"category" for col in categorical_columns})
+        df.to_parquet(file_path , index=False , engine="pyarrow")
+    except Exception as e:
+        raise SrcException(e , sys)
+
+
+def load_dataframe(file_path:str , columns:list=None , categorical:bool=True)->pd.DataFrame:
+    """
+    Load a parquet file written by save_dataframe
+    columns :list = only these columns are read from disk , None reads every column
+    categorical :bool = keep string columns as pandas categoricals , False returns them as object
+    """
+    try:
+        df = pd.read_parquet(file_path , columns=columns , engine="pyarrow")
+        if not categorical:
+            df = df.astype({col:object for col in df.select_dtypes("category").columns})
+        return df
+    except Exception as e:
+        raise SrcException(e , sys)
+
+
+def iter_dataframe_chunks(file_path:str , chunk_size:int=100_000 , columns:list=None , row_groups:list=None , categorical:bool=False):
+    """
+    Yield a parquet file written by save_dataframe as DataFrames of at most chunk_size rows ,
+    only one chunk is in memory at a time
+    row_groups :list = only these row groups are read , None reads every row group
+    categorical :bool = keep string columns as pandas categoricals , False returns them as object
+    """
+    try:
+        parquet_file = pq.ParquetFile(file_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size , columns=columns , row_groups=row_groups):
+            df = batch.to_pandas()
+            if not categorical:
+                df = df.astype({col:object for col in df.select_dtypes("category").columns})
+            yield df
+    except Exception as e:
+        raise SrcException(e , sys)
+
+
+def parquet_row_count(file_path:str)->int:
+    #read from the file footer , no data pages are touched
+    return pq.ParquetFile(file_path).metadata.num_rows
+
+
+def parquet_row_group_count(file_path:str)->int:
+    return pq.ParquetFile(file_path).metadata.num_row_groups
+
+
 def write_yaml_file(file_path,data:dict):
     try:
         file_dir = os.path.dirname(file_path)
@@ -60,6 +237,11 @@ def convert_columns_float(df: pd.DataFrame, exclude_columns: list) -> pd.DataFra
         raise e
 
     
+def serialized_size_mb(obj:object)->float:
+    #size of the object as written by save_object
+    return len(dill.dumps(obj))/2**20
+
+
 def save_object(file_path:str , obj:object)->None:
     try:
         logging.info(f"Entered the Save_Object method of utils")
@@ -85,13 +267,17 @@ def save_numpy_array_data(file_path:str , array:np.array):
     """  
     Save numpy array data to file
     file_path :str location of file to save
-    array: np.array data to save
+    array: np.array or scipy sparse matrix data to save
+    sparse matrices are stored in scipy's compressed .npz format
     """
     try:
         dir_path=os.path.dirname(file_path)
         os.makedirs(dir_path, exist_ok=True)
         with open(file_path , "wb") as file_obj:
-            np.save(file_obj , array)
+            if sparse.issparse(array):
+                sparse.save_npz(file_obj , array.tocsr() , compressed=False)
+            else:
+                np.save(file_obj , array)
     except Exception as e:
         raise e        
     
@@ -99,10 +285,60 @@ def load_numpy_array_data(file_path:str) -> np.array:
     """
     load nump array data from file
     file_path :str location of file to load
-    return: np.array data load
+    return: np.array or scipy.sparse.csr_matrix data load
     """
     try:
         with open(file_path , "rb")as file_obj:
-            return np.load(file_obj)
+            data=np.load(file_obj)
+            if isinstance(data , np.lib.npyio.NpzFile):
+                #sparse matrix saved by save_numpy_array_data
+                data.close()
+                return sparse.load_npz(file_path).tocsr()
+            return data
+    except Exception as e:
+        raise   SrcException(e,sys)   
+
+
+def save_shared_arrays(dir_path:str , arrays:Dict[str , object])->None:
+    """
+    Write arrays as plain .npy files that worker processes memory map instead of copying ,
+    a sparse matrix is written as its csr or csc components (name.data.npy , name.indices.npy , name.indptr.npy) ,
+    dtypes are kept so readers needing exactly this layout do not convert it
+    dir_path :str directory of the files
+    arrays :dict name -> np.array or scipy sparse matrix
+    """
+    try:
+        os.makedirs(dir_path , exist_ok=True)
+        layout=dict()
+        for name , array in arrays.items():
+            if sparse.issparse(array):
+                array=array.tocsc() if array.format=="csc" else array.tocsr()
+                for component in ("data" , "indices" , "indptr"):
+                    np.save(os.path.join(dir_path , f"{name}.{component}.npy") , getattr(array , component))
+                layout[name]={"format":array.format , "shape":list(array.shape)}
+            else:
+                np.save(os.path.join(dir_path , f"{name}.npy") , np.asarray(array))
+                layout[name]={"format":"dense"}
+        write_yaml_file(file_path=os.path.join(dir_path , "layout.yml") , data=layout)
+    except Exception as e:
+        raise SrcException(e , sys)
+
+
+def load_shared_arrays(dir_path:str)->Dict[str , object]:
+    """
+    Memory map the arrays written by save_shared_arrays , pages are shared by every process reading them
+    return: dict name -> read only np.memmap or csr / csc matrix over memory mapped components
+    """
+    try:
+        arrays=dict()
+        for name , layout in read_yaml_file(file_path=os.path.join(dir_path , "layout.yml")).items():
+            if layout["format"] in ("csr" , "csc"):
+                components=[np.load(os.path.join(dir_path , f"{name}.{component}.npy") , mmap_mode="r")
+                            for component in ("data" , "indices" , "indptr")]
+                matrix_class=sparse.csr_matrix if layout["format"]=="csr" else sparse.csc_matrix
+                arrays[name]=matrix_class(tuple(components) , shape=tuple(layout["shape"]) , copy=False)
+            else:
+                arrays[name]=np.load(os.path.join(dir_path , f"{name}.npy") , mmap_mode="r")
+        return arrays
     except Exception as e:
-        raise   SrcException(e,sys)   
\ No newline at end of file
+        raise SrcException(e , sys)
@@ -37,6 +37,17 @@ elif [ "$1" = "streamlit" ]; then
   echo "Starting Streamlit app..."
   exec streamlit run app.py --server.port 8501 --server.address=0.0.0.0 --server.enableCORS false
 
+elif [ "$1" = "api" ]; then
+  if [ -n "$BUCKET_NAME" ]; then
+    mkdir -p /app/saved_models
+    aws s3 sync s3://"$BUCKET_NAME"/saved_models /app/saved_models
+    echo "Saved models sync complete."
+  else
+    echo "BUCKET_NAME is not set. Skipping S3 sync."
+  fi
+  echo "Starting prediction API..."
+  exec uvicorn service:app --host 0.0.0.0 --port 8000
+
 else
   echo "Unknown service: $1"
   exec "$@"
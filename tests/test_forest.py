@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.ensemble import RandomForestRegressor
+
+from src.exception import SrcException
+from src.forest import FlatForest, export_forest, forest_node_count
+
+
+def make_data(n_rows=600, n_features=12, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, n_features))
+    X[:, 6:] = rng.random((n_rows, n_features - 6)) < 0.2  # one hot like 0/1 columns, as in the preprocessor output
+    y = X[:, 0] * 2 + np.sin(X[:, 1]) + X[:, 7] + rng.normal(scale=0.1, size=n_rows)
+    return X, y
+
+
+@pytest.mark.parametrize("params", [{"n_estimators": 15, "random_state": 0},
+                                    {"n_estimators": 10, "max_depth": 4, "random_state": 1},
+                                    {"n_estimators": 1, "max_depth": 1, "random_state": 2}])
+def test_flat_forest_matches_sklearn(tmp_path, params):
+    X, y = make_data()
+    model = RandomForestRegressor(**params).fit(X, y)
+    forest = FlatForest.load(export_forest(model, str(tmp_path / "forest")))
+
+    X_new, _ = make_data(n_rows=300, seed=1)
+    np.testing.assert_allclose(forest.predict(X_new), model.predict(X_new), rtol=1e-9, atol=1e-9)
+    assert len(forest.feature) == forest_node_count(model)
+
+
+def test_flat_forest_sparse_input_and_chunks(tmp_path):
+    X, y = make_data()
+    X_sparse = sparse.csr_matrix(X)
+    model = RandomForestRegressor(n_estimators=8, random_state=0).fit(X_sparse, y)
+    forest = FlatForest.load(export_forest(model, str(tmp_path / "forest")))
+    forest.chunk_size = 7  # rows split over many chunks, the last one partial
+
+    np.testing.assert_allclose(forest.predict(X_sparse), model.predict(X_sparse), rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(forest.predict(X_sparse[:1]), model.predict(X_sparse[:1]), rtol=1e-9, atol=1e-9)
+
+
+def test_flat_forest_rejects_wrong_feature_count(tmp_path):
+    X, y = make_data()
+    model = RandomForestRegressor(n_estimators=2, random_state=0).fit(X, y)
+    forest = FlatForest.load(export_forest(model, str(tmp_path / "forest")))
+    with pytest.raises(SrcException):
+        forest.predict(X[:, :-1])
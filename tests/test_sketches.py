@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import utils
+from src.components.data_validation import DataValidation
+from src.entity.artifact_entity import DataIngestionArtifact
+from src.entity.config_entity import DataValidationConfig, TrainingPipelineConfig
+from src.sketches import DataSketch, HeavyHitters, HyperLogLog, KLLSketch, PrioritySample, hash_values, sketch_parquet_file
+
+BASE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cleaned_zomato.csv")
+
+
+def chunks(values, n_chunks):
+    return np.array_split(np.asarray(values), n_chunks)
+
+
+def max_rank_error(sketch, values):
+    points = np.quantile(values, np.linspace(0, 1, 201))
+    true_cdf = np.searchsorted(np.sort(values), points, side="right") / len(values)
+    return np.max(np.abs(sketch.cdf(points) - true_cdf))
+
+
+@pytest.mark.parametrize("k", [128, 512])
+def test_kll_rank_error_single_pass_and_merged(k):
+    values = np.random.default_rng(0).lognormal(size=200_000)
+    single = KLLSketch(k=k, seed=0).update(values)
+    merged = KLLSketch(k=k, seed=1)
+    for worker, chunk in enumerate(chunks(values, 8)):
+        merged.merge(KLLSketch(k=k, seed=100 + worker).update(chunk))
+
+    bound = 4 / k  # KLL rank error is O(1/k) , a few times the expected error
+    assert single.count == merged.count == len(values)
+    assert max_rank_error(single, values) < bound
+    assert max_rank_error(merged, values) < bound
+    # memory stays bounded by the sketch size , not the stream length
+    assert len(merged.items()) < 4 * k
+
+
+def test_kll_small_stream_is_exact():
+    values = np.random.default_rng(0).normal(size=500)
+    sketch = KLLSketch(k=1024, seed=0).update(values)
+    assert np.array_equal(sketch.items(), np.sort(values))
+    assert sketch.quantiles(np.array([0.0, 1.0])).tolist() == [values.min(), values.max()]
+
+
+def test_heavy_hitters_merge_is_exact_below_capacity():
+    values = pd.Series(np.random.default_rng(0).integers(0, 50, size=10_000))
+    single = HeavyHitters(capacity=64).update_counts(values.value_counts())
+    merged = HeavyHitters(capacity=64)
+    for chunk in chunks(values, 5):
+        merged.merge(HeavyHitters(capacity=64).update_counts(pd.Series(chunk).value_counts()))
+
+    assert single.exact and merged.exact
+    pd.testing.assert_series_equal(merged.counts.sort_index(), single.counts.sort_index(), check_names=False)
+    assert merged.total == single.total == len(values)
+
+
+def test_heavy_hitters_error_bound_after_cuts():
+    rng = np.random.default_rng(0)
+    values = pd.Series(np.concatenate([rng.integers(0, 5, size=20_000), rng.integers(5, 5_000, size=20_000)]))
+    true_counts = values.value_counts()
+    merged = HeavyHitters(capacity=100)
+    for chunk in chunks(values.sample(frac=1, random_state=0), 10):
+        merged.merge(HeavyHitters(capacity=100).update_counts(pd.Series(chunk).value_counts()))
+
+    assert not merged.exact
+    assert merged.decremented <= merged.total / (merged.capacity + 1)
+    for value, count in merged.counts.items():
+        assert true_counts[value] - merged.decremented <= count <= true_counts[value]
+    # every value above total/(capacity+1) survives the cuts
+    assert set(true_counts[true_counts > merged.total / (merged.capacity + 1)].index) <= set(merged.counts.index)
+
+
+def test_hyperloglog_merge_equals_single_pass():
+    hashes = hash_values(np.arange(50_000))
+    single = HyperLogLog(precision=12).update_hashes(hashes)
+    merged = HyperLogLog(precision=12)
+    for chunk in chunks(hashes, 7):
+        merged.merge(HyperLogLog(precision=12).update_hashes(chunk))
+
+    assert np.array_equal(single.registers, merged.registers)
+    assert abs(single.estimate() - 50_000) / 50_000 < 3 * 1.04 / np.sqrt(2 ** 12)
+    assert HyperLogLog(precision=12).update_hashes(hash_values(np.arange(100))).estimate() == pytest.approx(100, rel=0.05)
+
+
+def test_priority_sample_merge_keeps_smallest_priorities_of_union():
+    values = np.arange(30_000)
+    parts = [PrioritySample(sample_size=1000, seed=worker).update(chunk) for worker, chunk in enumerate(chunks(values, 3))]
+    merged = PrioritySample(sample_size=1000)
+    for part in parts:
+        merged.merge(part)
+
+    union_values = np.concatenate([part.values for part in parts])
+    union_priorities = np.concatenate([part.priorities for part in parts])
+    expected = union_values[np.argsort(union_priorities)[:1000]]
+    assert set(merged.values) == set(expected)
+    # uniform over the stream , every third of the stream holds about a third of the sample
+    shares = np.histogram(merged.values, bins=3, range=(0, 30_000))[0] / 1000
+    assert np.all(np.abs(shares - 1 / 3) < 0.06)
+
+
+def test_data_sketch_merge_matches_single_pass():
+    df = pd.read_csv(BASE_FILE, nrows=6000)
+    single = DataSketch(quantile_k=256, sample_size=500, seed=0).update(df)
+    merged = DataSketch(quantile_k=256, sample_size=500, seed=0)
+    for start in range(0, len(df), 1000):
+        merged.merge(DataSketch(quantile_k=256, sample_size=500, seed=start).update(df.iloc[start:start + 1000]))
+
+    pd.testing.assert_series_equal(single.null_rates(), merged.null_rates())
+    for column, sketch in single.columns.items():
+        other = merged.columns[column]
+        assert (sketch.rows, sketch.nulls) == (other.rows, other.nulls)
+        assert np.array_equal(sketch.distinct.registers, other.distinct.registers)
+        pd.testing.assert_series_equal(sketch.frequencies.counts.sort_index(), other.frequencies.counts.sort_index(), check_names=False)
+
+
+def test_sketch_parquet_file_workers_match_single_worker(tmp_path):
+    df = pd.read_csv(BASE_FILE, nrows=8000)
+    file_path = str(tmp_path / "data.parquet")
+    df.to_parquet(file_path, row_group_size=1000)
+
+    one = sketch_parquet_file(file_path, chunk_size=500, n_jobs=1, seed=0)
+    two = sketch_parquet_file(file_path, chunk_size=500, n_jobs=2, seed=0)
+    for column, sketch in one.columns.items():
+        assert sketch.rows == two.columns[column].rows == len(df)
+        assert sketch.nulls == two.columns[column].nulls == int(df[column].isna().sum())
+        assert np.array_equal(sketch.distinct.registers, two.columns[column].distinct.registers)
+
+
+def test_validate_with_sketches_matches_dataframe_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # artifact directory of the validation run
+    full = pd.read_csv(BASE_FILE)
+    base_file_path = str(tmp_path / "base.csv")
+    full.sample(4000, random_state=0).to_csv(base_file_path, index=False)
+    current = full.sample(3000, random_state=1)
+    current.loc[current.index[:1500], "votes"] *= 3  # one drifted column , the others come from the same data
+    train_file_path, test_file_path = str(tmp_path / "train.parquet"), str(tmp_path / "test.parquet")
+    utils.save_dataframe(file_path=train_file_path, df=current.iloc[:2000])
+    utils.save_dataframe(file_path=test_file_path, df=current.iloc[2000:])
+
+    reports = []
+    for sketch_row_threshold in (10 ** 12, 0):  # DataFrame path , then the sketch path
+        config = DataValidationConfig(TrainingPipelineConfig())
+        config.base_data_file_path = base_file_path
+        config.sketch_row_threshold = sketch_row_threshold
+        config.drift_n_jobs = config.sketch_n_jobs = 1
+        data_validation = DataValidation(config, DataIngestionArtifact(feature_store_file_path="", train_file_path=train_file_path,
+                                                                       test_file_path=test_file_path))
+        data_validation.initiate_data_validation()
+        reports.append(data_validation.validation_error)
+
+    dataframe_report, sketch_report = reports
+    for key in ("data_drift_within_train_dataset", "data_drift_within_test_dataset"):
+        assert dataframe_report[key].keys() == sketch_report[key].keys()
+        for column, result in dataframe_report[key].items():
+            assert sketch_report[key][column]["same_distribution"] == result["same_distribution"], column
+            assert sketch_report[key][column]["pvalues"] == pytest.approx(result["pvalues"], rel=1e-6, abs=1e-12), column
+    assert not dataframe_report["data_drift_within_train_dataset"]["votes"]["same_distribution"]